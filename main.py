@@ -3,6 +3,7 @@ YouTube 直播即時翻譯器 - 主程式
 """
 import sys
 import logging
+import multiprocessing
 from pathlib import Path
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import Qt, QCoreApplication
@@ -89,4 +90,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 打包後的執行檔啟動模型工作行程時需要
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
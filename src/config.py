@@ -12,22 +12,95 @@ APP_VERSION = "1.0.0"
 BASE_DIR = Path(__file__).parent.parent
 ASSETS_DIR = BASE_DIR / "assets"
 MODELS_DIR = BASE_DIR / "models"
+CACHE_DIR = BASE_DIR / "cache"
 
 # 確保必要目錄存在
 MODELS_DIR.mkdir(exist_ok=True)
+CACHE_DIR.mkdir(exist_ok=True)
 
 # Whisper 模型設定
 WHISPER_MODEL = "turbo"  # 使用 turbo 版本（即 large-v3-turbo）以獲得最佳的準確性和即時性能
 WHISPER_DEVICE = "cuda"  # 強制使用 GPU 加速語音識別
 WHISPER_LANGUAGE = None  # None 表示自動偵測
+WHISPER_PROMPT_TOKEN_BUDGET = 96  # 上下文提示詞的 token 上限（Whisper 最多 223）
+WHISPER_PROMPT_GLOSSARY = []  # 固定放在提示詞開頭的專有名詞（例如頻道名稱、人名），最多使用一半的 token 預算
+
+# Whisper 啟動預熱與編譯快取設定
+WHISPER_WARMUP_ENABLED = True  # 連接直播時在背景以合成音訊預熱模型
+WHISPER_WARMUP_DURATION = 3  # 預熱音訊長度（秒）
+COMPILE_CACHE_DIR = MODELS_DIR / "compile_cache"  # torch.compile 產物快取（依模型、精度與 torch 版本區分）
+
+# Whisper 自適應模型階梯（依即時率 RTF 自動切換模型大小；啟用時會預先載入階梯中較小的模型，佔用額外的 GPU 記憶體）
+WHISPER_ADAPTIVE_MODEL = False
+WHISPER_MODEL_LADDER = ["turbo", "small", "base"]  # 由大到小，最上層固定為 WHISPER_MODEL
+WHISPER_RTF_WINDOW = 5  # 計算滾動平均 RTF 的片段數
+WHISPER_RTF_DOWNGRADE_THRESHOLD = 0.9  # 平均 RTF 高於此值時改用較小的模型
+WHISPER_RTF_UPGRADE_THRESHOLD = 0.3  # 平均 RTF 低於此值時改回較大的模型
+
+# Whisper 雙層轉錄（小模型立即輸出草稿，大模型於背景修訂）
+WHISPER_TWO_TIER_MODE = False
+WHISPER_DRAFT_MODEL = "base"  # 草稿模型（建議 tiny 或 base）
+WHISPER_REVISION_MAX_AGE = 1  # 只修訂最近 N 個片段內的草稿（較舊的字幕已不在畫面上）
 
 # Gemma 翻譯模型設定
 GEMMA_MODEL_NAME = "google/gemma-3n-E2B-it"  # 使用更小的 E2B 版本（約 6GB vs 15GB）
 GEMMA_DEVICE = "cpu"  # 強制使用 CPU 以節省 GPU 記憶體
 GEMMA_QUANTIZATION = "int4"  # 4-bit 量化（CPU 模式下會自動忽略）
+# CPU 模式的權重精度: None（float32）、"dynamic_int8"（Linear 層動態 int8 量化）、"bf16"（需 CPU 支援，否則使用 float32）
+# GGUF int4 權重請改用 llama_cpp 翻譯後端（TRANSLATION_BACKENDS = {"*-*": "llama_cpp"}）
+GEMMA_CPU_QUANTIZATION = None
 GEMMA_MAX_LENGTH = 512
 GEMMA_TEMPERATURE = 0.7
 
+# Gemma 對話工作階段模式（保留系統提示詞與上下文的 KV 快取，每段只預填新的文字）
+# 只適用於全部為完整注意力層的模型；KV 快取含滑動視窗或共享層（例如 Gemma 3n）時自動改用一般提示詞
+GEMMA_SESSION_MODE = False
+GEMMA_SESSION_TOKEN_BUDGET = 1024  # 工作階段超過此詞元數時，只保留最近的輪次重新建立
+GEMMA_BATCH_SIZE = 8  # 批次翻譯時單次 generate 的最大序列數
+# 多段打包（同一目標語言的多個短句以編號列表放入同一個提示詞，分攤系統提示詞與 chat template 的詞元）
+GEMMA_PACKING_ENABLED = False
+GEMMA_PACKING_TOKEN_BUDGET = 96  # 單一打包提示詞中原文的詞元上限
+GEMMA_PACKING_MAX_SEGMENTS = 8  # 單一打包提示詞的最大句數
+
+# 生成設定（"subtitle": 貪婪解碼、依原文長度限制輸出並在換行時停止；"sampling": 原本的取樣設定）
+GEMMA_GENERATION_PROFILE = "subtitle"
+GEMMA_NUM_BEAMS = 1  # 1 為貪婪解碼，可設為 2-3 使用小型束搜尋
+GEMMA_MIN_NEW_TOKENS_BUDGET = 16  # 輸出詞元上限的下限（避免短句被截斷）
+GEMMA_LENGTH_SLACK = 8  # 依比例估計後額外保留的詞元數
+# 譯文/原文詞元數比例上限，鍵為 "來源-目標"（"*" 表示任意語言）
+GEMMA_LENGTH_RATIOS = {
+    "*-*": 2.0,
+    "en-zh": 1.6,
+    "en-ja": 1.8,
+    "en-ko": 1.8,
+    "zh-en": 1.5,
+    "ja-en": 1.5,
+    "ja-zh": 1.2,
+    "zh-ja": 1.5,
+    "ko-zh": 1.2,
+}
+
+# 輔助解碼（由草稿提出候選詞元，Gemma 一次前向驗證多個詞元；只用於單一序列且非束搜尋）
+# None: 一般解碼；"prompt_lookup": 從提示詞（原文、上下文）中比對 n-gram 作為草稿；"draft_model": 使用小型草稿模型
+GEMMA_ASSISTED_DECODING = None
+GEMMA_PROMPT_LOOKUP_TOKENS = 10  # prompt_lookup 每次提出的候選詞元數
+GEMMA_ASSISTANT_MODEL_NAME = "google/gemma-3-270m-it"  # draft_model 使用的草稿模型
+GEMMA_NUM_ASSISTANT_TOKENS = 5  # 草稿模型每次提出的候選詞元數
+
+# 翻譯後端（依語言對選擇，鍵為 "來源-目標"，"*" 表示任意語言）
+# "gemma": Gemma 生成式翻譯；"ctranslate2": CTranslate2 int8 序列到序列模型（需安裝 ctranslate2）
+# 後端不支援的語言對（例如原文語言為自動偵測）一律改用 Gemma
+TRANSLATION_BACKENDS = {
+    "*-*": "gemma",
+}
+CT2_MODEL_NAME = "facebook/nllb-200-distilled-600M"  # 或固定語言對的 Marian 模型，如 Helsinki-NLP/opus-mt-en-zh
+CT2_COMPUTE_TYPE = "int8"
+CT2_THREADS = 4
+CT2_BEAM_SIZE = 1
+GGUF_MODEL_PATH = MODELS_DIR / "gemma-3n-E2B-it-Q4_K_M.gguf"  # llama_cpp 後端使用的 GGUF 模型（需安裝 llama-cpp-python）
+LLAMA_CPP_CONTEXT = 2048
+LLAMA_CPP_THREADS = 4
+
 # 音訊設定
 AUDIO_SAMPLE_RATE = 16000
 AUDIO_CHUNK_DURATION = 5  # 每次處理的音訊長度（秒）
@@ -46,8 +119,49 @@ DEFAULT_SUBTITLE_SETTINGS = {
     "shadow_color": "#000000",
     "shadow_offset": 2,
     "max_width": 0.8,  # 最大寬度（相對於螢幕寬度）
+    "max_lines": 2,  # 同時顯示的字幕行數（修訂結果會就地更新對應的行）
 }
 
+# 多目標語言（同一份轉錄同時翻譯成多種語言，每種語言一個字幕視窗）
+ADDITIONAL_TARGET_LANGUAGES = []  # 預設勾選的其他目標語言，例如 ["ja", "ko"]
+SUBTITLE_STACK_OFFSET = 0.12  # 其他語言的字幕視窗依序往上排列的相對間距
+
+# 串流翻譯（生成時逐步顯示部分譯文）
+SUBTITLE_STREAMING = True
+SUBTITLE_STREAM_INTERVAL = 0.25  # 部分譯文的最短更新間隔（秒）
+
+# 句子累積（轉錄片段先累積到句尾再送出翻譯，減少翻譯次數並避免翻譯半句；
+# 沒有句尾標點的片段最多延後 SENTENCE_MAX_WAIT 秒才翻譯）
+SENTENCE_ACCUMULATOR_ENABLED = False
+SENTENCE_MAX_WAIT = 3.5  # 未完成的句子最多等待的時間（秒），需大於音訊處理間隔才能與下一段合併
+SENTENCE_MAX_CHARS = 120  # 超過此長度仍無句尾時，在最後一個子句標點（逗號等）處切分
+
+# 翻譯工作執行緒（收集短時間內就緒的片段合併為一個批次翻譯）
+TRANSLATION_BATCH_WINDOW = 0.1  # 收到第一個片段後等待其他片段的時間（秒）
+TRANSLATION_MAX_BATCH = GEMMA_BATCH_SIZE  # 單一批次的最大片段數
+TRANSLATION_DEADLINE = 8.0  # 片段排入後必須完成翻譯的期限（秒），None 表示不限
+TRANSLATION_SUPERSEDE_DISTANCE = 2  # 生成中的片段落後最新片段達此數量時中止（None 表示不中止）
+TRANSLATION_STALE_POLICY = "merge"  # 中止的片段: "merge" 併入下一個片段一起翻譯，"drop" 直接捨棄
+
+# 雙層翻譯（翻譯記憶或草稿後端的譯文立即顯示，Gemma 譯文完成後以相同序號取代；只在同一行程中可用）
+TWO_TIER_TRANSLATION = False
+TRANSLATION_DRAFT_BACKEND = "ctranslate2"  # 草稿使用的翻譯後端（未安裝時只使用翻譯記憶）
+TRANSLATION_REFINE_MAX_AGE = 2  # 草稿落後最新片段超過此數量時不再以 Gemma 修訂
+
+# 相同語言略過（偵測到的原文語言等於目標語言時不翻譯，直接顯示轉錄文字）
+LANGUAGE_BYPASS_ENABLED = True
+LANGUAGE_BYPASS_MIN_CONFIDENCE = 0.8  # 自動偵測語言的最低信心
+# 略過翻譯時的字體轉換，目標語言 -> OpenCC 轉換設定（需安裝 opencc，未安裝時不轉換）
+SCRIPT_CONVERSIONS = {
+    "zh": "s2twp",  # 簡體轉繁體（臺灣用語）
+}
+
+# 模型工作行程（語音識別與翻譯模型在獨立行程中執行，不與介面競爭 GIL，當機時自動重新啟動）
+# 雙層轉錄模式只在同一行程中可用
+MODEL_WORKER_PROCESSES = False
+WORKER_AUDIO_RING_SECONDS = 120  # 傳送音訊的共享記憶體環形緩衝區長度（秒）
+WORKER_RESPONSE_TIMEOUT = 120.0  # 工作行程超過此時間（秒）未回應時視為當機並重新啟動
+
 # 支援的語言列表
 SUPPORTED_LANGUAGES = {
     "auto": "自動偵測",
@@ -70,7 +184,17 @@ SUPPORTED_LANGUAGES = {
 
 # 效能設定
 MAX_CONCURRENT_TASKS = 3
-TRANSLATION_CACHE_SIZE = 1000
+TRANSLATION_CACHE_SIZE = 10000
+TRANSLATION_CACHE_POLICY = "lfu"  # 淘汰策略: "lru" 或 "lfu"（含老化）
+TRANSLATION_CACHE_TTL = None  # 快取項目存活時間（秒），None 表示不過期
+
+# 磁碟翻譯記憶庫（跨工作階段共用）
+# 鍵只包含模型 ID（含權重精度）與提示詞版本，不含生成參數（溫度、取樣設定等），
+# 修改這些設定後舊的譯文仍會被沿用，因此預設關閉
+TRANSLATION_MEMORY_ENABLED = False
+TRANSLATION_MEMORY_PATH = CACHE_DIR / "translation_memory.sqlite3"
+TRANSLATION_MEMORY_MAX_ENTRIES = 200000  # 超過時淘汰最久未使用的項目
+TRANSLATION_MEMORY_FLUSH_INTERVAL = 2.0  # 背景寫入間隔（秒）
 LOW_LATENCY_MODE = True
 
 # 日誌設定
@@ -0,0 +1,80 @@
+"""
+語言略過模組 - 原文語言與目標語言相同時不經過翻譯模型
+"""
+import logging
+from typing import Dict, Optional
+
+from ..config import LANGUAGE_BYPASS_MIN_CONFIDENCE, SCRIPT_CONVERSIONS
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LanguageBypass:
+    """
+    相同語言略過
+
+    語音識別偵測到的語言等於目標語言且信心足夠時，轉錄文字直接作為字幕；
+    目標語言設定了字體轉換（例如簡體轉繁體）時以 OpenCC 轉換，不使用翻譯模型。
+    未安裝 OpenCC 時直接使用轉錄文字。
+    """
+
+    def __init__(self, min_confidence: float = LANGUAGE_BYPASS_MIN_CONFIDENCE,
+                 conversions: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            min_confidence: 語言偵測的最低信心（0-1）
+            conversions: 目標語言 -> OpenCC 轉換設定（例如 {"zh": "s2twp"}）
+        """
+        self.min_confidence = min_confidence
+        self.conversions = SCRIPT_CONVERSIONS if conversions is None else conversions
+        self.converters = {}  # OpenCC 轉換設定 -> 轉換器（無法使用時為 None）
+
+    def passthrough(self, text: str, target_language: str, detected_language: Optional[str],
+                    confidence: Optional[float]) -> Optional[str]:
+        """
+        判斷是否可略過翻譯
+
+        Args:
+            text: 轉錄文字
+            target_language: 目標語言代碼
+            detected_language: 語音識別偵測到的語言代碼（未知時為 None）
+            confidence: 語言偵測的信心（未知時為 None）
+
+        Returns:
+            可直接顯示的字幕，需要翻譯時返回 None
+        """
+        if detected_language != target_language:
+            return None
+        if confidence is None or confidence < self.min_confidence:
+            metrics.increment("translation.bypass.low_confidence")
+            return None
+
+        metrics.increment("translation.bypass.same_language")
+        conversion = self.conversions.get(target_language)
+        if not conversion:
+            return text
+
+        converter = self._get_converter(conversion)
+        if converter is None:
+            return text
+        metrics.increment("translation.bypass.script_converted")
+        return converter.convert(text)
+
+    def _get_converter(self, conversion: str):
+        """載入 OpenCC 轉換器（選用依賴）"""
+        if conversion in self.converters:
+            return self.converters[conversion]
+
+        try:
+            import opencc
+            converter = opencc.OpenCC(conversion)
+        except ImportError:
+            logger.info("未安裝 opencc，相同語言的字幕不進行字體轉換")
+            converter = None
+        except Exception as e:
+            logger.warning(f"無法載入 OpenCC 轉換設定 {conversion}: {e}")
+            converter = None
+
+        self.converters[conversion] = converter
+        return converter
@@ -0,0 +1,489 @@
+"""
+模型工作行程模組 - 在獨立行程中執行語音識別與翻譯模型
+"""
+import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import AUDIO_SAMPLE_RATE, LOG_LEVEL, WORKER_AUDIO_RING_SECONDS, WORKER_RESPONSE_TIMEOUT
+from ..utils.metrics import metrics
+from .transcriber import Transcriber
+from .translator import CancellationToken, GemmaTranslator, TranslationCancelled
+
+logger = logging.getLogger(__name__)
+
+HEADER_BYTES = 8  # 環形緩衝區開頭保存累計寫入樣本數的 int64
+
+
+class WorkerCrashed(RuntimeError):
+    """工作行程結束或未回應（已自動重新啟動）"""
+
+
+class SharedAudioRing:
+    """
+    共享記憶體音訊環形緩衝區
+
+    主行程寫入 float32 樣本並只透過佇列傳送 (起始位置, 樣本數)，工作行程直接從共享記憶體讀取，
+    音訊不經過序列化。起始位置為累計寫入的樣本數，讀取時可判斷資料是否已被覆寫。
+    """
+
+    def __init__(self, capacity: int, name: Optional[str] = None):
+        """
+        Args:
+            capacity: 緩衝區可容納的樣本數
+            name: 已存在的共享記憶體名稱（工作行程附加時使用），None 表示建立新的緩衝區
+        """
+        self.capacity = capacity
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=self.owner, size=HEADER_BYTES + capacity * 4
+        )
+        self.cursor = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf[:HEADER_BYTES])
+        self.samples = np.ndarray((capacity,), dtype=np.float32, buffer=self.shm.buf[HEADER_BYTES:])
+        if self.owner:
+            self.cursor[0] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, audio_data) -> Tuple[int, int]:
+        """
+        寫入音訊（超過容量時只保留最後的部分）
+
+        Returns:
+            (起始位置, 樣本數)
+        """
+        audio = np.asarray(audio_data, dtype=np.float32)[-self.capacity:]
+        start = int(self.cursor[0])
+        length = len(audio)
+
+        offset = start % self.capacity
+        first = min(length, self.capacity - offset)
+        self.samples[offset:offset + first] = audio[:first]
+        self.samples[:length - first] = audio[first:]
+        self.cursor[0] = start + length
+        return start, length
+
+    def read(self, start: int, length: int) -> Optional[np.ndarray]:
+        """複製指定範圍的音訊；已被覆寫時返回 None"""
+        if self._overwritten(start):
+            return None
+
+        offset = start % self.capacity
+        first = min(length, self.capacity - offset)
+        audio = np.concatenate([self.samples[offset:offset + first], self.samples[:length - first]])
+
+        # 複製期間可能被寫入端覆寫
+        return None if self._overwritten(start) else audio
+
+    def _overwritten(self, start: int) -> bool:
+        return int(self.cursor[0]) - start > self.capacity
+
+    def close(self):
+        """釋放共享記憶體（建立者同時刪除）"""
+        # 先釋放指向共享記憶體的陣列，否則無法關閉
+        del self.cursor, self.samples
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedCancellationToken(CancellationToken):
+    """工作行程中的取消標記：主行程透過共享旗標取消，期限則在本行程檢查"""
+
+    def __init__(self, flag, deadline: Optional[float] = None):
+        super().__init__(deadline)
+        self.flag = flag
+
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.flag.value:
+            self.reason = "superseded"
+        return super().cancelled
+
+
+def _setup_worker_logging(log_queue):
+    """工作行程的日誌記錄送回主行程，依主程式的日誌設定輸出"""
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    root.setLevel(getattr(logging, LOG_LEVEL))
+
+
+def _serve(initialize: Callable, handlers: Dict[str, Callable], requests, results):
+    """
+    工作行程的主迴圈
+
+    請求為 (請求編號, 指令, 參數)，回應為 (請求編號, 狀態, 內容, 運算秒數)；
+    處理函數返回產生器時，每一項以 "partial" 狀態送出。收到 None 時結束。
+    """
+    try:
+        initialize()
+    except Exception as e:
+        logger.error(f"工作行程初始化失敗: {e}", exc_info=True)
+        results.put((0, "error", str(e), 0.0))
+        return
+    results.put((0, "ready", None, 0.0))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+
+        request_id, command, args = message
+        start_time = time.perf_counter()
+        try:
+            value = handlers[command](*args)
+            if isinstance(value, Iterator):
+                for partial in value:
+                    results.put((request_id, "partial", partial, 0.0))
+                value = None
+            status = "ok"
+        except TranslationCancelled as e:
+            status, value = "cancelled", str(e)
+        except Exception as e:
+            logger.error(f"工作行程處理 {command} 失敗: {e}", exc_info=True)
+            status, value = "error", str(e)
+        results.put((request_id, status, value, time.perf_counter() - start_time))
+
+    metrics.log_summary()
+
+
+def _asr_worker_main(transcriber_class, ring_name: str, ring_capacity: int, log_queue, requests, results):
+    """語音識別工作行程的進入點"""
+    _setup_worker_logging(log_queue)
+    ring = SharedAudioRing(ring_capacity, name=ring_name)
+    transcriber = transcriber_class()
+
+    def transcribe(start: int, length: int, language: str) -> Tuple[Optional[str], Optional[tuple]]:
+        audio = ring.read(start, length)
+        if audio is None:
+            raise RuntimeError("音訊在處理前已被覆寫")
+        text = transcriber.transcribe(audio, language)
+        return text, transcriber.last_language
+
+    try:
+        _serve(transcriber.initialize, {"warmup": transcriber.warmup, "transcribe": transcribe}, requests, results)
+    finally:
+        transcriber.cleanup()
+        ring.close()
+
+
+def _mt_worker_main(translator_class, source_language: Optional[str], cancel_flag, log_queue, requests, results):
+    """翻譯工作行程的進入點"""
+    _setup_worker_logging(log_queue)
+    translator = translator_class()
+    translator.source_language = source_language
+
+    def translate_multi(texts: List[str], target_languages: List[str], deadline: Optional[float]):
+        with translator.cancellable(SharedCancellationToken(cancel_flag, deadline)):
+            return translator.translate_multi(texts, target_languages)
+
+    def translate_stream(text: str, target_language: str, deadline: Optional[float]):
+        with translator.cancellable(SharedCancellationToken(cancel_flag, deadline)):
+            yield from translator.translate_stream(text, target_language)
+
+    try:
+        _serve(
+            translator.initialize,
+            {"translate_multi": translate_multi, "translate_stream": translate_stream},
+            requests, results
+        )
+    finally:
+        translator.cleanup()
+
+
+class ModelWorkerProcess(ABC):
+    """
+    模型工作行程的代理（在主行程中使用）
+
+    模型在以 spawn 建立的行程中載入與執行，與介面不共用 GIL，模型當機或記憶體不足也不會
+    結束主程式。佇列上只傳送指令、共享記憶體位置與結果文字等小型訊息。
+    等待回應時工作行程結束或超過 response_timeout 未回應，會自動重新啟動（重新載入模型），
+    進行中的請求以 WorkerCrashed 失敗。
+
+    每個請求記錄往返時間扣除工作行程實際運算時間的 IPC 額外負擔（ipc.<名稱>.overhead）。
+    """
+
+    name = "worker"
+
+    def __init__(self, response_timeout: Optional[float] = WORKER_RESPONSE_TIMEOUT):
+        self.response_timeout = response_timeout
+        self.context = multiprocessing.get_context("spawn")
+        self.process = None
+        self.requests = None
+        self.results = None
+        self.next_request_id = 0
+        self.lock = threading.Lock()
+
+        self.log_queue = self.context.Queue()
+        self.log_thread = None
+
+    @abstractmethod
+    def _process_args(self) -> Tuple[Callable, tuple]:
+        """工作行程的進入點與參數（不含日誌與請求/回應佇列）"""
+
+    def start(self):
+        """啟動工作行程並等待模型載入完成"""
+        if self.log_thread is None:
+            self.log_thread = threading.Thread(target=self._forward_logs)
+            self.log_thread.daemon = True
+            self.log_thread.start()
+
+        target, args = self._process_args()
+        self.requests = self.context.Queue()
+        self.results = self.context.Queue()
+        self.process = self.context.Process(
+            target=target, args=args + (self.log_queue, self.requests, self.results),
+            name=f"{self.name}-worker", daemon=True
+        )
+        self.process.start()
+
+        status, value, _ = self._receive(0, None)
+        if status != "ready":
+            self.stop()
+            raise RuntimeError(f"{self.name} 工作行程初始化失敗: {value}")
+        logger.info(f"{self.name} 工作行程已啟動 (pid {self.process.pid})")
+
+    def restart(self):
+        """重新啟動工作行程（重新載入模型）"""
+        metrics.increment(f"workers.restarts.{self.name}")
+        self.stop()
+        self.start()
+
+    def stop(self):
+        """停止工作行程（未在時限內結束時強制終止）"""
+        if self.process is None:
+            return
+
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=10)
+            if self.process.is_alive():
+                logger.warning(f"{self.name} 工作行程未正常結束，強制終止")
+                self.process.terminate()
+                self.process.join()
+
+        self.process = None
+        for channel in (self.requests, self.results):
+            channel.cancel_join_thread()
+            channel.close()
+
+    def shutdown(self):
+        """停止工作行程與日誌轉送"""
+        self.stop()
+        if self.log_thread is not None:
+            self.log_queue.put(None)
+            self.log_thread.join(timeout=5)
+            self.log_thread = None
+
+    def _forward_logs(self):
+        """將工作行程的日誌記錄交給主行程的日誌設定處理"""
+        while True:
+            record = self.log_queue.get()
+            if record is None:
+                break
+            logging.getLogger(record.name).handle(record)
+
+    def _on_wait(self):
+        """等待回應期間定期呼叫"""
+
+    def _receive(self, request_id: int, timeout: Optional[float]) -> Tuple[str, object, float]:
+        """等待指定請求的下一個回應訊息；工作行程結束或逾時拋出 WorkerCrashed"""
+        waiting_since = time.time()
+        while True:
+            try:
+                message = self.results.get(timeout=0.05)
+            except queue.Empty:
+                self._on_wait()
+                if not self.process.is_alive():
+                    raise WorkerCrashed(f"{self.name} 工作行程已結束（結束代碼 {self.process.exitcode}）")
+                if timeout is not None and time.time() - waiting_since > timeout:
+                    raise WorkerCrashed(f"{self.name} 工作行程超過 {timeout} 秒未回應")
+                continue
+
+            waiting_since = time.time()
+            # 忽略先前被放棄的請求的回應
+            if message[0] == request_id:
+                return message[1:]
+
+    def _exchange(self, command: str, *args, started: Optional[float] = None) -> Iterator[Tuple[str, object]]:
+        """
+        送出請求並逐一產出回應 (狀態, 內容)，最後一項為最終結果
+
+        呼叫端需持有 self.lock。工作行程當機時重新啟動後拋出 WorkerCrashed。
+        """
+        started = time.perf_counter() if started is None else started
+        self.next_request_id += 1
+        request_id = self.next_request_id
+        self.requests.put((request_id, command, args))
+
+        try:
+            while True:
+                status, value, compute_seconds = self._receive(request_id, self.response_timeout)
+                if status != "partial":
+                    break
+                yield status, value
+        except WorkerCrashed as e:
+            logger.error(f"{e}，重新啟動工作行程")
+            self.restart()
+            raise
+
+        metrics.increment(f"ipc.{self.name}.requests")
+        metrics.observe(f"ipc.{self.name}.overhead", max(0.0, time.perf_counter() - started - compute_seconds))
+        yield status, value
+
+    def _call(self, command: str, *args, started: Optional[float] = None) -> Tuple[str, object]:
+        """送出請求並返回最終結果 (狀態, 內容)"""
+        with self.lock:
+            for status, value in self._exchange(command, *args, started=started):
+                pass
+            return status, value
+
+
+class RemoteTranscriber(ModelWorkerProcess):
+    """
+    在工作行程中執行的語音識別（介面與 Transcriber 相同）
+
+    音訊寫入共享記憶體環形緩衝區，佇列只傳送位置與長度。
+    """
+
+    name = "asr"
+
+    def __init__(self, transcriber_class=Transcriber, ring_seconds: float = WORKER_AUDIO_RING_SECONDS,
+                 response_timeout: Optional[float] = WORKER_RESPONSE_TIMEOUT):
+        super().__init__(response_timeout)
+        self.transcriber_class = transcriber_class
+        self.ring = SharedAudioRing(int(ring_seconds * AUDIO_SAMPLE_RATE))
+        self.last_language = None  # 最近一次轉錄的 (語言代碼, 信心)
+
+    def _process_args(self) -> Tuple[Callable, tuple]:
+        return _asr_worker_main, (self.transcriber_class, self.ring.name, self.ring.capacity)
+
+    def initialize(self):
+        """啟動工作行程並載入模型"""
+        self.start()
+
+    def warmup(self, language: str = "auto") -> bool:
+        """預熱工作行程中的模型"""
+        try:
+            status, value = self._call("warmup", language)
+        except WorkerCrashed:
+            return False
+        return status == "ok" and bool(value)
+
+    def transcribe(self, audio_data: np.ndarray, language: str = "auto") -> Optional[str]:
+        """
+        轉錄音訊
+
+        Returns:
+            轉錄的文字或 None（工作行程處理失敗或當機時）
+        """
+        started = time.perf_counter()
+        start, length = self.ring.write(audio_data)
+        try:
+            status, value = self._call("transcribe", start, length, language, started=started)
+        except WorkerCrashed:
+            return None
+
+        if status != "ok":
+            logger.error(f"語音識別失敗: {value}")
+            return None
+        text, self.last_language = value
+        return text
+
+    def cleanup(self):
+        """停止工作行程並釋放共享記憶體"""
+        self.shutdown()
+        self.ring.close()
+
+
+class RemoteTranslator(ModelWorkerProcess):
+    """
+    在工作行程中執行的翻譯（提供 TranslationWorker 使用的介面）
+
+    取消標記留在主行程：等待回應期間標記已取消時設定共享旗標，
+    工作行程在解碼步驟之間檢查旗標並中止，再以 TranslationCancelled 回報。
+    """
+
+    name = "mt"
+
+    def __init__(self, translator_class=GemmaTranslator,
+                 response_timeout: Optional[float] = WORKER_RESPONSE_TIMEOUT):
+        super().__init__(response_timeout)
+        self.translator_class = translator_class
+        self.source_language = None
+        self.cancel_token = None
+        self.cancel_flag = self.context.Value("b", 0)
+        self.is_initialized = False
+
+    def _process_args(self) -> Tuple[Callable, tuple]:
+        return _mt_worker_main, (self.translator_class, self.source_language, self.cancel_flag)
+
+    def initialize(self):
+        """啟動工作行程並載入模型"""
+        self.start()
+        self.is_initialized = True
+
+    @contextmanager
+    def cancellable(self, token: CancellationToken):
+        """在區塊內的翻譯檢查取消標記（取消時拋出 TranslationCancelled）"""
+        self.cancel_token = token
+        try:
+            yield token
+        finally:
+            self.cancel_token = None
+
+    def _on_wait(self):
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            self.cancel_flag.value = 1
+
+    def _request_args(self) -> Optional[float]:
+        """重設共享取消旗標並返回請求的期限"""
+        self.cancel_flag.value = 0
+        return self.cancel_token.deadline if self.cancel_token is not None else None
+
+    def _check_response(self, status: str, value):
+        if status == "cancelled":
+            raise TranslationCancelled(value)
+        if status != "ok":
+            raise RuntimeError(f"翻譯工作行程錯誤: {value}")
+
+    def translate_multi(self, texts: List[str], target_languages: List[str]) -> Dict[str, List[Optional[str]]]:
+        """將同一批文字翻譯成多個目標語言"""
+        deadline = self._request_args()
+        status, value = self._call("translate_multi", list(texts), list(target_languages), deadline)
+        self._check_response(status, value)
+        return value
+
+    def translate_batch(self, texts: List[str], target_language: str) -> List[Optional[str]]:
+        """批次翻譯多個文字"""
+        return self.translate_multi(texts, [target_language])[target_language]
+
+    def translate(self, text: str, target_language: str) -> Optional[str]:
+        """翻譯文字"""
+        return self.translate_batch([text], target_language)[0]
+
+    def translate_stream(self, text: str, target_language: str) -> Iterator[str]:
+        """串流翻譯文字，逐步產出工作行程送回的部分譯文"""
+        with self.lock:
+            deadline = self._request_args()
+            for status, value in self._exchange("translate_stream", text, target_language, deadline):
+                if status == "partial":
+                    yield value
+                else:
+                    self._check_response(status, value)
+
+    def cleanup(self):
+        """停止工作行程（翻譯器在工作行程中釋放資源並寫入翻譯記憶）"""
+        self.shutdown()
+        self.is_initialized = False
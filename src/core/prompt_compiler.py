@@ -0,0 +1,137 @@
+"""
+提示詞編譯模組 - 預先產生並分詞提示詞模板中不變的部分
+"""
+import logging
+from typing import Callable, Dict, List, Tuple
+
+import torch
+
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 代替使用者內容的佔位字串（不會出現在一般文字中）
+PLACEHOLDER = "<|prompt_content|>"
+
+# 切分點兩側與使用者內容一起重新分詞的詞元數（BPE 合併可能跨越切分點）
+BOUNDARY_TOKENS = 4
+
+
+class PromptCompiler:
+    """
+    提示詞編譯器
+
+    每個 (目標語言, 提示詞版本) 只以佔位字串產生一次完整提示詞（chat template 的 Jinja 渲染），
+    在佔位處切分為前後兩段並各自分詞；之後每次翻譯只分詞使用者內容（上下文與原文），
+    再與預先分詞的前後段拼接。
+
+    BPE 的合併可能跨越切分點（例如 "\n\n" 與內容的第一個詞），因此前段的最後與後段的最前
+    boundary_tokens 個詞元以文字保留，與使用者內容一起重新分詞；重新分詞後兩端的詞元
+    與預先分詞的結果不一致（合併影響超出保留範圍）時，改為整段分詞。
+    """
+
+    def __init__(self, tokenizer, render: Callable[[str, str], str],
+                 boundary_tokens: int = BOUNDARY_TOKENS):
+        """
+        Args:
+            tokenizer: 分詞器
+            render: 以 (使用者內容, 目標語言代碼) 產生完整提示詞的函數
+            boundary_tokens: 切分點兩側與使用者內容一起重新分詞的詞元數
+        """
+        self.tokenizer = tokenizer
+        self.render = render
+        self.boundary_tokens = boundary_tokens
+        self.templates: Dict[Tuple[str, str], Tuple] = {}
+
+    def _compile(self, target_language: str, version: str) -> Tuple:
+        """
+        產生並分詞提示詞的前段與後段
+
+        Returns:
+            (前段詞元, 前段保留的文字, 後段保留的文字, 後段詞元, 保留文字兩端應有的詞元, 是否加入特殊詞元)
+        """
+        key = (target_language, version)
+        template = self.templates.get(key)
+        if template is not None:
+            return template
+
+        prompt = self.render(PLACEHOLDER, target_language)
+        prefix, suffix = prompt.split(PLACEHOLDER)
+
+        # 提示詞已包含 <bos> 時不重複加入
+        bos_token = self.tokenizer.bos_token
+        add_special_tokens = not (bos_token and prefix.startswith(bos_token))
+        prefix_encoding = self.tokenizer(
+            prefix, add_special_tokens=add_special_tokens, return_offsets_mapping=True
+        )
+        suffix_encoding = self.tokenizer(suffix, add_special_tokens=False, return_offsets_mapping=True)
+        prefix_ids, prefix_offsets = prefix_encoding["input_ids"], prefix_encoding["offset_mapping"]
+        suffix_ids, suffix_offsets = suffix_encoding["input_ids"], suffix_encoding["offset_mapping"]
+
+        # 前段只保留最後幾個詞元的文字（<bos> 等自動加入的特殊詞元不保留）
+        keep = len(prefix_ids) - self.boundary_tokens
+        if add_special_tokens and prefix_ids and prefix_offsets[0] == (0, 0):
+            keep = max(keep, 1)
+        keep = max(keep, 0)
+        prefix_start = prefix_offsets[keep][0] if keep < len(prefix_ids) else len(prefix)
+
+        # 後段只保留最前幾個詞元的文字
+        split = min(self.boundary_tokens, len(suffix_ids))
+        suffix_end = suffix_offsets[split - 1][1] if split else 0
+
+        template = (
+            prefix_ids[:keep],
+            prefix[prefix_start:],
+            suffix[:suffix_end],
+            suffix_ids[split:],
+            (
+                prefix_ids[keep] if 0 < keep < len(prefix_ids) else None,
+                suffix_ids[split - 1] if 0 < split < len(suffix_ids) else None,
+            ),
+            add_special_tokens and keep == 0,
+        )
+        self.templates[key] = template
+
+        metrics.increment("translation.prompt_compilations")
+        logger.debug(f"已編譯提示詞模板: {target_language} ({version})")
+        return template
+
+    def encode(self, content: str, target_language: str, version: str) -> List[int]:
+        """以預先分詞的模板與使用者內容組成提示詞的詞元"""
+        prefix_ids, prefix_text, suffix_text, suffix_ids, (first_id, last_id), add_special_tokens = (
+            self._compile(target_language, version)
+        )
+        # chat template 會去除內容前後的空白
+        content = content.strip()
+        content_ids = self.tokenizer(
+            prefix_text + content + suffix_text, add_special_tokens=add_special_tokens
+        )["input_ids"]
+
+        # 保留文字兩端的詞元改變時，合併可能已影響預先分詞的部分
+        if ((first_id is not None and content_ids[:1] != [first_id])
+                or (last_id is not None and content_ids[-1:] != [last_id])):
+            metrics.increment("translation.prompt_boundary_fallbacks")
+            prompt = self.render(content, target_language)
+            bos_token = self.tokenizer.bos_token
+            return self.tokenizer(
+                prompt, add_special_tokens=not (bos_token and prompt.startswith(bos_token))
+            )["input_ids"]
+
+        return prefix_ids + content_ids + suffix_ids
+
+    def batch(self, input_ids: List[List[int]]) -> Dict[str, torch.Tensor]:
+        """左側填充為批次張量"""
+        max_length = max(len(ids) for ids in input_ids)
+        pad_token_id = self.tokenizer.pad_token_id
+        return {
+            "input_ids": torch.tensor(
+                [[pad_token_id] * (max_length - len(ids)) + ids for ids in input_ids]
+            ),
+            "attention_mask": torch.tensor(
+                [[0] * (max_length - len(ids)) + [1] * len(ids) for ids in input_ids]
+            ),
+        }
+
+    def clear(self):
+        """清除已編譯的模板"""
+        self.templates.clear()
@@ -0,0 +1,199 @@
+"""
+句子累積模組 - 將轉錄片段累積為完整句子後再送出翻譯
+"""
+import logging
+import re
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from ..config import SENTENCE_MAX_WAIT, SENTENCE_MAX_CHARS
+from ..utils.metrics import metrics
+from ..utils.text import find_last_sentence_end, find_last_clause_end
+from .stitcher import CJK_RANGES
+
+logger = logging.getLogger(__name__)
+
+CJK_PATTERN = re.compile(rf"[{CJK_RANGES}。，、！？；：「」『』（）]")
+
+
+def needs_space(left: str, right: str) -> bool:
+    """兩段文字相接時是否需要空白（中日韓文字之間不加空白）"""
+    return not (CJK_PATTERN.match(left[-1]) or CJK_PATTERN.match(right[0]))
+
+
+def join_fragments(texts: List[str]) -> str:
+    """合併轉錄片段文字"""
+    joined = ""
+    for text in texts:
+        if joined and needs_space(joined, text):
+            joined += " "
+        joined += text
+    return joined
+
+
+class SentenceAccumulator:
+    """
+    句子累積器
+
+    Whisper 的片段常在句子中間結束。片段先放入緩衝區，遇到句尾標點時送出完整的句子，
+    剩餘的半句留待與下一個片段合併；緩衝區過長時在子句標點處切分，
+    等待超過 max_wait 時不論是否完整都送出，讓額外延遲有上限。
+
+    送出的段落使用自己的序號（字幕以此序號顯示），並記錄由哪些轉錄片段組成，
+    以便雙層轉錄的修訂結果更新對應的段落。
+
+    每個片段保留轉錄時偵測到的 (語言代碼, 信心)，段落的語言取自其中文字最長的片段，
+    不受送出時最新片段的語言影響。
+    """
+
+    def __init__(self, max_wait: float = SENTENCE_MAX_WAIT, max_chars: int = SENTENCE_MAX_CHARS,
+                 history: int = 8):
+        self.max_wait = max_wait
+        self.max_chars = max_chars
+        self.pending = []  # [(片段序號, 文字, 收到時間, 語言), ...]
+        self.recent_segments = deque(maxlen=history)  # [(段落序號, [(片段序號, 文字, 語言), ...]), ...]
+        self.next_sequence = 0
+
+    def add(self, fragment_sequence: int, text: str, now: Optional[float] = None,
+            language: Optional[Tuple] = None) -> List[Tuple[int, str, Optional[Tuple]]]:
+        """
+        加入轉錄片段
+
+        Args:
+            fragment_sequence: 轉錄片段序號
+            text: 轉錄文字
+            now: 目前時間（預設為 time.time()）
+            language: 轉錄此片段時偵測到的 (語言代碼, 信心)
+
+        Returns:
+            可送出翻譯的段落 [(段落序號, 文字, (語言代碼, 信心)), ...]
+        """
+        text = text.strip()
+        if not text:
+            return []
+
+        now = time.time() if now is None else now
+        self.pending.append((fragment_sequence, text, now, language))
+        metrics.increment("segmenter.fragments")
+        return self._take_ready(now)
+
+    def poll(self, now: Optional[float] = None) -> List[Tuple[int, str, Optional[Tuple]]]:
+        """檢查等待時間，送出已超過期限的未完成句子"""
+        if not self.pending:
+            return []
+        return self._take_ready(time.time() if now is None else now)
+
+    def flush(self) -> List[Tuple[int, str, Optional[Tuple]]]:
+        """送出緩衝區中所有的文字"""
+        if not self.pending:
+            return []
+        return [self._emit(self._split_at(len(self._pending_text())))]
+
+    def revise(self, fragment_sequence: int, text: str,
+               language: Optional[Tuple] = None) -> Optional[Tuple[int, str, Optional[Tuple]]]:
+        """
+        以修訂後的轉錄文字取代片段
+
+        Args:
+            fragment_sequence: 轉錄片段序號
+            text: 修訂後的轉錄文字
+            language: 修訂時偵測到的 (語言代碼, 信心)；None 時沿用原本片段的語言
+
+        Returns:
+            需要重新翻譯的段落 (段落序號, 文字, (語言代碼, 信心))；片段尚未送出時直接更新緩衝區並返回 None
+        """
+        text = text.strip()
+        pending_hits = [i for i, part in enumerate(self.pending) if part[0] == fragment_sequence]
+        segment_hits = [
+            segment for segment in self.recent_segments
+            if any(part[0] == fragment_sequence for part in segment[1])
+        ]
+
+        if len(pending_hits) == 1 and not segment_hits:
+            index = pending_hits[0]
+            _, _, arrival, pending_language = self.pending[index]
+            self.pending[index] = (fragment_sequence, text, arrival, language or pending_language)
+            return None
+
+        # 只更新完整包含於單一段落的片段（被句尾切開的片段無法對應修訂文字）
+        if len(segment_hits) == 1 and not pending_hits:
+            sequence, parts = segment_hits[0]
+            if sum(1 for part in parts if part[0] == fragment_sequence) == 1:
+                parts[:] = [
+                    (fragment_sequence, text, language or part[2]) if part[0] == fragment_sequence else part
+                    for part in parts
+                ]
+                return sequence, join_fragments([part[1] for part in parts]), self._segment_language(parts)
+
+        metrics.increment("segmenter.revisions_dropped")
+        return None
+
+    def _take_ready(self, now: float) -> List[Tuple[int, str, Optional[Tuple]]]:
+        """依句尾、長度與等待期限取出可送出的段落"""
+        ready = []
+
+        position = find_last_sentence_end(self._pending_text())
+        if position:
+            ready.append(self._emit(self._split_at(position)))
+
+        text = self._pending_text()
+        while len(text) > self.max_chars:
+            position = find_last_clause_end(text) or len(text)
+            ready.append(self._emit(self._split_at(position)))
+            metrics.increment("segmenter.length_flushes")
+            text = self._pending_text()
+
+        if self.pending and now - self.pending[0][2] >= self.max_wait:
+            ready.append(self._emit(self._split_at(len(text))))
+            metrics.increment("segmenter.deadline_flushes")
+
+        return ready
+
+    def _split_at(self, position: int) -> List[Tuple[int, str, float, Optional[Tuple]]]:
+        """在緩衝區文字的指定位置切分，返回位置之前的片段並保留其餘部分"""
+        head, tail = [], []
+        offset = 0
+        for index, part in enumerate(self.pending):
+            fragment_sequence, text, arrival, language = part
+            if index and needs_space(self.pending[index - 1][1], text):
+                offset += 1
+            start, end = offset, offset + len(text)
+            offset = end
+
+            if end <= position:
+                head.append(part)
+            elif start >= position:
+                tail.append(part)
+            else:
+                cut = position - start
+                head.append((fragment_sequence, text[:cut].strip(), arrival, language))
+                tail.append((fragment_sequence, text[cut:].strip(), arrival, language))
+
+        self.pending = [part for part in tail if part[1]]
+        return [part for part in head if part[1]]
+
+    def _emit(self, parts: List[Tuple[int, str, float, Optional[Tuple]]]) -> Tuple[int, str, Optional[Tuple]]:
+        """將片段組成段落並分配段落序號"""
+        sequence = self.next_sequence
+        self.next_sequence += 1
+        segment_parts = [(part[0], part[1], part[3]) for part in parts]
+        self.recent_segments.append((sequence, segment_parts))
+
+        metrics.increment("segmenter.segments")
+        metrics.set_gauge(
+            "segmenter.calls_saved_per_minute",
+            metrics.rate_per_minute("segmenter.fragments") - metrics.rate_per_minute("segmenter.segments")
+        )
+        return sequence, join_fragments([part[1] for part in parts]), self._segment_language(segment_parts)
+
+    @staticmethod
+    def _segment_language(parts: List[Tuple[int, str, Optional[Tuple]]]) -> Optional[Tuple]:
+        """段落的 (語言代碼, 信心)：取有偵測結果的片段中文字最長者"""
+        detected = [part for part in parts if part[2] is not None]
+        if not detected:
+            return None
+        return max(detected, key=lambda part: len(part[1]))[2]
+
+    def _pending_text(self) -> str:
+        return join_fragments([part[1] for part in self.pending])
@@ -0,0 +1,114 @@
+"""
+轉錄拼接模組 - 合併重疊視窗的轉錄結果，只輸出新增的文字
+"""
+import logging
+import re
+import string
+from typing import List, Optional, Tuple
+
+from ..utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 中日韓字元逐字切分，其他語言以單字切分
+CJK_RANGES = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+TOKEN_PATTERN = re.compile(rf"[{CJK_RANGES}]|[^\s{CJK_RANGES}]+")
+PUNCTUATION = string.punctuation + "，。！？、；：「」『』（）《》〈〉…～·"
+
+
+class TranscriptStitcher:
+    """
+    重疊視窗轉錄拼接器
+
+    先以詞級時間戳記對齊（丟棄已輸出時間範圍內的詞），
+    再以前後文字的後綴/前綴重疊比對處理時間戳記誤差或沒有時間戳記的情況。
+    """
+
+    def __init__(self, max_overlap_tokens: int = 30, min_overlap_tokens: int = 2,
+                 time_tolerance: float = 0.1):
+        self.max_overlap_tokens = max_overlap_tokens
+        self.min_overlap_tokens = min_overlap_tokens
+        self.time_tolerance = time_tolerance  # 時間戳記對齊的容許誤差（秒）
+        self.last_end_time = 0.0  # 已輸出內容在串流中的絕對結束時間
+        self.previous_tokens = []  # 最近輸出的正規化詞元
+
+    def stitch_words(
+        self, words: List[Tuple[float, float, str]], window_start: float
+    ) -> Optional[str]:
+        """
+        依詞級時間戳記拼接
+
+        Args:
+            words: [(start, end, word), ...]，時間相對於視窗起點
+            window_start: 視窗在串流中的起始時間（秒）
+
+        Returns:
+            新增的文字或 None
+        """
+        if not words:
+            return None
+
+        full_text = "".join(word for _, _, word in words).strip()
+
+        # 只保留中點落在已輸出範圍之後的詞
+        kept_words = [
+            word for start, end, word in words
+            if window_start + (start + end) / 2 > self.last_end_time - self.time_tolerance
+        ]
+        self.last_end_time = max(self.last_end_time, window_start + words[-1][1])
+
+        return self._emit(full_text, "".join(kept_words).strip())
+
+    def stitch_text(self, text: str) -> Optional[str]:
+        """沒有時間戳記時，以後綴/前綴重疊比對拼接"""
+        if not text or not text.strip():
+            return None
+
+        text = text.strip()
+        return self._emit(text, text)
+
+    def _emit(self, full_text: str, candidate: str) -> Optional[str]:
+        """移除與已輸出內容重疊的開頭，更新狀態並記錄節省的字數"""
+        new_text = self._remove_overlap(candidate)
+
+        metrics.increment("stitch.chars_in", len(full_text))
+        metrics.increment("stitch.chars_out", len(new_text))
+        metrics.increment("stitch.chars_dropped", len(full_text) - len(new_text))
+        metrics.set_gauge(
+            "stitch.saved_ratio",
+            metrics.get_counter("stitch.chars_dropped") / max(1, metrics.get_counter("stitch.chars_in"))
+        )
+
+        if not new_text:
+            # 完全重複的片段不需要再翻譯
+            metrics.increment("stitch.segments_suppressed")
+            logger.debug(f"略過重複的轉錄片段: {full_text}")
+            return None
+
+        self.previous_tokens.extend(self._normalize(token) for token in TOKEN_PATTERN.findall(new_text))
+        self.previous_tokens = self.previous_tokens[-self.max_overlap_tokens:]
+        return new_text
+
+    def _remove_overlap(self, text: str) -> str:
+        """找出已輸出內容結尾與新文字開頭的最長重疊，並返回其後的文字"""
+        matches = list(TOKEN_PATTERN.finditer(text))
+        tokens = [self._normalize(match.group()) for match in matches]
+
+        max_k = min(len(self.previous_tokens), len(tokens), self.max_overlap_tokens)
+        for k in range(max_k, 0, -1):
+            # 短重疊容易誤判，除非整段新文字都已輸出過
+            if k < self.min_overlap_tokens and k < len(tokens):
+                break
+            if self.previous_tokens[-k:] == tokens[:k]:
+                return text[matches[k - 1].end():].lstrip(PUNCTUATION + " ")
+
+        return text
+
+    def _normalize(self, token: str) -> str:
+        """正規化詞元以便比對（忽略大小寫與標點）"""
+        return token.strip(PUNCTUATION).lower()
+
+    def reset(self):
+        """重設拼接狀態"""
+        self.last_end_time = 0.0
+        self.previous_tokens.clear()
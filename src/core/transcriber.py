@@ -2,22 +2,108 @@
 語音轉文字模組 - 使用 OpenAI Whisper
 """
 import logging
+import os
 import threading
 import queue
 import time
 import numpy as np
 import torch
 import whisper
+from collections import deque
 from typing import Optional, List, Tuple
 
 from ..config import (
     WHISPER_MODEL, WHISPER_DEVICE, WHISPER_LANGUAGE,
+    WHISPER_WARMUP_DURATION, COMPILE_CACHE_DIR,
+    WHISPER_ADAPTIVE_MODEL, WHISPER_MODEL_LADDER, WHISPER_RTF_WINDOW,
+    WHISPER_RTF_DOWNGRADE_THRESHOLD, WHISPER_RTF_UPGRADE_THRESHOLD,
+    WHISPER_DRAFT_MODEL, WHISPER_REVISION_MAX_AGE, WHISPER_PROMPT_TOKEN_BUDGET, WHISPER_PROMPT_GLOSSARY,
     AUDIO_SAMPLE_RATE, MODELS_DIR
 )
+from ..utils.metrics import metrics
+from .stitcher import TranscriptStitcher
 
 logger = logging.getLogger(__name__)
 
 
+class WhisperPromptBuilder:
+    """
+    以 token 為單位管理 Whisper 上下文提示詞
+    
+    上下文以已分詞的 token ID 保存，只追加新的 token，並在 token 邊界
+    （且不切斷多位元組字元）截斷到固定預算，讓每個片段的提示詞長度可預期。
+    專有名詞表固定放在提示詞開頭，最近的上下文放在最後（最接近要轉錄的音訊），
+    兩者合計不超過預算。
+    """
+    
+    def __init__(self, tokenizer, token_budget: int = WHISPER_PROMPT_TOKEN_BUDGET,
+                 glossary: Optional[List[str]] = None):
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.glossary_tokens = []
+        self.tokens = []
+        self._prompt_text = ""
+        self._dirty = False
+        self.set_glossary(glossary or [])
+    
+    def set_glossary(self, terms: List[str]):
+        """設定專有名詞表（最多使用一半的預算，只保留完整的詞）"""
+        tokens = []
+        for term in terms:
+            term_tokens = self.tokenizer.encode((", " if tokens else " ") + term.strip())
+            if len(tokens) + len(term_tokens) + 1 > self.token_budget // 2:
+                break
+            tokens.extend(term_tokens)
+        
+        self.glossary_tokens = tokens + self.tokenizer.encode(".") if tokens else []
+        self._trim()
+        self._dirty = True
+    
+    def append_text(self, text: str):
+        """分詞並追加新的文字（只對新文字分詞）"""
+        if text:
+            self.append_tokens(self.tokenizer.encode(" " + text.strip()))
+    
+    def append_tokens(self, tokens: List[int]):
+        """追加已分詞的 token"""
+        # 只保留文字 token（排除時間戳記等特殊 token）
+        tokens = [token for token in tokens if token < self.tokenizer.eot]
+        if not tokens:
+            return
+        
+        self.tokens.extend(tokens)
+        self._trim()
+        self._dirty = True
+    
+    def _trim(self):
+        """將上下文截斷到扣除專有名詞表後剩餘的預算"""
+        context_budget = self.token_budget - len(self.glossary_tokens)
+        if len(self.tokens) > context_budget:
+            start = len(self.tokens) - context_budget
+            # 不從多位元組字元的中間開始
+            while start < len(self.tokens) and self._is_continuation(self.tokens[start]):
+                start += 1
+            self.tokens = self.tokens[start:]
+    
+    def _is_continuation(self, token: int) -> bool:
+        """判斷 token 是否以 UTF-8 延續位元組開頭（即屬於前一個字元）"""
+        token_bytes = self.tokenizer.encoding.decode_single_token_bytes(token)
+        return bool(token_bytes) and (token_bytes[0] & 0xC0) == 0x80
+    
+    @property
+    def prompt_text(self) -> str:
+        """提示詞文字（只在內容變更時重新解碼，長度受 token 預算限制）"""
+        if self._dirty:
+            self._prompt_text = self.tokenizer.decode(self.glossary_tokens + self.tokens).strip()
+            self._dirty = False
+        return self._prompt_text
+    
+    def clear(self):
+        """清除上下文（保留專有名詞表）"""
+        self.tokens = []
+        self._dirty = True
+
+
 class Transcriber:
     """語音轉文字處理器"""
     
@@ -25,7 +111,9 @@ class Transcriber:
         self.model = None
         self.device = WHISPER_DEVICE
         self.is_initialized = False
+        self.is_warmed_up = False
         self._model_dtype = torch.float32  # 默認數據類型
+        self._model_name = WHISPER_MODEL
         
         # 語言映射
         self.language_map = {
@@ -47,9 +135,54 @@ class Transcriber:
             "id": "indonesian",
         }
         
+        # 最近一次轉錄的 (語言代碼, 信心)，供相同語言略過翻譯使用
+        self.last_language = None
+        
         # 上下文緩衝區
         self.context_buffer = []
         self.max_context_length = 5  # 保留最近 5 個轉錄結果作為上下文
+        self.prompt_builder = None  # 模型載入後建立（需要模型的分詞器）
+        
+        # 自適應模型階梯（依即時率 RTF 在不同大小的模型間切換）
+        self.model_ladder = self._build_model_ladder()
+        self.model_level = 0  # 目前使用的階梯位置（0 為最大模型）
+        self.models = {}  # 已載入的模型 {模型名稱: 模型}
+        self.models_lock = threading.Lock()
+        self.load_lock = threading.Lock()  # 避免同一個模型被不同執行緒重複載入
+        self.rtf_history = deque(maxlen=WHISPER_RTF_WINDOW)
+        self.preload_thread = None
+    
+    def _build_model_ladder(self) -> List[str]:
+        """建立模型階梯，最上層固定為 WHISPER_MODEL"""
+        if not WHISPER_ADAPTIVE_MODEL:
+            return [WHISPER_MODEL]
+        
+        ladder = [WHISPER_MODEL]
+        for name in WHISPER_MODEL_LADDER:
+            if self._resolve_model_name(name) not in [self._resolve_model_name(n) for n in ladder]:
+                ladder.append(name)
+        return ladder
+    
+    def _resolve_model_name(self, name: str) -> str:
+        """將設定中的模型名稱轉換為 Whisper 可載入的名稱"""
+        if name == "turbo":
+            # Whisper turbo 是 large-v3 的優化版本
+            return "large-v3"
+        return name
+    
+    def _load_model(self, name: str):
+        """載入指定的 Whisper 模型"""
+        model_name = self._resolve_model_name(name)
+        logger.info(f"正在載入 Whisper {model_name} 模型...")
+        
+        # 設定模型下載路徑
+        download_root = str(MODELS_DIR)
+        
+        return whisper.load_model(
+            model_name,
+            device=self.device,
+            download_root=download_root
+        )
     
     def initialize(self):
         """初始化 Whisper 模型"""
@@ -65,26 +198,29 @@ class Transcriber:
                 logger.info("使用 CPU")
             
             # 載入模型
-            model_name = WHISPER_MODEL
-            if model_name == "turbo":
-                # Whisper turbo 是 large-v3 的優化版本
-                model_name = "large-v3"
+            self._model_name = self._resolve_model_name(WHISPER_MODEL)
+            self.model = self._load_model(WHISPER_MODEL)
             
-            logger.info(f"正在載入 Whisper {model_name} 模型...")
+            # 如果是 turbo 模式或 large-v3-turbo，進行額外的優化
+            if "turbo" in WHISPER_MODEL.lower():
+                self._optimize_for_turbo()
             
-            # 設定模型下載路徑
-            download_root = str(MODELS_DIR)
+            self.models[WHISPER_MODEL] = self.model
+            self.model_level = 0
             
-            # 載入模型
-            self.model = whisper.load_model(
-                model_name, 
-                device=self.device,
-                download_root=download_root
+            # 建立 token 層級的提示詞管理器
+            tokenizer = whisper.tokenizer.get_tokenizer(
+                self.model.is_multilingual,
+                num_languages=self.model.num_languages
             )
+            self.prompt_builder = WhisperPromptBuilder(tokenizer, glossary=WHISPER_PROMPT_GLOSSARY)
+            metrics.set_gauge("asr.model_level", 0)
             
-            # 如果是 turbo 模式或 large-v3-turbo，進行額外的優化
-            if "turbo" in WHISPER_MODEL.lower():
-                self._optimize_for_turbo()
+            # 在背景預先載入較小的模型，切換時不必等待載入
+            if len(self.model_ladder) > 1:
+                self.preload_thread = threading.Thread(target=self._preload_ladder_models)
+                self.preload_thread.daemon = True
+                self.preload_thread.start()
             
             self.is_initialized = True
             logger.info("Whisper 模型初始化完成")
@@ -93,6 +229,83 @@ class Transcriber:
             logger.error(f"初始化 Whisper 模型失敗: {e}")
             raise
     
+    def _get_model(self, name: str):
+        """取得已載入的模型（包含階梯中的模型），尚未載入時才載入"""
+        resolved_name = self._resolve_model_name(name)
+        with self.load_lock:
+            with self.models_lock:
+                for loaded_name, model in self.models.items():
+                    if self._resolve_model_name(loaded_name) == resolved_name:
+                        return model
+            
+            model = self._load_model(name)
+            with self.models_lock:
+                self.models[name] = model
+            return model
+    
+    def _preload_ladder_models(self):
+        """預先載入模型階梯中較小的模型"""
+        for name in self.model_ladder[1:]:
+            try:
+                self._get_model(name)
+                logger.info(f"備用 Whisper 模型已就緒: {name}")
+            except Exception as e:
+                logger.warning(f"載入備用 Whisper 模型 {name} 失敗: {e}")
+    
+    def _record_rtf(self, audio_duration: float, elapsed: float):
+        """記錄即時率（處理時間 / 音訊長度），並視需要切換模型"""
+        if audio_duration <= 0:
+            return
+        
+        rtf = elapsed / audio_duration
+        self.rtf_history.append(rtf)
+        metrics.set_gauge("asr.rtf", rtf)
+        metrics.observe("asr.rtf", rtf)
+        
+        if len(self.model_ladder) > 1:
+            self._maybe_switch_model()
+    
+    def _maybe_switch_model(self):
+        """依滾動平均 RTF 在模型階梯上下移動（於片段之間切換，不丟棄音訊）"""
+        # 切換後需累積足夠的樣本再判斷
+        if len(self.rtf_history) < self.rtf_history.maxlen:
+            return
+        
+        average_rtf = sum(self.rtf_history) / len(self.rtf_history)
+        
+        if average_rtf > WHISPER_RTF_DOWNGRADE_THRESHOLD:
+            target_level = self.model_level + 1
+        elif average_rtf < WHISPER_RTF_UPGRADE_THRESHOLD:
+            target_level = self.model_level - 1
+        else:
+            return
+        
+        if not 0 <= target_level < len(self.model_ladder):
+            return
+        
+        target_name = self.model_ladder[target_level]
+        with self.models_lock:
+            target_model = self.models.get(target_name)
+        
+        if target_model is None:
+            logger.debug(f"Whisper 模型 {target_name} 尚未載入，暫不切換")
+            return
+        
+        current_name = self.model_ladder[self.model_level]
+        direction = "降級" if target_level > self.model_level else "升級"
+        logger.info(
+            f"Whisper 模型{direction}: {current_name} -> {target_name} "
+            f"(平均 RTF: {average_rtf:.2f})"
+        )
+        
+        self.model = target_model
+        self.model_level = target_level
+        self.rtf_history.clear()
+        
+        metrics.increment("asr.model_switches")
+        metrics.increment("asr.model_downgrades" if direction == "降級" else "asr.model_upgrades")
+        metrics.set_gauge("asr.model_level", target_level)
+    
     def _optimize_for_turbo(self):
         """優化模型以獲得更好的即時性能"""
         try:
@@ -103,8 +316,11 @@ class Transcriber:
             # 啟用 PyTorch 優化
             if hasattr(torch, 'compile'):
                 try:
-                    self.model = torch.compile(self.model)
-                    logger.info("PyTorch 編譯優化已啟用")
+                    self._setup_compile_cache()
+                    # 只編譯編碼器：model.transcribe 不會經過 OptimizedModule.forward，
+                    # 而編碼器輸入固定為 30 秒梅爾頻譜，形狀穩定，適合編譯
+                    self.model.encoder = torch.compile(self.model.encoder)
+                    logger.info("PyTorch 編譯優化已啟用（將於預熱時完成編譯）")
                 except Exception as compile_error:
                     logger.warning(f"PyTorch 編譯失敗: {compile_error}")
             
@@ -114,6 +330,80 @@ class Transcriber:
             logger.warning(f"Turbo 優化失敗，使用標準模式: {e}")
             self._model_dtype = torch.float32
     
+    def _setup_compile_cache(self):
+        """設定持久化的編譯快取目錄，讓之後的啟動可重用已編譯的圖"""
+        dtype_name = str(self._model_dtype).replace("torch.", "")
+        torch_version = torch.__version__.replace("+", "_")
+        cache_dir = COMPILE_CACHE_DIR / f"{self._model_name}_{dtype_name}_torch{torch_version}"
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Inductor 與 Triton 會在首次編譯時讀取這些環境變數
+        os.environ["TORCHINDUCTOR_CACHE_DIR"] = str(cache_dir / "inductor")
+        os.environ["TRITON_CACHE_DIR"] = str(cache_dir / "triton")
+        os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+        
+        try:
+            import torch._inductor.config as inductor_config
+            if hasattr(inductor_config, "fx_graph_cache"):
+                inductor_config.fx_graph_cache = True
+        except Exception as e:
+            logger.debug(f"無法啟用 FX 圖快取: {e}")
+        
+        logger.info(f"編譯快取目錄: {cache_dir}")
+    
+    def warmup(self, language: str = "auto") -> bool:
+        """
+        使用合成音訊執行預熱推論，讓編譯與記憶體配置在真實音訊抵達前完成
+        
+        Args:
+            language: 語言代碼（與實際轉錄相同，以預熱相同的解碼路徑）
+            
+        Returns:
+            預熱是否成功
+        """
+        if not self.is_initialized:
+            logger.error("Whisper 模型尚未初始化")
+            return False
+        
+        start_time = time.time()
+        
+        # 低音量雜訊，避免全靜音時被 VAD/無語音判定提前略過
+        num_samples = int(WHISPER_WARMUP_DURATION * AUDIO_SAMPLE_RATE)
+        audio_data = (np.random.randn(num_samples) * 0.01).astype(np.float32)
+        
+        options = {
+            "language": self.language_map.get(language, None),
+            "task": "transcribe",
+            "fp16": self.device == "cuda",
+            "condition_on_previous_text": False,
+        }
+        
+        try:
+            with torch.no_grad():
+                self.model.transcribe(audio_data, **options)
+        except Exception as e:
+            logger.warning(f"Whisper 預熱失敗: {e}")
+            
+            # 已編譯的編碼器無法執行時，回退到原始編碼器
+            original_encoder = getattr(self.model.encoder, "_orig_mod", None)
+            if original_encoder is None:
+                return False
+            
+            logger.warning("停用 PyTorch 編譯，改用未編譯的編碼器")
+            self.model.encoder = original_encoder
+            try:
+                with torch.no_grad():
+                    self.model.transcribe(audio_data, **options)
+            except Exception as retry_error:
+                logger.warning(f"Whisper 預熱重試失敗: {retry_error}")
+                return False
+        
+        warmup_time = time.time() - start_time
+        metrics.set_gauge("asr.warmup_seconds", warmup_time)
+        self.is_warmed_up = True
+        logger.info(f"Whisper 預熱完成，耗時: {warmup_time:.2f} 秒")
+        return True
+    
     def transcribe(self, audio_data: np.ndarray, language: str = "auto") -> Optional[str]:
         """
         轉錄音訊為文字
@@ -130,42 +420,18 @@ class Transcriber:
             return None
         
         try:
-            # 確保音訊數據格式正確
-            if audio_data.dtype != np.float32:
-                audio_data = audio_data.astype(np.float32)
-            
-            # 正規化音訊
-            if np.abs(audio_data).max() > 1.0:
-                audio_data = audio_data / np.abs(audio_data).max()
-            
-            # 設定語言
-            whisper_language = self.language_map.get(language, None)
-            
-            # 準備轉錄選項
-            options = {
-                "language": whisper_language,
-                "task": "transcribe",
-                "fp16": self.device == "cuda",
-                "no_speech_threshold": 0.6,
-                "logprob_threshold": -1.0,
-                "compression_ratio_threshold": 2.4,
-                "condition_on_previous_text": True,
-                "initial_prompt": self._get_context_prompt(),
-            }
-            
-            # 執行轉錄
-            with torch.no_grad():
-                result = self.model.transcribe(
-                    audio_data,
-                    **options
-                )
-            
-            # 獲取文字
+            result = self._transcribe_result(self.model, audio_data, language, record_rtf=True)
             text = result.get("text", "").strip()
+            self.last_language = self._result_language(result, language)
             
             if text:
-                # 更新上下文
-                self._update_context(text)
+                # 更新上下文（直接沿用 Whisper 輸出的 token，不需重新分詞）
+                tokens = [
+                    token
+                    for segment in result.get("segments", [])
+                    for token in segment.get("tokens", [])
+                ]
+                self._update_context(text, tokens)
                 logger.debug(f"轉錄結果: {text}")
                 return text
             
@@ -175,6 +441,90 @@ class Transcriber:
             logger.error(f"轉錄失敗: {e}")
             return None
     
+    def _run_transcription(
+        self, model, audio_data: np.ndarray, language: str, record_rtf: bool = False
+    ) -> str:
+        """使用指定模型執行轉錄，返回去除空白的文字（不更新上下文）"""
+        result = self._transcribe_result(model, audio_data, language, record_rtf)
+        return result.get("text", "").strip()
+    
+    def _transcribe_result(
+        self, model, audio_data: np.ndarray, language: str, record_rtf: bool = False,
+        **extra_options
+    ) -> dict:
+        """使用指定模型執行轉錄，返回 Whisper 的原始結果"""
+        # 確保音訊數據格式正確（處理執行緒傳入的可能是 list）
+        audio_data = np.asarray(audio_data, dtype=np.float32)
+        
+        # 正規化音訊
+        if np.abs(audio_data).max() > 1.0:
+            audio_data = audio_data / np.abs(audio_data).max()
+        
+        # 設定語言
+        whisper_language = self.language_map.get(language, None)
+        fp16 = self.device == "cuda"
+        language_probability = 1.0
+        if whisper_language is None:
+            # 與 Whisper 內部相同的語言偵測，另外保留信心；偵測結果傳入轉錄，不會重複偵測
+            whisper_language, language_probability = self._detect_language(model, audio_data, fp16)
+        
+        # 準備轉錄選項
+        options = {
+            "language": whisper_language,
+            "task": "transcribe",
+            "fp16": fp16,
+            "no_speech_threshold": 0.6,
+            "logprob_threshold": -1.0,
+            "compression_ratio_threshold": 2.4,
+            "condition_on_previous_text": True,
+            "initial_prompt": self._get_context_prompt(),
+        }
+        options.update(extra_options)
+        
+        # 執行轉錄
+        start_time = time.time()
+        with torch.no_grad():
+            result = model.transcribe(
+                audio_data,
+                **options
+            )
+        if record_rtf:
+            self._record_rtf(len(audio_data) / AUDIO_SAMPLE_RATE, time.time() - start_time)
+        
+        result["language_probability"] = language_probability
+        return result
+    
+    def _detect_language(
+        self, model, audio_data: np.ndarray, fp16: bool
+    ) -> Tuple[Optional[str], Optional[float]]:
+        """
+        偵測音訊前 30 秒的語言
+        
+        Returns:
+            (語言代碼, 機率)；無法偵測時為 (None, None)，交由 Whisper 自行偵測
+        """
+        if not model.is_multilingual:
+            return "en", 1.0
+        
+        try:
+            mel = whisper.log_mel_spectrogram(audio_data, model.dims.n_mels, padding=whisper.audio.N_SAMPLES)
+            mel_segment = whisper.pad_or_trim(mel, whisper.audio.N_FRAMES).to(model.device)
+            mel_segment = mel_segment.to(torch.float16 if fp16 else torch.float32)
+            with torch.no_grad():
+                _, probs = model.detect_language(mel_segment)
+        except Exception as e:
+            logger.debug(f"語言偵測失敗: {e}")
+            return None, None
+        
+        detected = max(probs, key=probs.get)
+        return detected, probs[detected]
+    
+    def _result_language(self, result: dict, language: str) -> Tuple[Optional[str], Optional[float]]:
+        """轉錄結果的 (語言代碼, 信心)；指定語言時信心為 1"""
+        if language != "auto":
+            return language, 1.0
+        return result.get("language"), result.get("language_probability")
+    
     def transcribe_with_timestamps(
         self, audio_data: np.ndarray, language: str = "auto"
     ) -> Optional[List[Tuple[float, float, str]]]:
@@ -227,6 +577,9 @@ class Transcriber:
     
     def _get_context_prompt(self) -> str:
         """獲取上下文提示詞"""
+        if self.prompt_builder is not None:
+            return self.prompt_builder.prompt_text
+        
         if not self.context_buffer:
             return ""
         
@@ -240,20 +593,40 @@ class Transcriber:
         
         return context
     
-    def _update_context(self, text: str):
-        """更新上下文緩衝區"""
+    def _update_context(self, text: str, tokens: Optional[List[int]] = None):
+        """
+        更新上下文緩衝區
+        
+        Args:
+            text: 新的轉錄文字
+            tokens: 對應的 token ID（若已由 Whisper 提供，可避免重新分詞）
+        """
         self.context_buffer.append(text)
         
         # 保持緩衝區大小
         if len(self.context_buffer) > self.max_context_length:
             self.context_buffer.pop(0)
+        
+        if self.prompt_builder is not None:
+            if tokens:
+                self.prompt_builder.append_tokens(tokens)
+            else:
+                self.prompt_builder.append_text(text)
     
     def clear_context(self):
         """清除上下文"""
         self.context_buffer.clear()
+        if self.prompt_builder is not None:
+            self.prompt_builder.clear()
     
     def cleanup(self):
         """清理資源"""
+        if self.preload_thread and self.preload_thread.is_alive():
+            self.preload_thread.join()
+        
+        with self.models_lock:
+            self.models.clear()
+        
         if self.model:
             del self.model
             self.model = None
@@ -262,9 +635,147 @@ class Transcriber:
             torch.cuda.empty_cache()
         
         self.is_initialized = False
+        self.is_warmed_up = False
         logger.info("Whisper 模型已清理")
 
 
+class TwoTierTranscriber(Transcriber):
+    """
+    雙層轉錄器 - 小模型立即產生草稿字幕，大模型於背景重新轉錄同一片段並修訂
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.draft_model = None
+        self.refine_queue = queue.Queue()
+        self.revision_queue = queue.Queue()
+        self.refine_thread = None
+        self.is_refining = False
+        self.latest_sequence = -1  # 最新草稿片段的序號
+    
+    def initialize(self):
+        """初始化大模型與草稿模型，並啟動修訂執行緒"""
+        super().initialize()
+        
+        try:
+            logger.info(f"正在載入草稿模型: {WHISPER_DRAFT_MODEL}")
+            # 草稿模型也在模型階梯中時沿用同一個實例
+            self.draft_model = self._get_model(WHISPER_DRAFT_MODEL)
+        except Exception as e:
+            logger.error(f"載入草稿模型失敗: {e}")
+            raise
+        
+        self.is_refining = True
+        self.refine_thread = threading.Thread(target=self._refine_loop)
+        self.refine_thread.daemon = True
+        self.refine_thread.start()
+    
+    def transcribe_draft(
+        self, audio_data: np.ndarray, language: str, sequence: int
+    ) -> Optional[str]:
+        """
+        以草稿模型立即轉錄，並排入大模型修訂
+        
+        Args:
+            audio_data: 音訊數據
+            language: 語言代碼
+            sequence: 片段序號（修訂結果以此序號更新對應字幕）
+            
+        Returns:
+            草稿文字或 None
+        """
+        if not self.is_initialized or self.draft_model is None:
+            logger.error("Whisper 模型尚未初始化")
+            return None
+        
+        audio_data = np.asarray(audio_data, dtype=np.float32)
+        self.latest_sequence = sequence
+        
+        try:
+            start_time = time.time()
+            result = self._transcribe_result(self.draft_model, audio_data, language)
+            draft = result.get("text", "").strip()
+            self.last_language = self._result_language(result, language)
+            metrics.observe("asr.draft_latency", time.time() - start_time)
+        except Exception as e:
+            logger.error(f"草稿轉錄失敗: {e}")
+            return None
+        
+        if not draft:
+            return None
+        
+        # 草稿結果作為後續片段的上下文，修訂結果不再回寫
+        self._update_context(draft)
+        self.refine_queue.put((sequence, audio_data, language, draft, time.time()))
+        
+        logger.debug(f"草稿轉錄結果 #{sequence}: {draft}")
+        return draft
+    
+    def get_revisions(self) -> List[Tuple[int, str, Tuple[Optional[str], Optional[float]]]]:
+        """取出所有已完成且與草稿不同的修訂結果 [(序號, 文字, (語言代碼, 信心)), ...]"""
+        revisions = []
+        while True:
+            try:
+                revisions.append(self.revision_queue.get_nowait())
+            except queue.Empty:
+                return revisions
+    
+    def _refine_loop(self):
+        """
+        修訂執行緒：以大模型重新轉錄草稿片段
+        
+        修訂的 RTF 只記錄為指標，不計入模型階梯，避免在此執行緒切換草稿路徑正在使用的模型。
+        """
+        while self.is_refining:
+            try:
+                sequence, audio_data, language, draft, draft_time = self.refine_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            
+            # 已捲出畫面的舊片段不再修訂，節省大模型的運算
+            if sequence < self.latest_sequence - WHISPER_REVISION_MAX_AGE:
+                metrics.increment("asr.revisions_skipped")
+                continue
+            
+            try:
+                start_time = time.time()
+                result = self._transcribe_result(self.model, audio_data, language)
+                text = result.get("text", "").strip()
+            except Exception as e:
+                logger.error(f"修訂轉錄失敗: {e}")
+                continue
+            
+            audio_duration = len(audio_data) / AUDIO_SAMPLE_RATE
+            if audio_duration > 0:
+                metrics.observe("asr.revision_rtf", (time.time() - start_time) / audio_duration)
+            metrics.observe("asr.revision_latency", time.time() - draft_time)
+            metrics.increment("asr.revisions")
+            
+            if text and text != draft:
+                metrics.increment("asr.revisions_changed")
+                # 修訂結果附上大模型偵測到的語言（last_language 屬於最新的草稿片段）
+                self.revision_queue.put((sequence, text, self._result_language(result, language)))
+                logger.debug(f"修訂轉錄結果 #{sequence}: {text}")
+            
+            revisions = metrics.get_counter("asr.revisions")
+            metrics.set_gauge(
+                "asr.revision_rate",
+                metrics.get_counter("asr.revisions_changed") / revisions
+            )
+    
+    def cleanup(self):
+        """停止修訂執行緒並清理資源"""
+        self.is_refining = False
+        if self.refine_thread and self.refine_thread.is_alive():
+            self.refine_thread.join(timeout=5)
+        
+        if self.draft_model:
+            del self.draft_model
+            self.draft_model = None
+        
+        super().cleanup()
+
+
 class WhisperTurbo(Transcriber):
     """
     Whisper Turbo 實作 - 針對即時轉錄優化
@@ -277,6 +788,7 @@ class WhisperTurbo(Transcriber):
         self.stride = 1  # 秒
         self.audio_buffer = []
         self.buffer_lock = threading.Lock()
+        self.stitcher = TranscriptStitcher()  # 去除重疊視窗重複轉錄的文字
     
     def initialize(self):
         """初始化 Turbo 模式"""
@@ -318,6 +830,8 @@ class WhisperTurbo(Transcriber):
             return
         
         buffer = []
+        window_start = 0.0  # 目前視窗在串流中的起始時間（秒）
+        self.stitcher.reset()
         
         for audio_chunk in audio_stream:
             # 加入緩衝區
@@ -333,19 +847,48 @@ class WhisperTurbo(Transcriber):
                 
                 # 檢測是否有語音
                 if self._has_speech(audio_data):
-                    # 轉錄
-                    text = self.transcribe(audio_data)
+                    # 轉錄並只保留重疊部分之後的新文字
+                    text = self._transcribe_window(audio_data, window_start)
                     if text:
                         yield text
                 
                 # 移除已處理的部分，保留重疊
                 samples_to_remove = int(self.stride_length * AUDIO_SAMPLE_RATE)
-                total_samples = sum(len(chunk) for chunk in buffer)
+                window_start += samples_to_remove / AUDIO_SAMPLE_RATE
                 
                 # 重新建立緩衝區
                 remaining_audio = audio_data[samples_to_remove:]
                 buffer = [remaining_audio]
     
+    def _transcribe_window(self, audio_data: np.ndarray, window_start: float) -> Optional[str]:
+        """轉錄一個重疊視窗，以詞級時間戳記拼接後返回新增的文字"""
+        try:
+            result = self._transcribe_result(
+                self.model, audio_data, "auto", record_rtf=True, word_timestamps=True
+            )
+        except Exception as e:
+            logger.error(f"轉錄失敗: {e}")
+            return None
+        
+        words = [
+            (word["start"], word["end"], word["word"])
+            for segment in result.get("segments", [])
+            for word in segment.get("words", [])
+        ]
+        
+        if words:
+            text = self.stitcher.stitch_words(words, window_start)
+        else:
+            # 沒有詞級時間戳記時退回文字重疊比對
+            text = self.stitcher.stitch_text(result.get("text", ""))
+        
+        if text:
+            # 只有新增的文字進入上下文，避免重複內容佔滿緩衝區
+            self._update_context(text)
+            logger.debug(f"轉錄結果: {text}")
+        
+        return text
+    
     def _has_speech(self, audio_data: np.ndarray) -> bool:
         """檢測音訊中是否有語音"""
         if self.vad is None:
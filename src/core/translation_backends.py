@@ -0,0 +1,287 @@
+"""
+翻譯後端模組 - 依語言對選擇 Gemma 或輕量的序列到序列機器翻譯模型
+"""
+import logging
+import math
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from ..config import (
+    MODELS_DIR, GEMMA_MAX_LENGTH, CT2_MODEL_NAME, CT2_COMPUTE_TYPE, CT2_THREADS, CT2_BEAM_SIZE,
+    GGUF_MODEL_PATH, LLAMA_CPP_CONTEXT, LLAMA_CPP_THREADS, GEMMA_GENERATION_PROFILE,
+    GEMMA_LENGTH_RATIOS, GEMMA_LENGTH_SLACK, GEMMA_MIN_NEW_TOKENS_BUDGET
+)
+
+logger = logging.getLogger(__name__)
+
+# 語言代碼 -> 提示詞中使用的語言名稱
+LANGUAGE_NAMES = {
+    "zh": "Chinese",
+    "en": "English",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "ru": "Russian",
+    "pt": "Portuguese",
+    "it": "Italian",
+    "th": "Thai",
+    "vi": "Vietnamese",
+    "ar": "Arabic",
+    "hi": "Hindi",
+    "id": "Indonesian",
+}
+
+# NLLB 使用的語言代碼
+NLLB_LANGUAGE_CODES = {
+    "zh": "zho_Hant",
+    "en": "eng_Latn",
+    "ja": "jpn_Jpan",
+    "ko": "kor_Hang",
+    "es": "spa_Latn",
+    "fr": "fra_Latn",
+    "de": "deu_Latn",
+    "ru": "rus_Cyrl",
+    "pt": "por_Latn",
+    "it": "ita_Latn",
+    "th": "tha_Thai",
+    "vi": "vie_Latn",
+    "ar": "arb_Arab",
+    "hi": "hin_Deva",
+    "id": "ind_Latn",
+}
+
+
+def language_pair_setting(table: Dict, source_language: Optional[str], target_language: str, default):
+    """查詢語言對設定（依序比對 來源-目標、*-目標、來源-*、*-*）"""
+    source_language = source_language or "*"
+    for key in (f"{source_language}-{target_language}", f"*-{target_language}",
+                f"{source_language}-*", "*-*"):
+        if key in table:
+            return table[key]
+    return default
+
+
+def estimate_max_new_tokens(source_tokens: int, source_language: Optional[str], target_language: str) -> int:
+    """依原文詞元數與語言對的輸出/輸入比例（GEMMA_LENGTH_RATIOS）估計輸出詞元上限"""
+    if GEMMA_GENERATION_PROFILE != "subtitle":
+        return GEMMA_MAX_LENGTH
+
+    ratio = language_pair_setting(GEMMA_LENGTH_RATIOS, source_language, target_language, 2.0)
+    budget = math.ceil(source_tokens * ratio) + GEMMA_LENGTH_SLACK
+    return min(GEMMA_MAX_LENGTH, max(GEMMA_MIN_NEW_TOKENS_BUDGET, budget))
+
+
+class TranslationBackend(ABC):
+    """
+    翻譯後端介面
+
+    後端只負責把文字翻譯成目標語言；快取、上下文與資源清理由 Translator 統一處理。
+    """
+
+    name = ""
+
+    @property
+    def model_id(self) -> str:
+        """快取與翻譯記憶使用的模型 ID（不同模型的翻譯不共用）"""
+        return self.name
+
+    def initialize(self):
+        """載入模型"""
+
+    def supports(self, source_language: Optional[str], target_language: str) -> bool:
+        """是否支援此語言對（不支援時 Translator 改用 Gemma）"""
+        return True
+
+    @abstractmethod
+    def translate_batch(
+        self, texts: List[str], source_language: Optional[str], target_language: str
+    ) -> List[Optional[str]]:
+        """批次翻譯（返回未清理的模型輸出）"""
+
+    def translate(
+        self, text: str, source_language: Optional[str], target_language: str, streamer=None
+    ) -> Optional[str]:
+        """翻譯單一文字；不支援逐詞元串流的後端一次輸出完整結果"""
+        translation = self.translate_batch([text], source_language, target_language)[0]
+        if streamer is not None:
+            streamer.on_finalized_text(translation or "", stream_end=True)
+        return translation
+
+    def cleanup(self):
+        """釋放模型"""
+
+
+class GemmaBackend(TranslationBackend):
+    """Gemma 生成式翻譯後端（使用 Translator 載入的模型、提示詞與上下文）"""
+
+    name = "gemma"
+
+    def __init__(self, translator):
+        self.translator = translator
+
+    @property
+    def model_id(self) -> str:
+        return self.translator._gemma_model_id()
+
+    def translate_batch(
+        self, texts: List[str], source_language: Optional[str], target_language: str
+    ) -> List[Optional[str]]:
+        return self.translator._generate_batch(texts, target_language)
+
+    def translate(
+        self, text: str, source_language: Optional[str], target_language: str, streamer=None
+    ) -> Optional[str]:
+        return self.translator._generate(text, target_language, streamer=streamer)
+
+
+class CTranslate2Backend(TranslationBackend):
+    """
+    CTranslate2 序列到序列機器翻譯後端（NLLB 或 Marian，int8）
+
+    首次使用時將 Hugging Face 模型轉換為 CTranslate2 格式並保存在 MODELS_DIR。
+    NLLB 為多語言模型，需要已知的原文語言；Marian 模型本身即對應固定的語言對。
+    """
+
+    name = "ctranslate2"
+
+    def __init__(self, model_name: str = CT2_MODEL_NAME, compute_type: str = CT2_COMPUTE_TYPE,
+                 threads: int = CT2_THREADS):
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.threads = threads
+        self.is_multilingual = "nllb" in model_name.lower()
+        self.translator = None
+        self.tokenizer = None
+
+    @property
+    def model_id(self) -> str:
+        return f"ctranslate2:{self.model_name}:{self.compute_type}"
+
+    def initialize(self):
+        """載入（必要時先轉換）CTranslate2 模型"""
+        import ctranslate2
+        from transformers import AutoTokenizer
+
+        model_dir = MODELS_DIR / "ctranslate2" / self.model_name.replace("/", "--")
+        if not (model_dir / "model.bin").exists():
+            logger.info(f"轉換 {self.model_name} 為 CTranslate2 格式 ({self.compute_type})...")
+            converter = ctranslate2.converters.TransformersConverter(self.model_name)
+            converter.convert(str(model_dir), quantization=self.compute_type)
+
+        self.translator = ctranslate2.Translator(
+            str(model_dir), device="cpu", compute_type=self.compute_type, intra_threads=self.threads
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, cache_dir=str(MODELS_DIR))
+        logger.info(f"CTranslate2 翻譯後端已載入: {self.model_name}")
+
+    def supports(self, source_language: Optional[str], target_language: str) -> bool:
+        if self.is_multilingual:
+            return source_language in NLLB_LANGUAGE_CODES and target_language in NLLB_LANGUAGE_CODES
+        return True
+
+    def translate_batch(
+        self, texts: List[str], source_language: Optional[str], target_language: str
+    ) -> List[Optional[str]]:
+        target_prefix = None
+        if self.is_multilingual:
+            self.tokenizer.src_lang = NLLB_LANGUAGE_CODES[source_language]
+            target_prefix = [[NLLB_LANGUAGE_CODES[target_language]]] * len(texts)
+
+        sources = [self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(text)) for text in texts]
+        results = self.translator.translate_batch(
+            sources,
+            target_prefix=target_prefix,
+            beam_size=CT2_BEAM_SIZE,
+            max_decoding_length=GEMMA_MAX_LENGTH
+        )
+
+        translations = []
+        for result in results:
+            tokens = result.hypotheses[0]
+            if self.is_multilingual:
+                tokens = tokens[1:]  # 去除目標語言標記
+            translation = self.tokenizer.decode(
+                self.tokenizer.convert_tokens_to_ids(tokens), skip_special_tokens=True
+            )
+            translations.append(translation.strip() or None)
+
+        return translations
+
+    def cleanup(self):
+        self.translator = None
+        self.tokenizer = None
+
+
+class LlamaCppBackend(TranslationBackend):
+    """
+    llama.cpp GGUF 後端
+
+    以 int4 等 GGUF 量化權重在 CPU 上執行 Gemma，記憶體與每個詞元的頻寬用量最低。
+    每個片段獨立翻譯（不使用上下文），並以貪婪解碼、遇到換行即停止。
+    """
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path=GGUF_MODEL_PATH, context_size: int = LLAMA_CPP_CONTEXT,
+                 threads: int = LLAMA_CPP_THREADS):
+        self.model_path = model_path
+        self.context_size = context_size
+        self.threads = threads
+        self.llm = None
+
+    @property
+    def model_id(self) -> str:
+        return f"llama_cpp:{self.model_path.name}"
+
+    def initialize(self):
+        """載入 GGUF 模型"""
+        from llama_cpp import Llama
+
+        if not self.model_path.exists():
+            raise FileNotFoundError(f"找不到 GGUF 模型: {self.model_path}")
+
+        self.llm = Llama(
+            model_path=str(self.model_path),
+            n_ctx=self.context_size,
+            n_threads=self.threads,
+            verbose=False
+        )
+        logger.info(f"llama.cpp 翻譯後端已載入: {self.model_path.name}")
+
+    def translate_batch(
+        self, texts: List[str], source_language: Optional[str], target_language: str
+    ) -> List[Optional[str]]:
+        target_lang_name = LANGUAGE_NAMES.get(target_language, target_language)
+
+        translations = []
+        for text in texts:
+            source_tokens = len(self.llm.tokenize(text.encode("utf-8"), add_bos=False))
+            response = self.llm.create_chat_completion(
+                messages=[{"role": "user", "content": f"Translate to {target_lang_name}: {text}"}],
+                max_tokens=estimate_max_new_tokens(source_tokens, source_language, target_language),
+                temperature=0.0,
+                stop=["\n"]
+            )
+            translation = response["choices"][0]["message"]["content"] or ""
+            translations.append(translation.strip() or None)
+
+        return translations
+
+    def cleanup(self):
+        self.llm = None
+
+
+# 可在 TRANSLATION_BACKENDS 中使用的後端（"gemma" 由 Translator 自行建立）
+BACKEND_CLASSES = {
+    CTranslate2Backend.name: CTranslate2Backend,
+    LlamaCppBackend.name: LlamaCppBackend,
+}
+
+
+def create_backend(name: str) -> TranslationBackend:
+    """依名稱建立翻譯後端"""
+    if name not in BACKEND_CLASSES:
+        raise ValueError(f"未知的翻譯後端: {name}")
+    return BACKEND_CLASSES[name]()
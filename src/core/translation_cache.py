@@ -0,0 +1,414 @@
+"""
+翻譯快取模組 - 常數時間存取的 LRU/LFU 快取與磁碟翻譯記憶庫
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+
+from ..config import (
+    TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_POLICY, TRANSLATION_CACHE_TTL,
+    TRANSLATION_MEMORY_PATH, TRANSLATION_MEMORY_MAX_ENTRIES,
+    TRANSLATION_MEMORY_FLUSH_INTERVAL
+)
+from ..utils.metrics import metrics
+from ..utils.text import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """快取項目"""
+    __slots__ = ("value", "frequency", "expires_at", "size")
+
+    def __init__(self, value: str, expires_at: Optional[float], size: int):
+        self.value = value
+        self.frequency = 1
+        self.expires_at = expires_at
+        self.size = size
+
+
+class TranslationCache:
+    """
+    翻譯快取
+
+    get/put 皆為常數時間：
+    - LRU：以 OrderedDict 維護存取順序
+    - LFU：以「次數 -> 有序鍵集合」的分桶維護，同次數時淘汰最久未使用者；
+      次數設有上限，並定期將所有次數減半（老化），避免過去的熱門項目永遠佔用快取
+    """
+
+    MAX_FREQUENCY = 32  # LFU 次數上限（讓尋找最小次數的分桶為常數時間）
+
+    def __init__(self, max_size: int = TRANSLATION_CACHE_SIZE,
+                 policy: str = TRANSLATION_CACHE_POLICY,
+                 ttl: Optional[float] = TRANSLATION_CACHE_TTL,
+                 aging_interval: Optional[int] = None):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"不支援的快取淘汰策略: {policy}")
+
+        self.max_size = max_size
+        self.policy = policy
+        self.ttl = ttl
+        # 每插入 aging_interval 次執行一次老化（攤銷後仍為常數時間）
+        self.aging_interval = aging_interval or max_size
+        self.lock = threading.Lock()
+
+        self.cache = {}  # {鍵: _CacheEntry}
+        self.lru_order = OrderedDict()  # LRU 存取順序
+        self.frequency_buckets = {}  # LFU 分桶 {次數: OrderedDict}
+        self.min_frequency = 1
+        self.inserts_since_aging = 0
+
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """獲取快取的翻譯"""
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at is not None and time.monotonic() >= entry.expires_at:
+                self._remove(key, entry)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._touch(key, entry)
+            self.hits += 1
+            return entry.value
+
+    def put(self, key: str, value: str):
+        """加入快取"""
+        with self.lock:
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            size = len(key.encode("utf-8")) + len(value.encode("utf-8"))
+
+            entry = self.cache.get(key)
+            if entry is not None:
+                # 更新既有項目視為一次存取
+                self.bytes += size - entry.size
+                entry.value = value
+                entry.expires_at = expires_at
+                entry.size = size
+                self._touch(key, entry)
+                return
+
+            # 如果快取滿了，淘汰一個項目
+            if len(self.cache) >= self.max_size:
+                self._evict()
+
+            entry = _CacheEntry(value, expires_at, size)
+            self.cache[key] = entry
+            self.bytes += size
+
+            if self.policy == "lru":
+                self.lru_order[key] = None
+            else:
+                self.frequency_buckets.setdefault(1, OrderedDict())[key] = None
+                self.min_frequency = 1
+
+                self.inserts_since_aging += 1
+                if self.inserts_since_aging >= self.aging_interval:
+                    self._age()
+
+    def _touch(self, key: str, entry: _CacheEntry):
+        """記錄一次存取"""
+        if self.policy == "lru":
+            self.lru_order.move_to_end(key)
+            return
+
+        old_frequency = entry.frequency
+        bucket = self.frequency_buckets[old_frequency]
+        if old_frequency >= self.MAX_FREQUENCY:
+            bucket.move_to_end(key)
+            return
+
+        del bucket[key]
+        if not bucket:
+            del self.frequency_buckets[old_frequency]
+            if self.min_frequency == old_frequency:
+                self.min_frequency = old_frequency + 1
+
+        entry.frequency = old_frequency + 1
+        self.frequency_buckets.setdefault(entry.frequency, OrderedDict())[key] = None
+
+    def _evict(self):
+        """淘汰一個項目（LRU：最久未使用；LFU：最少使用中最久未使用者）"""
+        if self.policy == "lru":
+            key, _ = self.lru_order.popitem(last=False)
+        else:
+            bucket = self._min_bucket()
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self.frequency_buckets[self.min_frequency]
+
+        entry = self.cache.pop(key)
+        self.bytes -= entry.size
+        self.evictions += 1
+
+    def _min_bucket(self) -> OrderedDict:
+        """獲取最小次數的分桶（次數有上限，因此最多檢查常數個分桶）"""
+        while self.min_frequency not in self.frequency_buckets:
+            self.min_frequency += 1
+            if self.min_frequency > self.MAX_FREQUENCY:
+                self.min_frequency = min(self.frequency_buckets)
+        return self.frequency_buckets[self.min_frequency]
+
+    def _remove(self, key: str, entry: _CacheEntry):
+        """移除指定項目"""
+        del self.cache[key]
+        self.bytes -= entry.size
+
+        if self.policy == "lru":
+            del self.lru_order[key]
+        else:
+            bucket = self.frequency_buckets[entry.frequency]
+            del bucket[key]
+            if not bucket:
+                del self.frequency_buckets[entry.frequency]
+
+    def _age(self):
+        """將所有 LFU 次數減半，讓舊的熱門項目逐漸失去優勢"""
+        self.inserts_since_aging = 0
+        aged_buckets = {}
+
+        for frequency in sorted(self.frequency_buckets):
+            new_frequency = max(1, frequency // 2)
+            target = aged_buckets.setdefault(new_frequency, OrderedDict())
+            for key in self.frequency_buckets[frequency]:
+                self.cache[key].frequency = new_frequency
+                target[key] = None
+
+        self.frequency_buckets = aged_buckets
+        self.min_frequency = min(aged_buckets) if aged_buckets else 1
+
+    def stats(self) -> Dict[str, float]:
+        """獲取快取統計"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "bytes": self.bytes,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def clear(self):
+        """清空快取"""
+        with self.lock:
+            self.cache.clear()
+            self.lru_order.clear()
+            self.frequency_buckets.clear()
+            self.min_frequency = 1
+            self.inserts_since_aging = 0
+            self.bytes = 0
+
+
+class TranslationMemory:
+    """
+    磁碟翻譯記憶庫 - 以 SQLite 保存翻譯，跨工作階段共用
+
+    以 (正規化原文, 目標語言, 模型 ID, 提示詞版本) 為鍵；模型 ID 預設為建立時指定的模型，
+    使用其他翻譯後端的語言對可在查詢與寫入時傳入該後端的模型 ID。
+    讀取時先查記憶體前端快取，未命中再查磁碟（read-through）；
+    寫入先進入前端快取與待寫佇列，由背景執行緒批次寫入（write-behind）。
+    """
+
+    def __init__(self, model_id: str, prompt_version: str,
+                 db_path=TRANSLATION_MEMORY_PATH,
+                 max_entries: int = TRANSLATION_MEMORY_MAX_ENTRIES,
+                 flush_interval: float = TRANSLATION_MEMORY_FLUSH_INTERVAL,
+                 front_cache: Optional[TranslationCache] = None):
+        self.model_id = model_id
+        self.prompt_version = prompt_version
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.front_cache = front_cache if front_cache is not None else TranslationCache()
+
+        self.db_lock = threading.Lock()
+        self.connection = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._create_schema()
+
+        self.pending_lock = threading.Lock()
+        self.pending_writes = {}  # {鍵: 翻譯} 尚未寫入磁碟的翻譯
+        self.pending_touches = {}  # {鍵: 最後使用時間} 磁碟命中後待更新的使用時間
+
+        # 統計
+        self.front_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.is_running = True
+        self.writer_thread = threading.Thread(target=self._writer_loop)
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def _create_schema(self):
+        """建立資料表"""
+        with self.db_lock:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    source TEXT NOT NULL,
+                    target_language TEXT NOT NULL,
+                    model_id TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    use_count INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (source, target_language, model_id, prompt_version)
+                )
+            """)
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_translations_last_used ON translations (last_used)"
+            )
+            self.connection.commit()
+
+    def _key(self, source: str, target_language: str, model_id: Optional[str] = None) -> Tuple[str, str, str, str]:
+        """建立記憶庫鍵"""
+        return (normalize_text(source), target_language, model_id or self.model_id, self.prompt_version)
+
+    def _front_key(self, key: Tuple[str, str, str, str]) -> str:
+        """前端快取的鍵（包含模型 ID，不同後端的翻譯不共用）"""
+        return f"{key[0]}:{key[1]}:{key[2]}"
+
+    def get(self, source: str, target_language: str, model_id: Optional[str] = None) -> Optional[str]:
+        """查詢翻譯（前端快取 -> 待寫佇列 -> 磁碟）"""
+        start_time = time.perf_counter()
+        key = self._key(source, target_language, model_id)
+        front_key = self._front_key(key)
+
+        translation = self.front_cache.get(front_key)
+        if translation is not None:
+            self.front_hits += 1
+            self._record_lookup("front", start_time)
+            return translation
+
+        with self.pending_lock:
+            translation = self.pending_writes.get(key)
+
+        if translation is None:
+            with self.db_lock:
+                row = self.connection.execute(
+                    "SELECT translation FROM translations WHERE source = ? AND target_language = ? "
+                    "AND model_id = ? AND prompt_version = ?",
+                    key
+                ).fetchone()
+            translation = row[0] if row else None
+
+            if translation is not None:
+                with self.pending_lock:
+                    self.pending_touches[key] = time.time()
+
+        if translation is None:
+            self.misses += 1
+            self._record_lookup("miss", start_time)
+            return None
+
+        self.front_cache.put(front_key, translation)
+        self.disk_hits += 1
+        self._record_lookup("disk", start_time)
+        return translation
+
+    def put(self, source: str, target_language: str, translation: str, model_id: Optional[str] = None):
+        """加入翻譯（立即進入前端快取，稍後由背景執行緒寫入磁碟）"""
+        key = self._key(source, target_language, model_id)
+        self.front_cache.put(self._front_key(key), translation)
+
+        with self.pending_lock:
+            self.pending_writes[key] = translation
+
+    def _record_lookup(self, outcome: str, start_time: float):
+        """記錄查詢延遲與命中率"""
+        metrics.observe(f"translation_memory.lookup_latency.{outcome}", time.perf_counter() - start_time)
+        lookups = self.front_hits + self.disk_hits + self.misses
+        metrics.set_gauge("translation_memory.hit_rate", (self.front_hits + self.disk_hits) / lookups)
+
+    def _writer_loop(self):
+        """背景寫入執行緒"""
+        while self.is_running:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"寫入翻譯記憶庫失敗: {e}")
+
+    def flush(self):
+        """將待寫入的翻譯與使用時間寫入磁碟，並淘汰超出上限的舊項目"""
+        with self.pending_lock:
+            writes, self.pending_writes = self.pending_writes, {}
+            touches, self.pending_touches = self.pending_touches, {}
+
+        if not writes and not touches:
+            return
+
+        now = time.time()
+        with self.db_lock:
+            self.connection.executemany(
+                "INSERT INTO translations "
+                "(source, target_language, model_id, prompt_version, translation, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (source, target_language, model_id, prompt_version) "
+                "DO UPDATE SET translation = excluded.translation, last_used = excluded.last_used",
+                [key + (translation, now) for key, translation in writes.items()]
+            )
+            self.connection.executemany(
+                "UPDATE translations SET last_used = ?, use_count = use_count + 1 "
+                "WHERE source = ? AND target_language = ? AND model_id = ? AND prompt_version = ?",
+                [(last_used,) + key for key, last_used in touches.items()]
+            )
+
+            # 超過容量上限時淘汰最久未使用的項目
+            count = self.connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.execute(
+                    "DELETE FROM translations WHERE rowid IN "
+                    "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.connection.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """獲取記憶庫統計"""
+        lookups = self.front_hits + self.disk_hits + self.misses
+        with self.db_lock:
+            entries = self.connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+        return {
+            "entries": entries,
+            "front_hits": self.front_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.front_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        """清除前端快取（磁碟上的記憶庫保留給之後的工作階段）"""
+        self.front_cache.clear()
+
+    def close(self):
+        """停止背景寫入並關閉資料庫"""
+        self.is_running = False
+        if self.writer_thread.is_alive():
+            self.writer_thread.join(timeout=self.flush_interval + 1)
+
+        self.flush()
+        with self.db_lock:
+            self.connection.close()
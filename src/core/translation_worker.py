@@ -0,0 +1,414 @@
+"""
+翻譯工作執行緒模組 - 將短時間內就緒的轉錄片段合併為批次翻譯
+"""
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional, Set, Tuple
+
+from ..config import (
+    TRANSLATION_BATCH_WINDOW, TRANSLATION_MAX_BATCH, SUBTITLE_STREAMING, SUBTITLE_STREAM_INTERVAL,
+    TRANSLATION_DEADLINE, TRANSLATION_SUPERSEDE_DISTANCE, TRANSLATION_STALE_POLICY,
+    TRANSLATION_REFINE_MAX_AGE
+)
+from ..utils.metrics import metrics
+from .language_bypass import LanguageBypass
+from .segmenter import join_fragments
+from .translator import CancellationToken, TranslationCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationWorker:
+    """
+    翻譯工作執行緒
+
+    轉錄結果以 (序號, 文字) 排入輸入佇列；工作執行緒收到第一個片段後，在短時間視窗內
+    繼續收集已就緒的片段（最多 max_batch 個），將所有目標語言的翻譯合併為單次批次呼叫，
+    並將 (目標語言, 序號, 譯文) 放入結果佇列。
+    只有一個片段、一個目標語言且啟用串流時，改以串流翻譯逐步輸出部分譯文。
+
+    每個片段有自己的翻譯期限；生成中的批次超過期限，或已有落後 supersede_distance 個序號的
+    新片段排入時，由取消標記在解碼步驟之間中止。中止（或開始前已逾期）的片段依 stale_policy
+    併入下一個片段一起翻譯，或直接捨棄。
+
+    提供 bypass 時，偵測到的原文語言等於目標語言的片段不翻譯該語言，直接輸出轉錄文字。
+    """
+
+    def __init__(self, translator, target_languages: List[str],
+                 batch_window: float = TRANSLATION_BATCH_WINDOW,
+                 max_batch: int = TRANSLATION_MAX_BATCH,
+                 streaming: bool = SUBTITLE_STREAMING,
+                 stream_interval: float = SUBTITLE_STREAM_INTERVAL,
+                 deadline: Optional[float] = TRANSLATION_DEADLINE,
+                 supersede_distance: Optional[int] = TRANSLATION_SUPERSEDE_DISTANCE,
+                 stale_policy: str = TRANSLATION_STALE_POLICY,
+                 bypass: Optional[LanguageBypass] = None):
+        self.translator = translator
+        self.target_languages = list(target_languages)
+        self.batch_window = batch_window
+        self.max_batch = max(1, max_batch)
+        self.streaming = streaming
+        self.stream_interval = stream_interval
+        self.deadline = deadline
+        self.supersede_distance = supersede_distance
+        self.stale_policy = stale_policy
+        self.bypass = bypass
+
+        self.active_token = None  # 生成中批次的取消標記
+        self.active_sequence = None  # 生成中批次的最新序號
+        self.carryover = []  # 中止後待併入下一個片段的文字
+        self.bypassed = {}  # 序號 -> 已略過翻譯的目標語言
+        self.lock = threading.Lock()
+
+        self.input_queue = queue.Queue()
+        self.result_queue = queue.Queue()
+        self.worker_thread = None
+        self.is_running = False
+
+    def start(self):
+        """啟動工作執行緒"""
+        self.is_running = True
+        self.worker_thread = threading.Thread(target=self._worker_loop)
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+
+    def submit(self, sequence: int, text: str, language: Optional[str] = None,
+               confidence: Optional[float] = None):
+        """
+        排入待翻譯的片段（生成中的片段已過時則中止）
+
+        Args:
+            sequence: 序號
+            text: 轉錄文字
+            language: 語音識別偵測到的語言代碼
+            confidence: 語言偵測的信心
+        """
+        self._cancel_superseded(sequence)
+        skipped = self._apply_bypass(sequence, text, language, confidence)
+        self._enqueue(sequence, text, skipped, time.time())
+
+    def _cancel_superseded(self, sequence: int):
+        """生成中的批次落後新片段 supersede_distance 個序號以上時中止"""
+        with self.lock:
+            if (self.supersede_distance is not None and self.active_token is not None
+                    and sequence - self.active_sequence >= self.supersede_distance):
+                self.active_token.cancel("superseded")
+
+    def _apply_bypass(self, sequence: int, text: str, language: Optional[str],
+                      confidence: Optional[float]) -> Set[str]:
+        """直接輸出不需翻譯的目標語言，返回這些語言"""
+        skipped = set()
+        if self.bypass is None:
+            return skipped
+
+        for target_language in self.target_languages:
+            passthrough = self.bypass.passthrough(text, target_language, language, confidence)
+            if passthrough is not None:
+                self._put_result(target_language, sequence, passthrough)
+                skipped.add(target_language)
+        return skipped
+
+    def _enqueue(self, sequence: int, text: str, skipped: Set[str], submitted_at: float):
+        """排入翻譯佇列（所有目標語言都已略過時不排入）"""
+        if len(skipped) == len(self.target_languages):
+            return
+        if skipped:
+            with self.lock:
+                self.bypassed[sequence] = skipped
+        self.input_queue.put((sequence, text, submitted_at))
+
+    def get_results(self) -> List[Tuple[str, int, str]]:
+        """取出所有已完成的譯文（含串流的部分譯文）[(目標語言, 序號, 譯文), ...]"""
+        results = []
+        while True:
+            try:
+                results.append(self.result_queue.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _collect_batch(self) -> List[Tuple[int, str, float]]:
+        """等待第一個片段，並在時間視窗內收集其他已就緒的片段"""
+        try:
+            first = self.input_queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+
+        # 包含剛取出的片段在內的待處理數量
+        metrics.observe("translation_worker.queue_depth", self.input_queue.qsize() + 1)
+
+        batch = [first]
+        deadline = time.time() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self.input_queue.get(timeout=remaining))
+                else:
+                    # 視窗結束後仍取出已在佇列中的片段，不再等待
+                    batch.append(self.input_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        metrics.observe("translation_worker.batch_size", len(batch))
+        return batch
+
+    def _worker_loop(self):
+        """工作執行緒：收集片段並批次翻譯"""
+        while self.is_running:
+            batch = self._collect_batch()
+            if not batch:
+                continue
+
+            now = time.time()
+            for _, _, submitted_at in batch:
+                metrics.observe("translation_worker.queue_wait", now - submitted_at)
+
+            batch = self._merge_carryover(self._drop_expired(batch, now))
+            if batch:
+                self._translate(batch)
+
+    def _translate(self, batch: List[Tuple[int, str, float]]):
+        """以可取消的方式翻譯一個批次"""
+        token = CancellationToken(self._deadline_for(batch))
+        with self.lock:
+            self.active_token = token
+            self.active_sequence = max(sequence for sequence, _, _ in batch)
+            skipped = {sequence: self.bypassed.pop(sequence, ()) for sequence, _, _ in batch}
+
+        # 批次中所有片段都已略過的語言不翻譯
+        target_languages = [
+            target_language for target_language in self.target_languages
+            if any(target_language not in skipped[sequence] for sequence, _, _ in batch)
+        ]
+
+        try:
+            with self.translator.cancellable(token):
+                if len(batch) == 1 and len(target_languages) == 1 and self.streaming:
+                    sequence, text, _ = batch[0]
+                    self._translate_streaming(target_languages[0], sequence, text)
+                else:
+                    texts = [text for _, text, _ in batch]
+                    results = self.translator.translate_multi(texts, target_languages)
+                    for target_language in target_languages:
+                        for (sequence, _, _), translated in zip(batch, results[target_language]):
+                            if target_language not in skipped[sequence]:
+                                self._put_result(target_language, sequence, translated)
+        except TranslationCancelled as e:
+            logger.debug(f"翻譯已中止（{e}）: 序號 {[sequence for sequence, _, _ in batch]}")
+            metrics.increment(f"translation_worker.cancelled_batches.{token.reason}")
+            self._set_stale(batch)
+        except Exception as e:
+            logger.error(f"批次翻譯失敗: {e}")
+        finally:
+            with self.lock:
+                self.active_token = None
+                self.active_sequence = None
+
+    def _deadline_for(self, batch: List[Tuple[int, str, float]]) -> Optional[float]:
+        """批次的期限（以最新片段的期限為準，避免較舊的片段拖累整批）"""
+        if self.deadline is None:
+            return None
+        return max(submitted_at for _, _, submitted_at in batch) + self.deadline
+
+    def _drop_expired(self, batch: List[Tuple[int, str, float]], now: float) -> List[Tuple[int, str, float]]:
+        """開始翻譯前已超過期限的片段不翻譯，依中止策略處理"""
+        if self.deadline is None:
+            return batch
+
+        expired = [item for item in batch if now - item[2] > self.deadline]
+        if expired:
+            with self.lock:
+                for sequence, _, _ in expired:
+                    self.bypassed.pop(sequence, None)
+            metrics.increment("translation_worker.expired_segments", len(expired))
+            self._set_stale(expired)
+        return [item for item in batch if now - item[2] <= self.deadline]
+
+    def _set_stale(self, items: List[Tuple[int, str, float]]):
+        """記錄中止的片段：併入下一個片段，或直接捨棄（只保留最近一次中止的文字）"""
+        if self.stale_policy != "merge":
+            metrics.increment("translation_worker.dropped_segments", len(items))
+            return
+
+        if self.carryover:
+            metrics.increment("translation_worker.dropped_segments", len(self.carryover))
+        self.carryover = [text for _, text, _ in items]
+
+    def _merge_carryover(self, batch: List[Tuple[int, str, float]]) -> List[Tuple[int, str, float]]:
+        """將先前中止的文字併入批次的第一個片段"""
+        if not self.carryover or not batch:
+            return batch
+
+        sequence, text, submitted_at = batch[0]
+        metrics.increment("translation_worker.merged_segments", len(self.carryover))
+        merged = (sequence, join_fragments(self.carryover + [text]), submitted_at)
+        self.carryover = []
+        return [merged] + batch[1:]
+
+    def _translate_streaming(self, target_language: str, sequence: int, text: str):
+        """串流翻譯單一片段，以固定間隔輸出部分譯文"""
+        last_emit_time = 0.0
+        emitted = None
+        translated = None
+        for translated in self.translator.translate_stream(text, target_language):
+            current_time = time.time()
+            if current_time - last_emit_time >= self.stream_interval:
+                self._put_result(target_language, sequence, translated)
+                last_emit_time = current_time
+                emitted = translated
+
+        # 最後一項為完整譯文，一定要輸出
+        if translated != emitted:
+            self._put_result(target_language, sequence, translated)
+
+    def _put_result(self, target_language: str, sequence: int, translated: Optional[str]):
+        if translated and translated.strip():
+            self.result_queue.put((target_language, sequence, translated))
+
+    def stop(self):
+        """停止工作執行緒（進行中的翻譯完成後結束）"""
+        self.is_running = False
+        if self.worker_thread and self.worker_thread.is_alive():
+            self.worker_thread.join(timeout=10)
+
+        batch_sizes = metrics.histogram("translation_worker.batch_size")
+        if batch_sizes:
+            logger.info(f"翻譯批次大小分布: {batch_sizes}")
+
+
+class TwoTierTranslationWorker(TranslationWorker):
+    """
+    雙層翻譯工作執行緒 - 草稿譯文立即輸出，Gemma 譯文於背景完成後以相同序號取代
+
+    草稿執行緒以翻譯記憶或小型翻譯後端產生草稿（數十毫秒）；翻譯記憶命中時即為最終譯文，
+    不再排入 Gemma。Gemma 開始處理前，已顯示草稿且落後最新片段超過 refine_max_age 個序號的
+    片段不再修訂。草稿已在畫面上，中止的片段直接捨棄而不併入下一個片段，也不串流部分譯文。
+    """
+
+    def __init__(self, translator, target_languages: List[str],
+                 refine_max_age: int = TRANSLATION_REFINE_MAX_AGE, **kwargs):
+        kwargs.update(streaming=False, stale_policy="drop")
+        super().__init__(translator, target_languages, **kwargs)
+        self.refine_max_age = refine_max_age
+        self.latest_sequence = -1
+        self.drafts = {}  # (目標語言, 序號) -> (草稿譯文, 草稿輸出時間)
+        self.first_caption_pending = {}  # 尚未輸出任何字幕的序號 -> 排入時間
+        self.draft_queue = queue.Queue()
+        self.draft_thread = None
+
+    def start(self):
+        """啟動草稿與修訂執行緒"""
+        super().start()
+        self.draft_thread = threading.Thread(target=self._draft_loop)
+        self.draft_thread.daemon = True
+        self.draft_thread.start()
+
+    def submit(self, sequence: int, text: str, language: Optional[str] = None,
+               confidence: Optional[float] = None):
+        """排入草稿翻譯（草稿輸出後再排入 Gemma 修訂）"""
+        self._cancel_superseded(sequence)
+        with self.lock:
+            self.latest_sequence = max(self.latest_sequence, sequence)
+        self.draft_queue.put((sequence, text, language, confidence, time.time()))
+
+    def _draft_loop(self):
+        """草稿執行緒：不等待 Gemma，依序輸出草稿"""
+        while self.is_running:
+            try:
+                item = self.draft_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._draft(*item)
+
+    def _draft(self, sequence: int, text: str, language: Optional[str], confidence: Optional[float],
+               submitted_at: float):
+        """輸出草稿譯文，並將仍需修訂的語言排入 Gemma"""
+        skipped = self._apply_bypass(sequence, text, language, confidence)
+        drafted = False
+        for target_language in self.target_languages:
+            if target_language in skipped:
+                continue
+
+            draft, final = self.translator.translate_draft(text, target_language)
+            if not draft:
+                continue
+            super()._put_result(target_language, sequence, draft)
+            drafted = True
+            if final:
+                metrics.increment("translation_worker.final_drafts")
+                skipped.add(target_language)
+            else:
+                metrics.increment("translation_worker.drafts")
+                with self.lock:
+                    self.drafts[(target_language, sequence)] = (draft, time.time())
+
+        if skipped or drafted:
+            metrics.observe("translation_worker.first_caption_latency", time.time() - submitted_at)
+        else:
+            with self.lock:
+                self.first_caption_pending[sequence] = submitted_at
+        self._enqueue(sequence, text, skipped, submitted_at)
+
+    def _put_result(self, target_language: str, sequence: int, translated: Optional[str]):
+        """輸出 Gemma 譯文（取代草稿）並記錄首個字幕延遲與修訂"""
+        with self.lock:
+            draft = self.drafts.pop((target_language, sequence), None)
+            submitted_at = self.first_caption_pending.pop(sequence, None)
+
+        if submitted_at is not None:
+            metrics.observe("translation_worker.first_caption_latency", time.time() - submitted_at)
+        if draft is not None:
+            draft_text, drafted_at = draft
+            metrics.increment("translation_worker.refinements")
+            metrics.observe("translation_worker.refine_latency", time.time() - drafted_at)
+            if translated and translated != draft_text:
+                metrics.increment("translation_worker.refinements_changed")
+            self._update_refine_rate()
+
+        super()._put_result(target_language, sequence, translated)
+
+    def _drop_expired(self, batch: List[Tuple[int, str, float]], now: float) -> List[Tuple[int, str, float]]:
+        """草稿已被較新片段取代的片段不再修訂，其餘依期限處理"""
+        with self.lock:
+            oldest = self.latest_sequence - self.refine_max_age
+            superseded = {
+                sequence for sequence, _, _ in batch
+                if sequence < oldest and sequence not in self.first_caption_pending
+            }
+        if superseded:
+            metrics.increment("translation_worker.refinements_skipped", len(superseded))
+
+        kept = super()._drop_expired([item for item in batch if item[0] not in superseded], now)
+        kept_sequences = {sequence for sequence, _, _ in kept}
+        self._forget([item for item in batch if item[0] not in kept_sequences])
+        return kept
+
+    def _set_stale(self, items: List[Tuple[int, str, float]]):
+        super()._set_stale(items)
+        self._forget(items)
+
+    def _forget(self, items: List[Tuple[int, str, float]]):
+        """移除不再修訂的片段的草稿記錄"""
+        with self.lock:
+            for sequence, _, _ in items:
+                self.bypassed.pop(sequence, None)
+                self.first_caption_pending.pop(sequence, None)
+                for target_language in self.target_languages:
+                    self.drafts.pop((target_language, sequence), None)
+        self._update_refine_rate()
+
+    def _update_refine_rate(self):
+        """已被 Gemma 取代的草稿比例"""
+        drafts = metrics.get_counter("translation_worker.drafts")
+        if drafts:
+            metrics.set_gauge(
+                "translation_worker.refine_rate", metrics.get_counter("translation_worker.refinements") / drafts
+            )
+
+    def stop(self):
+        """停止草稿與修訂執行緒"""
+        super().stop()
+        if self.draft_thread and self.draft_thread.is_alive():
+            self.draft_thread.join(timeout=5)
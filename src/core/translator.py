@@ -3,177 +3,302 @@
 """
 import logging
 import threading
+import time
 import queue
-from typing import Optional, List, Dict
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Tuple, Iterator
 import torch
 from transformers import (
     AutoTokenizer, AutoModelForCausalLM, 
-    BitsAndBytesConfig, pipeline
+    BitsAndBytesConfig, StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
 )
+from transformers.cache_utils import DynamicCache, DynamicLayer
 
 from ..config import (
-    GEMMA_MODEL_NAME, GEMMA_DEVICE, GEMMA_QUANTIZATION, GEMMA_MAX_LENGTH,
-    GEMMA_TEMPERATURE, MODELS_DIR, TRANSLATION_CACHE_SIZE
+    GEMMA_MODEL_NAME, GEMMA_DEVICE, GEMMA_QUANTIZATION, GEMMA_CPU_QUANTIZATION, GEMMA_MAX_LENGTH,
+    GEMMA_TEMPERATURE, MODELS_DIR, TRANSLATION_MEMORY_ENABLED,
+    GEMMA_SESSION_MODE, GEMMA_SESSION_TOKEN_BUDGET, GEMMA_BATCH_SIZE,
+    GEMMA_GENERATION_PROFILE, GEMMA_NUM_BEAMS, GEMMA_ASSISTED_DECODING,
+    GEMMA_PROMPT_LOOKUP_TOKENS, GEMMA_ASSISTANT_MODEL_NAME, GEMMA_NUM_ASSISTANT_TOKENS,
+    TRANSLATION_BACKENDS, TWO_TIER_TRANSLATION, TRANSLATION_DRAFT_BACKEND,
+    GEMMA_PACKING_ENABLED, GEMMA_PACKING_TOKEN_BUDGET, GEMMA_PACKING_MAX_SEGMENTS
+)
+from .translation_cache import TranslationCache, TranslationMemory
+from .prompt_compiler import PromptCompiler
+from .translation_backends import (
+    TranslationBackend, GemmaBackend, LANGUAGE_NAMES, create_backend,
+    language_pair_setting, estimate_max_new_tokens
+)
+from ..utils.metrics import metrics
+from ..utils.text import (
+    normalize_text, split_sentences, join_sentences, format_numbered_list, parse_numbered_list
 )
 
 logger = logging.getLogger(__name__)
 
 
-class TranslationCache:
-    """翻譯快取"""
+def load_model_low_memory(model_name: str, device: str, dtype: torch.dtype):
+    """
+    以接近穩定狀態的峰值記憶體載入模型
     
-    def __init__(self, max_size: int = TRANSLATION_CACHE_SIZE):
-        self.cache = {}
-        self.max_size = max_size
-        self.access_count = {}
-        self.lock = threading.Lock()
+    從 MODELS_DIR 中以記憶體映射開啟 safetensors，逐個張量轉換為目標精度並直接放到目標設備，
+    不會先建立完整的 float32 副本再轉換或搬移。
+    """
+    return AutoModelForCausalLM.from_pretrained(
+        model_name,
+        cache_dir=str(MODELS_DIR),
+        torch_dtype=dtype,
+        low_cpu_mem_usage=True,
+        use_safetensors=True,
+        device_map={"": device},
+        trust_remote_code=True  # 支援 Gemma 3n
+    )
+
+
+def cpu_supports_bf16() -> bool:
+    """CPU 是否支援 bf16 運算（AVX512-BF16 / AMX）"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """將 Linear 層的權重動態量化為 int8（啟動值在執行時量化），減少記憶體與每個詞元的頻寬用量"""
+    # 就地替換，避免複製整個模型
+    quantized = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+    quantized_layers = sum(
+        1 for module in quantized.modules()
+        if isinstance(module, torch.ao.nn.quantized.dynamic.Linear)
+    )
+    logger.info(f"已將 {quantized_layers} 個 Linear 層量化為 int8")
+    return quantized
+
+
+class NewlineStoppingCriteria(StoppingCriteria):
+    """
+    字幕只需要一行：已生成內容後遇到換行即停止
     
-    def get(self, key: str) -> Optional[str]:
-        """獲取快取的翻譯"""
-        with self.lock:
-            if key in self.cache:
-                self.access_count[key] = self.access_count.get(key, 0) + 1
-                return self.cache[key]
-        return None
+    逐序列判斷，批次中已停止的序列不影響其他序列。
+    """
     
-    def put(self, key: str, value: str):
-        """加入快取"""
-        with self.lock:
-            # 如果快取滿了，移除最少使用的項目
-            if len(self.cache) >= self.max_size:
-                # 找出最少使用的鍵
-                min_count = min(self.access_count.values())
-                for k, count in list(self.access_count.items()):
-                    if count == min_count:
-                        del self.cache[k]
-                        del self.access_count[k]
-                        break
-            
-            self.cache[key] = value
-            self.access_count[key] = 1
+    def __init__(self, newline_token_ids: List[int]):
+        self.newline_token_ids = torch.tensor(newline_token_ids or [-1])
+        self.prompt_length = None
     
-    def clear(self):
-        """清空快取"""
-        with self.lock:
-            self.cache.clear()
-            self.access_count.clear()
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        if self.prompt_length is None:
+            # 第一次呼叫時已生成一個詞元
+            self.prompt_length = input_ids.shape[1] - 1
+        
+        newline_ids = self.newline_token_ids.to(input_ids.device)
+        generated = input_ids[:, self.prompt_length:]
+        is_newline = torch.isin(generated[:, -1], newline_ids)
+        has_content = (~torch.isin(generated[:, :-1], newline_ids)).any(dim=1)
+        return is_newline & has_content
+
+
+class TranslationCancelled(Exception):
+    """翻譯因超過期限或被較新的片段取代而中止"""
+
+
+class CancellationToken:
+    """
+    翻譯請求的取消標記
+    
+    可由其他執行緒呼叫 cancel()，超過期限後也視為已取消；
+    生成時由 CancelStoppingCriteria 在每個解碼步驟之間檢查。
+    """
+    
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline  # time.time() 的絕對時間，None 表示不限
+        self.reason = None  # "superseded" 或 "deadline"
+    
+    def cancel(self, reason: str = "superseded"):
+        """取消請求"""
+        if self.reason is None:
+            self.reason = reason
+    
+    @property
+    def cancelled(self) -> bool:
+        if self.reason is None and self.deadline is not None and time.time() > self.deadline:
+            self.reason = "deadline"
+        return self.reason is not None
+
+
+class CancelStoppingCriteria(StoppingCriteria):
+    """取消標記生效時停止所有序列"""
+    
+    def __init__(self, token: CancellationToken):
+        self.token = token
+    
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        return torch.full(
+            (input_ids.shape[0],), self.token.cancelled, dtype=torch.bool, device=input_ids.device
+        )
 
 
 class Translator:
     """翻譯處理器"""
     
+    # 提示詞版本（變更提示詞或生成參數時遞增，避免沿用舊的翻譯記憶）
+    PROMPT_VERSION = "translator-v1"
+    
     def __init__(self):
         self.model = None
         self.tokenizer = None
-        self.pipeline = None
         self.is_initialized = False
+        self.stop_token_ids = []  # 結束詞元（<eos>、<end_of_turn>）
+        self.newline_token_ids = []  # 字幕模式下遇到即停止的換行詞元
+        self.source_language = None  # 原文語言代碼（None 表示自動偵測），用於估計輸出長度
+        self.cpu_quantization = GEMMA_CPU_QUANTIZATION  # CPU 模式的權重精度
+        self.assisted_decoding = GEMMA_ASSISTED_DECODING  # 輔助解碼模式
+        self.assistant_model = None
+        self.assistant_tokenizer = None
+        self.target_forwards = 0  # 翻譯模型的前向次數（用於計算輔助解碼的接受率）
+        self.cancel_token: Optional[CancellationToken] = None  # 目前翻譯請求的取消標記
+        self.backends: Dict[str, TranslationBackend] = {}  # 後端名稱 -> 翻譯後端
+        self.language_pair_backends = dict(TRANSLATION_BACKENDS)  # 語言對 -> 後端名稱
+        self.draft_backend = TRANSLATION_DRAFT_BACKEND if TWO_TIER_TRANSLATION else None  # 雙層翻譯的草稿後端
+        self.hf_model_deferred = False  # 啟動時未載入 Gemma 模型（所有語言對都使用其他後端）
+        self.hf_load_lock = threading.Lock()
         self.translation_cache = TranslationCache()
-        self.context_buffer = []  # 保存上下文
+        self.translation_memory = None  # 磁碟翻譯記憶庫（初始化時開啟）
+        self.prompt_compiler = None  # 預先分詞的提示詞模板（首次生成時建立）
+        self.context_buffers: Dict[str, List[Tuple[str, str]]] = {}  # 目標語言 -> 最近的 (原文, 譯文)
         self.max_context_length = 5  # 保留最近5段對話
         
         # 語言代碼映射
-        self.language_names = {
-            "zh": "Chinese",
-            "en": "English",
-            "ja": "Japanese",
-            "ko": "Korean",
-            "es": "Spanish",
-            "fr": "French",
-            "de": "German",
-            "ru": "Russian",
-            "pt": "Portuguese",
-            "it": "Italian",
-            "th": "Thai",
-            "vi": "Vietnamese",
-            "ar": "Arabic",
-            "hi": "Hindi",
-            "id": "Indonesian",
-        }
+        self.language_names = dict(LANGUAGE_NAMES)
     
     def initialize(self):
-        """初始化 Gemma 模型"""
+        """初始化翻譯後端；所有語言對都使用其他後端時不載入 Gemma 模型"""
         try:
-            logger.info("正在初始化 Gemma 翻譯模型...")
-            
-            # 使用配置中指定的設備
-            device = GEMMA_DEVICE
-            logger.info(f"Gemma 翻譯模型將使用: {device.upper()}")
+            logger.info("正在初始化翻譯模型...")
+            start_time = time.perf_counter()
             
-            # 設定量化配置（僅在 GPU 模式下使用）
-            quantization_config = None
-            if device == "cuda" and GEMMA_QUANTIZATION in ["int4", "int8"]:
-                if GEMMA_QUANTIZATION == "int4":
-                    quantization_config = BitsAndBytesConfig(
-                        load_in_4bit=True,
-                        bnb_4bit_compute_dtype=torch.float16,
-                        bnb_4bit_use_double_quant=True,
-                        bnb_4bit_quant_type="nf4"
-                    )
-                elif GEMMA_QUANTIZATION == "int8":
-                    quantization_config = BitsAndBytesConfig(
-                        load_in_8bit=True,
-                        bnb_8bit_compute_dtype=torch.float16
-                    )
-                logger.info(f"使用 {GEMMA_QUANTIZATION} 量化")
+            self._setup_backends()
+            if self._needs_hf_model():
+                self._load_hf_model()
             else:
-                logger.info("CPU 模式：不使用量化，使用全精度模型")
-            
-            # 載入分詞器
-            logger.info("載入分詞器...")
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                GEMMA_MODEL_NAME,
-                cache_dir=str(MODELS_DIR),
-                trust_remote_code=True  # 支援 Gemma 3n
-            )
+                # 後端不支援的語言對需要改用 Gemma 時才載入
+                self.hf_model_deferred = True
+                logger.info("所有語言對都使用其他翻譯後端，暫不載入 Gemma 模型")
             
-            # 載入模型
-            logger.info(f"載入 {GEMMA_MODEL_NAME} 模型...")
-            
-            if quantization_config and device == "cuda":
-                # GPU 模式：使用量化模型
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    GEMMA_MODEL_NAME,
-                    quantization_config=quantization_config,
-                    device_map="auto",
-                    cache_dir=str(MODELS_DIR),
-                    torch_dtype=torch.float16,
-                    trust_remote_code=True  # 支援 Gemma 3n
-                )
-            else:
-                # CPU 模式：使用全精度模型
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    GEMMA_MODEL_NAME,
-                    cache_dir=str(MODELS_DIR),
-                    torch_dtype=torch.float32,  # CPU 模式使用 float32 以獲得更好穩定性
-                    trust_remote_code=True  # 支援 Gemma 3n
+            # 開啟跨工作階段共用的翻譯記憶庫，以記憶體快取作為前端
+            if TRANSLATION_MEMORY_ENABLED and self.translation_memory is None:
+                self.translation_memory = TranslationMemory(
+                    model_id=self._gemma_model_id(),
+                    prompt_version=self._prompt_version(),
+                    front_cache=self.translation_cache
                 )
-                # 明確將模型移到指定設備
-                self.model = self.model.to(device)
-            
-            # 創建 pipeline
-            self.pipeline = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if device == "cuda" else -1,  # -1 表示 CPU
-                max_new_tokens=GEMMA_MAX_LENGTH,
-                temperature=GEMMA_TEMPERATURE,
-                do_sample=True,
-                top_p=0.95,
-                top_k=50
-            )
             
             self.is_initialized = True
-            logger.info(f"Gemma 翻譯模型初始化完成 (設備: {device.upper()})")
+            load_seconds = time.perf_counter() - start_time
+            metrics.set_gauge("translation.load_seconds", load_seconds)
+            logger.info(f"翻譯模型初始化完成 (耗時 {load_seconds:.1f} 秒)")
             
         except Exception as e:
-            logger.error(f"初始化 Gemma 模型失敗: {e}")
+            logger.error(f"初始化翻譯模型失敗: {e}")
             raise
     
+    def _needs_hf_model(self) -> bool:
+        """是否有語言對使用 Gemma（包含設定的後端無法載入而改用 Gemma 的語言對）"""
+        return any(
+            name == GemmaBackend.name or name not in self.backends
+            for name in self.language_pair_backends.values()
+        )
+    
+    def _ensure_hf_model(self):
+        """啟動時延後載入的 Gemma 模型在第一次需要時載入"""
+        if not self.hf_model_deferred:
+            return
+        with self.hf_load_lock:
+            if self.hf_model_deferred:
+                logger.info("有語言對改用 Gemma，載入 Gemma 模型")
+                self._load_hf_model()
+                self.hf_model_deferred = False
+    
+    def _load_hf_model(self):
+        """載入 Gemma 分詞器與模型"""
+        # 使用配置中指定的設備
+        device = GEMMA_DEVICE
+        logger.info(f"Gemma 翻譯模型將使用: {device.upper()}")
+        
+        # 設定量化配置（僅在 GPU 模式下使用）
+        quantization_config = None
+        if device == "cuda" and GEMMA_QUANTIZATION in ["int4", "int8"]:
+            if GEMMA_QUANTIZATION == "int4":
+                quantization_config = BitsAndBytesConfig(
+                    load_in_4bit=True,
+                    bnb_4bit_compute_dtype=torch.float16,
+                    bnb_4bit_use_double_quant=True,
+                    bnb_4bit_quant_type="nf4"
+                )
+            elif GEMMA_QUANTIZATION == "int8":
+                quantization_config = BitsAndBytesConfig(
+                    load_in_8bit=True,
+                    bnb_8bit_compute_dtype=torch.float16
+                )
+            logger.info(f"使用 {GEMMA_QUANTIZATION} 量化")
+        elif device == "cpu" and self.cpu_quantization:
+            logger.info(f"CPU 模式：使用 {self.cpu_quantization} 權重")
+        else:
+            logger.info("CPU 模式：不使用量化，使用全精度模型")
+        
+        # 載入分詞器
+        logger.info("載入分詞器...")
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            GEMMA_MODEL_NAME,
+            cache_dir=str(MODELS_DIR),
+            trust_remote_code=True  # 支援 Gemma 3n
+        )
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token  # 批次翻譯需要填充詞元
+        
+        # 載入模型
+        logger.info(f"載入 {GEMMA_MODEL_NAME} 模型...")
+        
+        if quantization_config and device == "cuda":
+            # GPU 模式：使用量化模型
+            self.model = AutoModelForCausalLM.from_pretrained(
+                GEMMA_MODEL_NAME,
+                quantization_config=quantization_config,
+                device_map="auto",
+                cache_dir=str(MODELS_DIR),
+                torch_dtype=torch.float16,
+                trust_remote_code=True  # 支援 Gemma 3n
+            )
+        else:
+            # CPU 模式：預設使用 float32 以獲得更好穩定性，可改用 bf16
+            # 直接以目標精度載入到指定設備，避免啟動時的記憶體峰值
+            self.model = load_model_low_memory(
+                GEMMA_MODEL_NAME,
+                device,
+                self._cpu_dtype() if device == "cpu" else torch.float32
+            )
+            
+            if device == "cpu" and self.cpu_quantization == "dynamic_int8":
+                self.model = quantize_dynamic_int8(self.model)
+        
+        self.model.eval()
+        self.model.register_forward_hook(self._count_forward)
+        self._setup_stop_tokens()
+        
+        if self.assisted_decoding == "draft_model":
+            self._load_assistant_model(device)
+        
+        logger.info(f"Gemma 翻譯模型已載入 (設備: {device.upper()})")
+    
     def translate(self, text: str, target_language: str) -> Optional[str]:
         """
         翻譯文字
         
+        先以正規化後的整段文字查詢快取，未命中時再逐句查詢（見 _lookup_segment），
+        只翻譯未命中的句子並依原順序重組。
+        
         Args:
             text: 要翻譯的文字
             target_language: 目標語言代碼
@@ -190,73 +315,499 @@ class Translator:
         
         try:
             # 檢查快取
-            cache_key = f"{text}:{target_language}"
-            cached_translation = self.translation_cache.get(cache_key)
-            if cached_translation:
-                logger.debug("使用快取的翻譯")
-                return cached_translation
+            segments = self._lookup_segment(text, target_language)
+            missing = self._missing_sources(segments)
+            translations = self._translate_misses(missing, target_language) if missing else []
+            return self._assemble_segment(text, target_language, segments, translations)
             
-            # 準備提示詞
-            target_lang_name = self.language_names.get(target_language, target_language)
+        except TranslationCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"翻譯失敗: {e}")
+            return None
+    
+    def translate_draft(self, text: str, target_language: str) -> Tuple[Optional[str], bool]:
+        """
+        快速草稿翻譯（雙層翻譯使用）
+        
+        先查詢快取與翻譯記憶，命中時即為最終譯文；否則使用草稿後端。
+        草稿不寫入快取與上下文，之後由 Gemma 的譯文取代。
+        
+        Args:
+            text: 要翻譯的文字
+            target_language: 目標語言代碼
             
-            # 建構包含上下文的提示詞
-            prompt = self._build_translation_prompt(text, target_lang_name)
+        Returns:
+            (譯文, 是否為最終譯文)；沒有可用的草稿時為 (None, False)
+        """
+        if not self.is_initialized or not text.strip():
+            return None, False
+        
+        cached_translation = self._lookup_cache(text, target_language)
+        if cached_translation:
+            metrics.increment("translation.cache_hits")
+            return cached_translation, True
+        
+        backend = self.backends.get(self.draft_backend) if self.draft_backend else None
+        if (backend is None or backend.name == GemmaBackend.name
+                or not backend.supports(self.source_language, target_language)):
+            return None, False
+        
+        try:
+            draft = backend.translate_batch([text], self.source_language, target_language)[0]
+        except Exception as e:
+            logger.error(f"草稿翻譯失敗: {e}")
+            return None, False
+        
+        metrics.increment(f"translation.draft_calls.{backend.name}")
+        return (self._clean_translation(draft) or None) if draft else None, False
+    
+    def translate_stream(self, text: str, target_language: str) -> Iterator[str]:
+        """
+        串流翻譯文字
+        
+        在背景執行緒中生成，並隨著詞元產生逐步產出目前為止的譯文（已移除語言標記）；
+        最後一項為清理後的完整翻譯（與 translate 的結果相同）。
+        整段或部分句子命中快取時不串流，只翻譯未命中的句子並產出一次重組後的譯文。
+        
+        Args:
+            text: 要翻譯的文字
+            target_language: 目標語言代碼
             
-            # 執行翻譯
-            with torch.no_grad():
-                outputs = self.pipeline(
-                    prompt,
-                    max_new_tokens=GEMMA_MAX_LENGTH,
-                    temperature=GEMMA_TEMPERATURE,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                    return_full_text=False
-                )
+        Yields:
+            目前為止的譯文
+        """
+        if not self.is_initialized:
+            logger.error("翻譯模型尚未初始化")
+            return
+        
+        if not text.strip():
+            return
+        
+        segments = self._lookup_segment(text, target_language)
+        missing = self._missing_sources(segments)
+        if len(segments) > 1 or not missing:
+            translations = self._translate_misses(missing, target_language) if missing else []
+            translation = self._assemble_segment(text, target_language, segments, translations)
+            if translation:
+                yield translation
+            return
+        
+        if self._resolve_backend(target_language).name == GemmaBackend.name:
+            self._ensure_hf_model()  # 串流需要 Gemma 的分詞器
+        
+        start_time = time.perf_counter()
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        result = {}
+        
+        def run():
+            try:
+                result["translation"] = self._translate_uncached(text, target_language, streamer=streamer)
+            except Exception as e:
+                result["error"] = e
+                streamer.end()  # 讓等待中的迭代結束
+        
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        
+        partial = ""
+        for new_text in streamer:
+            partial += new_text
+            if not new_text:
+                continue
+            cleaned = self._clean_partial(partial)
+            if not cleaned:
+                continue
+            if "first_word" not in result:
+                result["first_word"] = True
+                metrics.observe("translation.time_to_first_word", time.perf_counter() - start_time)
+            yield cleaned
+        
+        thread.join()
+        if isinstance(result.get("error"), TranslationCancelled):
+            raise result["error"]
+        if "error" in result:
+            logger.error(f"串流翻譯失敗: {result['error']}")
+            return
+        
+        if result.get("translation"):
+            yield result["translation"]
+    
+    def _lookup_segment(self, text: str, target_language: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        查詢片段的快取（所有翻譯入口共用）
+        
+        先以正規化後的整段文字查詢，未命中時再逐句查詢。
+        
+        Returns:
+            [(原文, 快取的譯文或 None), ...]：整段命中或沒有句子命中時只有整段文字一項，
+            部分句子命中時為依原順序的各個句子
+        """
+        cached_translation = self._lookup_cache(text, target_language)
+        if cached_translation:
+            metrics.increment("translation.cache_hits")
+            return [(text, cached_translation)]
+        
+        sentences = split_sentences(text)
+        if len(sentences) > 1:
+            cached_sentences = [self._lookup_cache(sentence, target_language) for sentence in sentences]
+            hits = sum(1 for cached in cached_sentences if cached)
+            if hits:
+                metrics.increment("translation.sentence_hits", hits)
+                return list(zip(sentences, cached_sentences))
+        
+        return [(text, None)]
+    
+    @staticmethod
+    def _missing_sources(segments: List[Tuple[str, Optional[str]]]) -> List[str]:
+        """_lookup_segment 結果中需要翻譯的原文"""
+        return [source for source, cached in segments if not cached]
+    
+    def _assemble_segment(
+        self, text: str, target_language: str, segments: List[Tuple[str, Optional[str]]],
+        translations: List[Optional[str]]
+    ) -> Optional[str]:
+        """
+        將快取的句子與新翻譯的句子（依 _missing_sources 的順序）重組為片段譯文
+        
+        部分句子命中時，重組後的譯文以整段文字加入快取；任一句子翻譯失敗時返回 None。
+        """
+        translations = iter(translations)
+        parts = [cached or next(translations) for _, cached in segments]
+        if not all(parts):
+            return None
+        if len(parts) == 1:
+            return parts[0]
+        
+        translation = join_sentences(parts, target_language)
+        self._store_cache(text, target_language, translation)
+        return translation
+    
+    def _translate_uncached(
+        self, text: str, target_language: str, streamer: Optional[TextIteratorStreamer] = None
+    ) -> Optional[str]:
+        """以模型翻譯文字，並加入快取與上下文（可傳入 streamer 串流輸出詞元）"""
+        # 執行翻譯
+        metrics.increment("translation.llm_calls")
+        metrics.set_gauge(
+            "translation.llm_calls_per_minute", metrics.rate_per_minute("translation.llm_calls")
+        )
+        backend = self._backend_for(target_language)
+        translation = backend.translate(text, self.source_language, target_language, streamer=streamer)
+        
+        # 提取翻譯結果
+        if translation:
+            # 清理翻譯結果
+            translation = self._clean_translation(translation)
             
-            # 提取翻譯結果
-            if outputs and len(outputs) > 0:
-                translation = outputs[0]['generated_text'].strip()
+            if translation:
+                # 加入快取
+                self._store_cache(text, target_language, translation, backend.model_id)
                 
-                # 清理翻譯結果
-                translation = self._clean_translation(translation)
+                # 更新上下文
+                self._update_context(text, translation, target_language)
                 
-                if translation:
-                    # 加入快取
-                    self.translation_cache.put(cache_key, translation)
-                    
-                    # 更新上下文
-                    self._update_context(text, translation)
-                    
-                    logger.debug(f"翻譯結果: {translation}")
-                    return translation
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"翻譯失敗: {e}")
-            return None
+                logger.debug(f"翻譯結果: {translation}")
+                return translation
+        
+        return None
+
+    def _generate(
+        self, text: str, target_language: str, streamer: Optional[TextIteratorStreamer] = None
+    ) -> Optional[str]:
+        """以包含上下文的完整提示詞生成翻譯（返回未清理的模型輸出）"""
+        return self._generate_batch([text], target_language, streamer=streamer)[0]
+    
+    def _gemma_model_id(self) -> str:
+        """快取鍵使用的 Gemma 模型 ID（包含載入時實際使用的權重精度，不同精度的譯文不共用）"""
+        if GEMMA_DEVICE == "cuda":
+            precision = GEMMA_QUANTIZATION if GEMMA_QUANTIZATION in ["int4", "int8"] else None
+        elif self.cpu_quantization == "bf16" and not cpu_supports_bf16():
+            precision = None  # 不支援 bf16 時以 float32 載入
+        else:
+            precision = self.cpu_quantization
+        return f"{GEMMA_MODEL_NAME}:{precision or 'fp'}"
+    
+    def _cpu_dtype(self) -> torch.dtype:
+        """CPU 模式的載入精度（bf16 只在 CPU 支援時使用）"""
+        if self.cpu_quantization == "bf16":
+            if cpu_supports_bf16():
+                return torch.bfloat16
+            logger.warning("此 CPU 不支援 bf16 運算，改用 float32")
+        return torch.float32
+    
+    def _setup_backends(self):
+        """建立各語言對使用的翻譯後端（載入失敗的後端改用 Gemma）"""
+        self.backends = {GemmaBackend.name: GemmaBackend(self)}
+        
+        names = set(self.language_pair_backends.values())
+        if self.draft_backend:
+            names.add(self.draft_backend)
+        for name in sorted(names - {GemmaBackend.name}):
+            try:
+                backend = create_backend(name)
+                backend.initialize()
+                self.backends[name] = backend
+            except ImportError as e:
+                logger.info(f"翻譯後端 {name} 的套件未安裝（{e}），將使用 Gemma")
+            except Exception as e:
+                logger.warning(f"翻譯後端 {name} 初始化失敗，將使用 Gemma: {e}")
+    
+    def _language_pair_setting(self, table: Dict, target_language: str, default):
+        """查詢目前原文語言與目標語言的語言對設定"""
+        return language_pair_setting(table, self.source_language, target_language, default)
+    
+    def _resolve_backend(self, target_language: str) -> TranslationBackend:
+        """查詢此語言對使用的翻譯後端（不記錄指標）"""
+        name = self._language_pair_setting(self.language_pair_backends, target_language, GemmaBackend.name)
+        backend = self.backends.get(name)
+        if backend is None or not backend.supports(self.source_language, target_language):
+            backend = self.backends.get(GemmaBackend.name) or GemmaBackend(self)
+        return backend
+    
+    def _backend_for(self, target_language: str) -> TranslationBackend:
+        """選擇此語言對使用的翻譯後端（改用 Gemma 時確保模型已載入）"""
+        backend = self._resolve_backend(target_language)
+        if backend.name == GemmaBackend.name:
+            self._ensure_hf_model()
+        metrics.increment(f"translation.backend_calls.{backend.name}")
+        return backend
+    
+    def _load_assistant_model(self, device: str):
+        """載入輔助解碼使用的小型草稿模型"""
+        logger.info(f"載入草稿模型 {GEMMA_ASSISTANT_MODEL_NAME}...")
+        self.assistant_tokenizer = AutoTokenizer.from_pretrained(
+            GEMMA_ASSISTANT_MODEL_NAME,
+            cache_dir=str(MODELS_DIR)
+        )
+        self.assistant_model = load_model_low_memory(GEMMA_ASSISTANT_MODEL_NAME, device, self.model.dtype)
+        self.assistant_model.eval()
+    
+    def _count_forward(self, module, inputs, outputs):
+        """翻譯模型前向計數（forward hook）"""
+        self.target_forwards += 1
+    
+    def _assisted_kwargs(self) -> Dict:
+        """輔助解碼的生成參數"""
+        if self.assisted_decoding == "prompt_lookup":
+            return {"prompt_lookup_num_tokens": GEMMA_PROMPT_LOOKUP_TOKENS}
+        
+        if self.assisted_decoding == "draft_model" and self.assistant_model is not None:
+            kwargs = {
+                "assistant_model": self.assistant_model,
+                "num_assistant_tokens": GEMMA_NUM_ASSISTANT_TOKENS,
+            }
+            # 詞彙表不同時改用跨分詞器的輔助解碼
+            if len(self.assistant_tokenizer) != len(self.tokenizer):
+                kwargs["tokenizer"] = self.tokenizer
+                kwargs["assistant_tokenizer"] = self.assistant_tokenizer
+            return kwargs
+        
+        return {}
+    
+    @contextmanager
+    def _track_decoding(self, generation_kwargs: Dict):
+        """
+        記錄一次生成的吞吐量與每次前向產生的詞元數
+        
+        輔助解碼時，每次前向除了被接受的草稿詞元外只產生一個詞元，
+        因此以 (生成詞元數 - 前向次數) / 生成詞元數 作為草稿接受率。
+        呼叫端需將生成的詞元數寫入 stats["tokens"]。
+        """
+        assisted = "prompt_lookup_num_tokens" in generation_kwargs or "assistant_model" in generation_kwargs
+        stats = {"tokens": 0}
+        forwards_before = self.target_forwards
+        start_time = time.perf_counter()
+        yield stats
+        
+        elapsed = time.perf_counter() - start_time
+        stats["seconds"] = elapsed
+        forwards = self.target_forwards - forwards_before
+        tokens = stats["tokens"]
+        if not tokens or not forwards:
+            return
+        
+        metrics.observe("translation.tokens_per_second", tokens / elapsed)
+        metrics.observe("translation.tokens_per_forward", tokens / forwards)
+        if assisted:
+            metrics.observe("translation.draft_acceptance_rate", max(0, tokens - forwards) / tokens)
+    
+    def _setup_stop_tokens(self):
+        """找出結束詞元與換行詞元"""
+        self.stop_token_ids = [self.tokenizer.eos_token_id]
+        end_of_turn_id = self.tokenizer.convert_tokens_to_ids("<end_of_turn>")
+        if end_of_turn_id is not None and end_of_turn_id != self.tokenizer.unk_token_id:
+            self.stop_token_ids.append(end_of_turn_id)
+        
+        self.newline_token_ids = []
+        for newline in ("\n", "\n\n"):
+            token_ids = self.tokenizer(newline, add_special_tokens=False)["input_ids"]
+            if len(token_ids) == 1:
+                self.newline_token_ids.append(token_ids[0])
+    
+    def _max_new_tokens(self, texts: List[str], target_language: str) -> int:
+        """依原文詞元數與語言對比例估計輸出詞元上限（與其他生成式後端共用 estimate_max_new_tokens）"""
+        if GEMMA_GENERATION_PROFILE != "subtitle":
+            return GEMMA_MAX_LENGTH
+        
+        source_tokens = max(
+            len(self.tokenizer(text, add_special_tokens=False)["input_ids"]) for text in texts
+        )
+        return estimate_max_new_tokens(source_tokens, self.source_language, target_language)
+    
+    def _generation_kwargs(self, max_new_tokens: int, batch_size: int = 1, stop_at_newline: bool = True) -> Dict:
+        """
+        生成參數
+        
+        "subtitle" 設定使用貪婪（或小型束搜尋）解碼，輸出可重現且適合快取，
+        並在換行（多行輸出時除外）或 <end_of_turn> 時停止；"sampling" 保留原本的取樣設定。
+        單一序列且非束搜尋時加入輔助解碼參數。
+        """
+        kwargs = self._profile_kwargs(max_new_tokens, stop_at_newline)
+        if batch_size == 1 and kwargs.get("num_beams", 1) == 1:
+            kwargs.update(self._assisted_kwargs())
+        if self.cancel_token is not None:
+            criteria = kwargs.setdefault("stopping_criteria", StoppingCriteriaList())
+            criteria.append(CancelStoppingCriteria(self.cancel_token))
+        return kwargs
+    
+    @contextmanager
+    def cancellable(self, token: CancellationToken):
+        """在區塊內的生成檢查取消標記（取消時拋出 TranslationCancelled）"""
+        self.cancel_token = token
+        try:
+            yield token
+        finally:
+            self.cancel_token = None
+    
+    def _check_cancelled(self, stats: Optional[Dict] = None):
+        """已取消時記錄浪費的運算並中止，部分生成的結果不使用也不快取"""
+        token = self.cancel_token
+        if token is None or not token.cancelled:
+            return
+        
+        stats = stats or {}
+        metrics.increment("translation.cancellations")
+        metrics.increment(f"translation.cancellations.{token.reason}")
+        metrics.increment("translation.wasted_tokens", stats.get("tokens", 0))
+        if "seconds" in stats:
+            metrics.observe("translation.wasted_seconds", stats["seconds"])
+        raise TranslationCancelled(token.reason)
+    
+    def _profile_kwargs(self, max_new_tokens: int, stop_at_newline: bool = True) -> Dict:
+        """依生成設定（GEMMA_GENERATION_PROFILE）的基本生成參數"""
+        if GEMMA_GENERATION_PROFILE == "sampling":
+            return {
+                "max_new_tokens": max_new_tokens,
+                "do_sample": True,
+                "temperature": GEMMA_TEMPERATURE,
+                "top_p": 0.95,
+                "top_k": 50,
+                "pad_token_id": self.tokenizer.pad_token_id,
+                "eos_token_id": self.stop_token_ids,
+            }
+        
+        kwargs = {
+            "max_new_tokens": max_new_tokens,
+            "do_sample": False,
+            "num_beams": GEMMA_NUM_BEAMS,
+            "pad_token_id": self.tokenizer.pad_token_id,
+            "eos_token_id": self.stop_token_ids,
+        }
+        if stop_at_newline:
+            kwargs["stopping_criteria"] = StoppingCriteriaList([NewlineStoppingCriteria(self.newline_token_ids)])
+        return kwargs
+    
+    def _check_truncation(self, generated_ids: List[int], max_new_tokens: int) -> bool:
+        """生成達到詞元上限且沒有以結束或換行詞元結尾時，視為截斷並記錄"""
+        generated_ids = [token_id for token_id in generated_ids if token_id != self.tokenizer.pad_token_id]
+        stop_ids = set(self.stop_token_ids) | set(self.newline_token_ids)
+        truncated = len(generated_ids) >= max_new_tokens and generated_ids[-1] not in stop_ids
+        
+        metrics.increment("translation.generations")
+        if truncated:
+            metrics.increment("translation.truncations")
+            logger.warning(f"翻譯輸出達到 {max_new_tokens} 個詞元上限而被截斷")
+        metrics.set_gauge(
+            "translation.truncation_rate",
+            metrics.get_counter("translation.truncations") / metrics.get_counter("translation.generations")
+        )
+        return truncated
+    
+    def _prompt_version(self) -> str:
+        """翻譯記憶使用的提示詞版本（包含生成設定）"""
+        return f"{self.PROMPT_VERSION}-{GEMMA_GENERATION_PROFILE}"
+    
+    def _cache_model_id(self, target_language: str) -> str:
+        """快取鍵使用的模型 ID（此語言對實際使用的後端，切換後端時不沿用其他模型的譯文）"""
+        return self._resolve_backend(target_language).model_id
+    
+    def _lookup_cache(self, text: str, target_language: str) -> Optional[str]:
+        """查詢快取（啟用翻譯記憶庫時依序查記憶體與磁碟）"""
+        model_id = self._cache_model_id(target_language)
+        if self.translation_memory is not None:
+            return self.translation_memory.get(text, target_language, model_id)
+        return self.translation_cache.get(f"{normalize_text(text)}:{target_language}:{model_id}")
+    
+    def _store_cache(self, text: str, target_language: str, translation: str, model_id: Optional[str] = None):
+        """加入快取（model_id 為產生譯文的後端，預設為此語言對使用的後端）"""
+        model_id = model_id or self._cache_model_id(target_language)
+        if self.translation_memory is not None:
+            self.translation_memory.put(text, target_language, translation, model_id)
+        else:
+            self.translation_cache.put(f"{normalize_text(text)}:{target_language}:{model_id}", translation)
     
     def _build_translation_prompt(self, text: str, target_language: str) -> str:
         """建構翻譯提示詞"""
-        # 基礎提示詞
-        prompt = f"""You are a professional translator. Translate the following text to {target_language}.
+        return self._render_prompt(self._prompt_content(text, target_language), target_language)
+    
+    def _render_prompt(self, content: str, target_language: str) -> str:
+        """將使用者內容放入提示詞模板（模板的其餘部分只隨目標語言與提示詞版本改變）"""
+        target_lang_name = self.language_names.get(target_language, target_language)
+        return f"""You are a professional translator. Translate the following text to {target_lang_name}.
 Maintain the original meaning and tone. Consider the context from previous translations.
 
-"""
+{content}
+
+Translation:"""
+    
+    def _prompt_content(self, text: str, target_language: str) -> str:
+        """每次翻譯改變的提示詞內容（上下文與原文）"""
+        target_lang_name = self.language_names.get(target_language, target_language)
+        context_buffer = self.context_buffers.get(target_language, [])
+        content = ""
         
         # 加入上下文（如果有）
-        if self.context_buffer:
-            prompt += "Previous context:\n"
-            for source, translated in self.context_buffer[-3:]:  # 最近3條
-                prompt += f"Original: {source}\n"
-                prompt += f"Translation: {translated}\n"
-            prompt += "\n"
+        if context_buffer:
+            content += "Previous context:\n"
+            for source, translated in context_buffer[-3:]:  # 最近3條
+                content += f"Original: {source}\n"
+                content += f"Translation: {translated}\n"
+            content += "\n"
         
         # 加入要翻譯的文字
-        prompt += f"Translate this text to {target_language}:\n{text}\n\nTranslation:"
+        content += f"Translate this text to {target_lang_name}:\n{text}"
         
-        return prompt
+        return content
+    
+    def _encode_prompts(self, pairs: List[Tuple[str, str]]) -> Dict[str, torch.Tensor]:
+        """以預先分詞的提示詞模板產生左側填充的批次輸入"""
+        return self._encode_contents([
+            (self._prompt_content(text, target_language), target_language) for text, target_language in pairs
+        ])
+    
+    def _encode_contents(self, contents: List[Tuple[str, str]]) -> Dict[str, torch.Tensor]:
+        """將多個 (使用者內容, 目標語言) 放入預先分詞的提示詞模板，產生左側填充的批次輸入"""
+        if self.prompt_compiler is None or self.prompt_compiler.tokenizer is not self.tokenizer:
+            self.prompt_compiler = PromptCompiler(self.tokenizer, self._render_prompt)
+        
+        version = self._prompt_version()
+        input_ids = [
+            self.prompt_compiler.encode(content, target_language, version)
+            for content, target_language in contents
+        ]
+        return self.prompt_compiler.batch(input_ids)
     
     def _clean_translation(self, translation: str) -> str:
         """清理翻譯結果"""
@@ -266,9 +817,9 @@ Maintain the original meaning and tone. Consider the context from previous trans
         # 移除可能的語言標記
         for lang_name in self.language_names.values():
             if translation.startswith(f"{lang_name}:"):
-                translation = translation[len(f"{lang_name}:"):]
+                translation = translation[len(f"{lang_name}:"):].strip()
             if translation.startswith(f"Translation to {lang_name}:"):
-                translation = translation[len(f"Translation to {lang_name}:"):]
+                translation = translation[len(f"Translation to {lang_name}:"):].strip()
         
         # 移除引號（如果整個翻譯被引號包圍）
         if len(translation) > 2:
@@ -278,27 +829,251 @@ Maintain the original meaning and tone. Consider the context from previous trans
         
         return translation.strip()
     
-    def _update_context(self, source: str, translation: str):
-        """更新上下文緩衝區"""
-        self.context_buffer.append((source, translation))
+    def _clean_partial(self, partial: str) -> str:
+        """清理串流中的部分譯文：與完整譯文相同移除語言標記，可能是未完成的語言標記時先不顯示"""
+        partial = partial.strip()
+        for lang_name in self.language_names.values():
+            for label in (f"{lang_name}:", f"Translation to {lang_name}:"):
+                if label.startswith(partial):
+                    return ""
+        
+        partial = self._clean_translation(partial)
+        # 結尾的引號尚未生成時，只移除開頭的引號
+        if partial[:1] in ('"', "'"):
+            partial = partial[1:].lstrip()
+        return partial
+    
+    def _update_context(self, source: str, translation: str, target_language: str):
+        """更新目標語言的上下文緩衝區"""
+        context_buffer = self.context_buffers.setdefault(target_language, [])
+        context_buffer.append((source, translation))
         
         # 保持緩衝區大小
-        if len(self.context_buffer) > self.max_context_length:
-            self.context_buffer.pop(0)
+        if len(context_buffer) > self.max_context_length:
+            context_buffer.pop(0)
     
     def translate_batch(self, texts: List[str], target_language: str) -> List[Optional[str]]:
-        """批次翻譯多個文字"""
+        """
+        批次翻譯多個文字
+        
+        每個項目各自查詢快取（整段及逐句），未命中的文字與句子（相同文字只翻譯一次）
+        合併為左側填充的批次 generate 呼叫，每個序列各自在結束詞元停止。
+        
+        Args:
+            texts: 要翻譯的文字列表
+            target_language: 目標語言代碼
+            
+        Returns:
+            與輸入順序相同的翻譯結果（失敗的項目為 None）
+        """
+        translations = [None] * len(texts)
+        
+        if not self.is_initialized:
+            logger.error("翻譯模型尚未初始化")
+            return translations
+        
+        plans = {}  # 項目索引 -> _lookup_segment 結果
+        pending = {}  # 正規化文字 -> 待翻譯的原文
+        for index, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            
+            plans[index] = self._lookup_segment(text, target_language)
+            for source in self._missing_sources(plans[index]):
+                pending.setdefault(normalize_text(source), source)
+        
+        results = dict(zip(pending, self._translate_misses(list(pending.values()), target_language)))
+        for index, segments in plans.items():
+            missing = [results[normalize_text(source)] for source in self._missing_sources(segments)]
+            translations[index] = self._assemble_segment(texts[index], target_language, segments, missing)
+        
+        return translations
+    
+    def _translate_misses(self, texts: List[str], target_language: str) -> List[Optional[str]]:
+        """
+        以批次生成翻譯未命中快取的文字（每批最多 GEMMA_BATCH_SIZE 個，單一項目走一般翻譯路徑）
+        
+        Returns:
+            與輸入順序相同的翻譯結果（失敗的批次為 None）
+        """
         translations = []
+        for start in range(0, len(texts), GEMMA_BATCH_SIZE):
+            chunk = texts[start:start + GEMMA_BATCH_SIZE]
+            
+            try:
+                if len(chunk) == 1:
+                    results = [self._translate_uncached(chunk[0], target_language)]
+                else:
+                    results = self._translate_uncached_batch(chunk, target_language)
+            except TranslationCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"批次翻譯失敗: {e}")
+                results = [None] * len(chunk)
+            
+            translations.extend(results)
+        
+        return translations
+    
+    def _translate_uncached_batch(self, texts: List[str], target_language: str) -> List[Optional[str]]:
+        """以單次批次生成翻譯多個文字，並加入快取與上下文"""
+        metrics.increment("translation.llm_calls")
+        metrics.set_gauge(
+            "translation.llm_calls_per_minute", metrics.rate_per_minute("translation.llm_calls")
+        )
+        metrics.observe("translation.batch_size", len(texts))
+        backend = self._backend_for(target_language)
+        outputs = backend.translate_batch(texts, self.source_language, target_language)
+        
+        translations = []
+        for text, output in zip(texts, outputs):
+            translation = self._clean_translation(output) if output else None
+            if translation:
+                self._store_cache(text, target_language, translation, backend.model_id)
+                self._update_context(text, translation, target_language)
+            translations.append(translation or None)
+        
+        return translations
+    
+    def translate_multi(self, texts: List[str], target_languages: List[str]) -> Dict[str, List[Optional[str]]]:
+        """
+        將同一批文字翻譯成多個目標語言
+        
+        各語言各自查詢快取（整段及逐句）與使用自己的上下文；使用 Gemma 後端的語言中未命中的文字與句子
+        合併為同一個批次 generate（每個序列使用自己語言的提示詞），其他後端依語言各自批次翻譯。
+        
+        Args:
+            texts: 要翻譯的文字列表
+            target_languages: 目標語言代碼列表
+            
+        Returns:
+            目標語言 -> 與輸入順序相同的翻譯結果
+        """
+        if len(target_languages) == 1:
+            return {target_languages[0]: self.translate_batch(texts, target_languages[0])}
+        
+        results = {language: [None] * len(texts) for language in target_languages}
+        if not self.is_initialized:
+            logger.error("翻譯模型尚未初始化")
+            return results
+        
+        plans = {}  # (目標語言, 項目索引) -> _lookup_segment 結果
+        pending = {}  # (目標語言, 正規化文字) -> 待翻譯的原文
+        for language in target_languages:
+            if self._resolve_backend(language).name != GemmaBackend.name:
+                results[language] = self.translate_batch(texts, language)
+                continue
+            
+            for index, text in enumerate(texts):
+                if not text or not text.strip():
+                    continue
+                
+                plans[(language, index)] = self._lookup_segment(text, language)
+                for source in self._missing_sources(plans[(language, index)]):
+                    pending.setdefault((language, normalize_text(source)), source)
+        
+        misses = list(pending)
+        translated = {}  # (目標語言, 正規化文字) -> 譯文
+        for start in range(0, len(misses), GEMMA_BATCH_SIZE):
+            chunk = misses[start:start + GEMMA_BATCH_SIZE]
+            pairs = [(pending[key], key[0]) for key in chunk]
+            
+            try:
+                if len(pairs) == 1:
+                    translations = [self._translate_uncached(*pairs[0])]
+                else:
+                    translations = self._translate_uncached_pairs(pairs)
+            except TranslationCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"多語言批次翻譯失敗: {e}")
+                continue
+            
+            translated.update(zip(chunk, translations))
+        
+        for (language, index), segments in plans.items():
+            missing = [translated.get((language, normalize_text(source)))
+                       for source in self._missing_sources(segments)]
+            results[language][index] = self._assemble_segment(texts[index], language, segments, missing)
+        
+        return results
+    
+    def _translate_uncached_pairs(self, pairs: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """以單次 Gemma 批次生成翻譯多個 (文字, 目標語言)，並加入各語言的快取與上下文"""
+        metrics.increment("translation.llm_calls")
+        metrics.set_gauge(
+            "translation.llm_calls_per_minute", metrics.rate_per_minute("translation.llm_calls")
+        )
+        metrics.observe("translation.batch_size", len(pairs))
+        metrics.increment(f"translation.backend_calls.{GemmaBackend.name}")
+        self._ensure_hf_model()
+        outputs = self._generate_pairs(pairs)
         
-        for text in texts:
-            translation = self.translate(text, target_language)
-            translations.append(translation)
+        translations = []
+        for (text, target_language), output in zip(pairs, outputs):
+            translation = self._clean_translation(output) if output else None
+            if translation:
+                self._store_cache(text, target_language, translation, self._gemma_model_id())
+                self._update_context(text, translation, target_language)
+            translations.append(translation or None)
         
         return translations
     
+    def _generate_batch(
+        self, texts: List[str], target_language: str,
+        streamer: Optional[TextIteratorStreamer] = None
+    ) -> List[Optional[str]]:
+        """
+        左側填充後以單次 generate 生成多個翻譯（返回未清理的模型輸出）
+        
+        所有項目共用呼叫前的上下文；工作階段模式不適用於批次，一律使用完整提示詞。
+        streamer 只支援單一項目。
+        """
+        return self._generate_pairs([(text, target_language) for text in texts], streamer=streamer)
+    
+    def _generate_pairs(
+        self, pairs: List[Tuple[str, str]], streamer: Optional[TextIteratorStreamer] = None
+    ) -> List[Optional[str]]:
+        """以單次 generate 生成多個 (文字, 目標語言) 的翻譯，目標語言可各不相同"""
+        max_new_tokens = max(
+            self._max_new_tokens([text], target_language) for text, target_language in pairs
+        )
+        contents = [
+            (self._prompt_content(text, target_language), target_language) for text, target_language in pairs
+        ]
+        return self._generate_contents(contents, max_new_tokens, streamer=streamer)
+    
+    def _generate_contents(
+        self, contents: List[Tuple[str, str]], max_new_tokens: int,
+        streamer: Optional[TextIteratorStreamer] = None, stop_at_newline: bool = True
+    ) -> List[Optional[str]]:
+        """以單次 generate 生成多個 (使用者內容, 目標語言) 的回應（返回未清理的模型輸出）"""
+        self._check_cancelled()
+        inputs = {
+            name: tensor.to(self.model.device) for name, tensor in self._encode_contents(contents).items()
+        }
+        
+        generation_kwargs = self._generation_kwargs(
+            max_new_tokens, batch_size=len(contents), stop_at_newline=stop_at_newline
+        )
+        with self._track_decoding(generation_kwargs) as stats, torch.no_grad():
+            output_ids = self.model.generate(**inputs, streamer=streamer, **generation_kwargs)
+            new_tokens = output_ids[:, inputs["input_ids"].shape[1]:]
+            stats["tokens"] = int((new_tokens != self.tokenizer.pad_token_id).sum())
+        
+        metrics.increment("translation.generated_tokens", stats["tokens"])
+        self._check_cancelled(stats)
+        for generated_ids in new_tokens.tolist():
+            self._check_truncation(generated_ids, max_new_tokens)
+        
+        return [
+            output.strip() or None
+            for output in self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        ]
+    
     def clear_context(self):
         """清除上下文"""
-        self.context_buffer.clear()
+        self.context_buffers.clear()
     
     def clear_cache(self):
         """清除翻譯快取"""
@@ -306,6 +1081,23 @@ Maintain the original meaning and tone. Consider the context from previous trans
     
     def cleanup(self):
         """清理資源"""
+        stats = self.translation_cache.stats()
+        logger.info(
+            f"翻譯快取統計: 命中率 {stats['hit_rate']:.1%} "
+            f"(命中 {stats['hits']} / 未命中 {stats['misses']})，"
+            f"淘汰 {stats['evictions']}，{stats['size']} 項 / {stats['bytes']} 位元組"
+        )
+        
+        if self.translation_memory is not None:
+            memory_stats = self.translation_memory.stats()
+            logger.info(
+                f"翻譯記憶庫統計: 命中率 {memory_stats['hit_rate']:.1%} "
+                f"(記憶體 {memory_stats['front_hits']} / 磁碟 {memory_stats['disk_hits']} / "
+                f"未命中 {memory_stats['misses']})，共 {memory_stats['entries']} 項"
+            )
+            self.translation_memory.close()
+            self.translation_memory = None
+        
         if self.model:
             del self.model
             self.model = None
@@ -313,48 +1105,361 @@ Maintain the original meaning and tone. Consider the context from previous trans
         if self.tokenizer:
             del self.tokenizer
             self.tokenizer = None
+        self.prompt_compiler = None
         
-        if self.pipeline:
-            del self.pipeline
-            self.pipeline = None
+        for backend in self.backends.values():
+            backend.cleanup()
+        self.backends.clear()
+        
+        if self.assistant_model is not None:
+            del self.assistant_model
+            self.assistant_model = None
+            self.assistant_tokenizer = None
         
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
         
+        self.hf_model_deferred = False
         self.is_initialized = False
         logger.info("翻譯模型已清理")
 
 
+def supports_session_cache(config) -> bool:
+    """
+    模型的 KV 快取能否沿用為對話的前綴
+
+    只有每一層都是完整注意力的 DynamicCache 層時，快取才一定涵蓋先前所有輪次；
+    滑動視窗層（例如 Gemma 3n）捲過早期輪次後不再保留，共享 KV 的層也不各自保存快取。
+    """
+    config = config.get_text_config()
+    if getattr(config, "num_kv_shared_layers", 0):
+        return False
+    if any(layer_type != "full_attention" for layer_type in getattr(config, "layer_types", None) or []):
+        return False
+    return all(type(layer) is DynamicLayer for layer in DynamicCache(config=config).layers)
+
+
+class GemmaConversationSession:
+    """
+    Gemma 對話工作階段
+
+    將系統提示詞與先前的翻譯輪次保留為多輪對話，並沿用其 KV 快取，
+    每次只需預填新的使用者輪次，預填時間與新文字長度成正比。
+    超過詞元預算時只保留最近的輪次重新建立（下一次呼叫重新預填）。
+    只適用於 supports_session_cache 為 True 的模型。
+    """
+
+    def __init__(self, model, tokenizer, system_prompt: str, stop_token_ids: List[int],
+                 token_budget: int = GEMMA_SESSION_TOKEN_BUDGET):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.system_prompt = system_prompt
+        self.token_budget = token_budget
+        self.turns = []  # [(原文, 譯文)]
+        self.stop_token_ids = set(stop_token_ids)  # 不屬於譯文的結尾詞元（結束標記、換行）
+        self.turn_end_ids = self._encode("<end_of_turn>\n")
+        self.reset()
+
+    def _encode(self, text: str) -> List[int]:
+        """編碼文字（不加入特殊詞元）"""
+        return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _render_turn(self, text: str, first: bool) -> str:
+        """
+        產生使用者輪次與模型回應的開頭
+
+        與 Gemma chat template 相同，系統提示詞併入第一個使用者輪次。
+        """
+        header = "" if first else "<start_of_turn>user\n"
+        return f"{header}{text}<end_of_turn>\n<start_of_turn>model\n"
+
+    def reset(self):
+        """依保留的輪次重建詞元序列，並捨棄 KV 快取"""
+        self.prefix_ids = [self.tokenizer.bos_token_id] + self._encode(
+            f"<start_of_turn>user\n{self.system_prompt}\n\n"
+        )
+        for index, (source, translation) in enumerate(self.turns):
+            self.prefix_ids += self._encode(self._render_turn(source, first=index == 0))
+            self.prefix_ids += self._encode(translation) + self.turn_end_ids
+
+        self.cache = None
+        self.cached_length = 0  # KV 快取涵蓋 prefix_ids 的前幾個詞元
+
+    def generate(self, text: str, **generation_kwargs) -> Tuple[str, List[int]]:
+        """
+        在工作階段中翻譯一段文字
+
+        Args:
+            text: 使用者輪次的內容
+            **generation_kwargs: 傳給 model.generate 的生成參數
+
+        Returns:
+            (模型回應（不含結束標記）, 生成的詞元)
+        """
+        turn_ids = self._encode(self._render_turn(text, first=not self.turns))
+        input_ids = self.prefix_ids + turn_ids
+        metrics.observe("translation.prefill_tokens", len(input_ids) - self.cached_length)
+
+        # 第一輪依模型設定建立快取（只使用完整注意力的層，見 supports_session_cache）
+        cache = self.cache if self.cache is not None else DynamicCache(config=self.model.config)
+        try:
+            input_tensor = torch.tensor([input_ids], device=self.model.device)
+            with torch.no_grad():
+                outputs = self.model.generate(
+                    input_ids=input_tensor,
+                    attention_mask=torch.ones_like(input_tensor),
+                    past_key_values=cache,
+                    return_dict_in_generate=True,
+                    **generation_kwargs
+                )
+        except Exception:
+            # 快取可能已被部分更新，下一次重新預填
+            self.reset()
+            raise
+
+        generated_ids = outputs.sequences[0, len(input_ids):].tolist()
+        answer_ids = generated_ids
+        if generated_ids and generated_ids[-1] in self.stop_token_ids:
+            answer_ids = generated_ids[:-1]
+
+        # 最後一個生成的詞元尚未寫入快取；補上的結束標記在下一次呼叫時一併預填
+        self.cache = outputs.past_key_values
+        self.cached_length = len(input_ids) + len(generated_ids) - 1
+        self.prefix_ids = input_ids + answer_ids + self.turn_end_ids
+
+        answer = self.tokenizer.decode(answer_ids, skip_special_tokens=True).strip()
+        self.turns.append((text, answer))
+
+        if len(self.prefix_ids) > self.token_budget:
+            self._rebase()
+
+        metrics.set_gauge("translation.session_tokens", len(self.prefix_ids))
+        return answer, generated_ids
+
+    def discard_turn(self, text: str):
+        """移除最近一個輪次（例如生成被中止時）並重建詞元序列"""
+        if self.turns and self.turns[-1][0] == text:
+            self.turns.pop()
+        self.reset()
+
+    def _rebase(self):
+        """捨棄最舊的輪次，直到詞元數降到預算的一半以下（保留空間避免頻繁重建）"""
+        while self.turns:
+            self.turns.pop(0)
+            self.reset()
+            if len(self.prefix_ids) <= self.token_budget // 2:
+                break
+
+        metrics.increment("translation.session_rebases")
+        logger.debug(f"翻譯工作階段已重建，保留 {len(self.turns)} 個輪次")
+
+
 class GemmaTranslator(Translator):
     """
     Gemma 專用翻譯器 - 針對 Gemma 模型優化
     """
     
-    def _build_translation_prompt(self, text: str, target_language: str) -> str:
+    PROMPT_VERSION = "gemma-v1"
+    PACKED_LINE_TOKENS = 4  # 打包輸出中每行編號額外使用的詞元數
+    
+    def __init__(self):
+        super().__init__()
+        self.sessions: Dict[str, GemmaConversationSession] = {}  # 目標語言 -> 對話工作階段
+        self.packing = GEMMA_PACKING_ENABLED  # 批次翻譯時將短句打包為編號列表
+        self.packing_token_budget = GEMMA_PACKING_TOKEN_BUDGET
+        self.packing_max_segments = GEMMA_PACKING_MAX_SEGMENTS
+        self.session_supported = None  # 目前模型的 KV 快取能否用於工作階段（首次使用時檢查）
+    
+    def _system_prompt(self, target_language: str) -> str:
+        """系統提示詞"""
+        return (
+            f"You are a professional real-time translator for live streaming content. "
+            f"Translate the given text to {target_language} while maintaining natural flow "
+            f"and fixing obvious speech recognition errors."
+        )
+    
+    def _prompt_version(self) -> str:
+        """工作階段模式與多段打包的提示詞格式不同，使用獨立的翻譯記憶"""
+        version = super()._prompt_version()
+        if GEMMA_SESSION_MODE:
+            version += "-session"
+        if self.packing:
+            version += "-packed"
+        return version
+    
+    def _generate(
+        self, text: str, target_language: str, streamer: Optional[TextIteratorStreamer] = None
+    ) -> Optional[str]:
+        """工作階段模式下只預填新的使用者輪次（模型的快取不適用時使用一般提示詞）"""
+        if not GEMMA_SESSION_MODE or not self._session_cache_supported():
+            return super()._generate(text, target_language, streamer=streamer)
+        
+        target_lang_name = self.language_names.get(target_language, target_language)
+        session = self.sessions.get(target_language)
+        if session is None:
+            session = GemmaConversationSession(
+                self.model, self.tokenizer, self._system_prompt(target_lang_name),
+                self.stop_token_ids + self.newline_token_ids
+            )
+            self.sessions[target_language] = session
+        
+        self._check_cancelled()
+        max_new_tokens = self._max_new_tokens([text], target_language)
+        generation_kwargs = self._generation_kwargs(max_new_tokens)
+        user_text = f"Translate to {target_lang_name}: {text}"
+        with self._track_decoding(generation_kwargs) as stats:
+            answer, generated_ids = session.generate(user_text, streamer=streamer, **generation_kwargs)
+            stats["tokens"] = len(generated_ids)
+        metrics.increment("translation.generated_tokens", len(generated_ids))
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            session.discard_turn(user_text)  # 不保留中止的部分回應
+            self._check_cancelled(stats)
+        self._check_truncation(generated_ids, max_new_tokens)
+        return answer
+    
+    def _session_cache_supported(self) -> bool:
+        """檢查目前模型的 KV 快取能否沿用為對話前綴（結果保留到模型清理為止）"""
+        if self.session_supported is None:
+            self.session_supported = supports_session_cache(self.model.config)
+            if not self.session_supported:
+                logger.warning("模型的 KV 快取包含滑動視窗或共享層，工作階段模式改用一般提示詞")
+        return self.session_supported
+    
+    def _generate_pairs(
+        self, pairs: List[Tuple[str, str]], streamer: Optional[TextIteratorStreamer] = None
+    ) -> List[Optional[str]]:
+        """
+        啟用多段打包時，同一目標語言的多個短句以編號列表放入同一個提示詞
+        
+        打包的提示詞合併為一次 generate；輸出的編號與句數不符的組合，
+        以及無法打包的句子，改以一般的逐句提示詞批次生成。
+        """
+        if not self.packing or streamer is not None or len(pairs) < 2:
+            return super()._generate_pairs(pairs, streamer=streamer)
+        
+        outputs = [None] * len(pairs)
+        packs, singles = self._plan_packs(pairs)
+        if packs:
+            for pack, parsed in zip(packs, self._generate_packed(pairs, packs)):
+                if parsed is None:
+                    singles.extend(pack)
+                    continue
+                for index, output in zip(pack, parsed):
+                    outputs[index] = output
+        
+        if singles:
+            singles.sort()
+            for index, output in zip(singles, super()._generate_pairs([pairs[index] for index in singles])):
+                outputs[index] = output
+        return outputs
+    
+    def _plan_packs(self, pairs: List[Tuple[str, str]]) -> Tuple[List[List[int]], List[int]]:
+        """
+        依目標語言與原文詞元預算將項目分組
+        
+        Returns:
+            (多句組合的項目索引列表, 單獨翻譯的項目索引)
+        """
+        by_language = {}
+        for index, (_, target_language) in enumerate(pairs):
+            by_language.setdefault(target_language, []).append(index)
+        
+        packs, singles = [], []
+        
+        def flush(group):
+            if len(group) > 1:
+                packs.append(group)
+            else:
+                singles.extend(group)
+        
+        for indices in by_language.values():
+            group, group_tokens = [], 0
+            for index in indices:
+                tokens = len(self.tokenizer(pairs[index][0], add_special_tokens=False)["input_ids"])
+                if group and (group_tokens + tokens > self.packing_token_budget
+                              or len(group) >= self.packing_max_segments):
+                    flush(group)
+                    group, group_tokens = [], 0
+                group.append(index)
+                group_tokens += tokens
+            flush(group)
+        
+        return packs, singles
+    
+    def _generate_packed(
+        self, pairs: List[Tuple[str, str]], packs: List[List[int]]
+    ) -> List[Optional[List[str]]]:
+        """生成打包提示詞並解析每組的編號列表（格式不符的組合為 None）"""
+        contents = []
+        max_new_tokens = 0
+        for pack in packs:
+            target_language = pairs[pack[0]][1]
+            texts = [pairs[index][0] for index in pack]
+            contents.append((self._packed_content(texts, target_language), target_language))
+            # 每句的輸出上限加總，再加上編號的詞元
+            max_new_tokens = max(max_new_tokens, sum(
+                self._max_new_tokens([text], target_language) + self.PACKED_LINE_TOKENS for text in texts
+            ))
+        
+        outputs = self._generate_contents(contents, max_new_tokens, stop_at_newline=False)
+        
+        results = []
+        for pack, output in zip(packs, outputs):
+            metrics.observe("translation.pack_size", len(pack))
+            parsed = parse_numbered_list(output or "", len(pack))
+            if parsed is None:
+                metrics.increment("translation.packing_fallbacks")
+                logger.debug(f"打包翻譯的輸出格式不符，改為逐句翻譯: {output!r}")
+            else:
+                metrics.increment("translation.packed_segments", len(pack))
+            results.append(parsed)
+        return results
+    
+    def _packed_content(self, texts: List[str], target_language: str) -> str:
+        """多段打包的使用者輪次內容（上下文與編號列表）"""
+        context_buffer = self.context_buffers.get(target_language, [])
+        target_language = self.language_names.get(target_language, target_language)
+        
+        content = ""
+        if context_buffer:
+            content = "Recent context: "
+            for source, translated in context_buffer[-2:]:
+                content += f"'{source}' → '{translated}'; "
+            content += "\n\n"
+        
+        content += (
+            f"Translate each numbered line to {target_language}. "
+            f"Reply with the same numbers, one translated line per number, and nothing else.\n"
+        )
+        return content + format_numbered_list(texts)
+    
+    def clear_context(self):
+        """清除上下文與對話工作階段"""
+        super().clear_context()
+        self.sessions.clear()
+    
+    def cleanup(self):
+        """清理資源"""
+        self.sessions.clear()
+        self.session_supported = None
+        super().cleanup()
+    
+    def _render_prompt(self, content: str, target_language: str) -> str:
         """建構 Gemma 3n 優化的提示詞"""
+        target_language = self.language_names.get(target_language, target_language)
+        
         # Gemma 3n IT 支援更自然的對話格式
         messages = [
             {
                 "role": "system",
-                "content": f"You are a professional real-time translator for live streaming content. Translate the given text to {target_language} while maintaining natural flow and fixing obvious speech recognition errors."
+                "content": self._system_prompt(target_language)
+            },
+            {
+                "role": "user",
+                "content": content
             }
         ]
         
-        # 加入上下文
-        if self.context_buffer:
-            context_info = "Recent context: "
-            for source, translated in self.context_buffer[-2:]:
-                context_info += f"'{source}' → '{translated}'; "
-            messages.append({
-                "role": "user",
-                "content": f"{context_info}\n\nNow translate: {text}"
-            })
-        else:
-            messages.append({
-                "role": "user",
-                "content": f"Translate to {target_language}: {text}"
-            })
-        
         # 使用 tokenizer 的 chat template
         if hasattr(self.tokenizer, 'apply_chat_template') and self.tokenizer.chat_template:
             try:
@@ -369,16 +1474,21 @@ class GemmaTranslator(Translator):
         
         # 回退到基礎格式
         prompt = f"<bos><start_of_turn>user\n"
-        prompt += f"Translate to {target_language}: {text}\n"
+        prompt += f"{content}\n"
         prompt += "<end_of_turn>\n<start_of_turn>model\n"
         
         return prompt
     
-    def _optimize_for_streaming(self):
-        """優化串流翻譯設定"""
-        if self.pipeline:
-            # 調整生成參數以提高速度
-            self.pipeline.model.config.max_new_tokens = 100  # 限制輸出長度
-            self.pipeline.model.config.temperature = 0.7    # 平衡創意和準確性
-            self.pipeline.model.config.top_p = 0.9          # 核採樣
-            self.pipeline.model.config.repetition_penalty = 1.1  # 避免重複 
\ No newline at end of file
+    def _prompt_content(self, text: str, target_language: str) -> str:
+        """使用者輪次的內容（上下文與原文）"""
+        context_buffer = self.context_buffers.get(target_language, [])
+        target_language = self.language_names.get(target_language, target_language)
+        
+        # 加入上下文
+        if context_buffer:
+            context_info = "Recent context: "
+            for source, translated in context_buffer[-2:]:
+                context_info += f"'{source}' → '{translated}'; "
+            return f"{context_info}\n\nNow translate: {text}"
+        
+        return f"Translate to {target_language}: {text}"
@@ -3,6 +3,7 @@
 """
 import sys
 import logging
+import threading
 import time
 import gc
 from typing import Optional
@@ -16,9 +17,18 @@ from PyQt5.QtCore import QThread, pyqtSignal, Qt, QTimer
 from PyQt5.QtGui import QFont, QIcon, QColor
 
 from ..core.youtube_handler import YouTubeHandler
-from ..core.transcriber import Transcriber
+from ..core.transcriber import Transcriber, TwoTierTranscriber
 from ..core.translator import GemmaTranslator
-from ..config import APP_NAME, SUPPORTED_LANGUAGES, DEFAULT_SUBTITLE_SETTINGS
+from ..core.translation_worker import TranslationWorker, TwoTierTranslationWorker
+from ..core.segmenter import SentenceAccumulator
+from ..core.language_bypass import LanguageBypass
+from ..core.model_workers import RemoteTranscriber, RemoteTranslator
+from ..config import (
+    APP_NAME, SUPPORTED_LANGUAGES, DEFAULT_SUBTITLE_SETTINGS, WHISPER_WARMUP_ENABLED,
+    WHISPER_TWO_TIER_MODE, SENTENCE_ACCUMULATOR_ENABLED, ADDITIONAL_TARGET_LANGUAGES,
+    SUBTITLE_STACK_OFFSET, MODEL_WORKER_PROCESSES, LANGUAGE_BYPASS_ENABLED, TWO_TIER_TRANSLATION
+)
+from ..utils.metrics import metrics
 from .subtitle_window import SubtitleWindow
 from .settings_dialog import SettingsDialog
 
@@ -29,24 +39,119 @@ logger = logging.getLogger(__name__)
 class ProcessingThread(QThread):
     """處理執行緒"""
     status_update = pyqtSignal(str)
-    subtitle_update = pyqtSignal(str)
+    subtitle_update = pyqtSignal(str, int, str)  # (目標語言, 片段序號, 字幕文字)
     error_occurred = pyqtSignal(str)
     
-    def __init__(self, url, source_lang, target_lang):
+    def __init__(self, url, source_lang, target_langs):
         super().__init__()
         self.url = url
         self.source_lang = source_lang
-        self.target_lang = target_lang
+        # 可傳入單一或多個目標語言；直播擷取與語音識別只執行一次，各語言的翻譯合併批次處理
+        self.target_langs = [target_langs] if isinstance(target_langs, str) else list(target_langs)
         self.is_running = False
         
         self.youtube_handler = YouTubeHandler()
-        self.transcriber = Transcriber()
-        self.translator = GemmaTranslator()  # 使用 Gemma 最佳化版本
+        self.two_tier = WHISPER_TWO_TIER_MODE and not MODEL_WORKER_PROCESSES
+        if MODEL_WORKER_PROCESSES:
+            # 模型在獨立行程中執行，當機時自動重新啟動而不影響介面
+            self.transcriber = RemoteTranscriber()
+            self.translator = RemoteTranslator()
+        elif self.two_tier:
+            # 草稿字幕立即顯示，大模型修訂後就地更新
+            self.transcriber = TwoTierTranscriber()
+            self.translator = GemmaTranslator()
+        else:
+            self.transcriber = Transcriber()
+            self.translator = GemmaTranslator()  # 使用 Gemma 最佳化版本
+        if source_lang != "auto":
+            self.translator.source_language = source_lang  # 用於估計譯文長度上限
+        # 原文語言與目標語言相同時直接顯示轉錄文字
+        bypass = LanguageBypass() if LANGUAGE_BYPASS_ENABLED else None
+        if TWO_TIER_TRANSLATION and not MODEL_WORKER_PROCESSES:
+            # 草稿譯文立即顯示，Gemma 譯文完成後就地取代
+            self.translation_worker = TwoTierTranslationWorker(self.translator, self.target_langs, bypass=bypass)
+        else:
+            self.translation_worker = TranslationWorker(self.translator, self.target_langs, bypass=bypass)
+        # 片段累積到句尾再翻譯；字幕序號改用累積器分配的段落序號
+        self.sentence_accumulator = SentenceAccumulator() if SENTENCE_ACCUMULATOR_ENABLED else None
+        
+        self.next_sequence = 0
+        self.start_time = None
+        self.first_subtitle_emitted = False
+        self._transcriber_error = None
+        self.transcriber_thread = None
+    
+    def _prepare_transcriber(self):
+        """初始化並預熱語音識別模型（在背景執行緒中與直播連接同時進行）"""
+        try:
+            self.transcriber.initialize()
+            # 已停止（例如連接失敗）時不再預熱，讓 cleanup 盡快釋放模型
+            if WHISPER_WARMUP_ENABLED and self.is_running:
+                self.transcriber.warmup(self.source_lang)
+        except Exception as e:
+            self._transcriber_error = e
+    
+    def _emit_subtitle(self, target_lang, sequence, text):
+        """發送字幕並記錄首個字幕的延遲"""
+        self.subtitle_update.emit(target_lang, sequence, text)
+        
+        if not self.first_subtitle_emitted:
+            self.first_subtitle_emitted = True
+            time_to_first_subtitle = time.time() - self.start_time
+            metrics.set_gauge("pipeline.time_to_first_subtitle", time_to_first_subtitle)
+            logger.info(f"首個字幕延遲: {time_to_first_subtitle:.2f} 秒")
+    
+    def _emit_translations(self):
+        """發送翻譯工作執行緒已完成的譯文（含串流的部分譯文）"""
+        for target_lang, sequence, translated in self.translation_worker.get_results():
+            self._emit_subtitle(target_lang, sequence, translated)
+    
+    def _submit_translation(self, sequence, text, language=None):
+        """排入翻譯工作執行緒，附上轉錄該段文字時偵測到的 (原文語言, 信心)"""
+        language, confidence = language or (None, None)
+        self.translation_worker.submit(sequence, text, language, confidence)
+    
+    def _submit_transcript(self, sequence, text, language=None):
+        """將轉錄片段排入翻譯（啟用句子累積時只送出完整的句子）"""
+        if self.sentence_accumulator is None:
+            self._submit_translation(sequence, text, language)
+            return
+        
+        for segment in self.sentence_accumulator.add(sequence, text, language=language):
+            self._submit_translation(*segment)
+    
+    def _flush_due_sentences(self):
+        """送出等待超過期限的未完成句子"""
+        if self.sentence_accumulator is None:
+            return
+        
+        for segment in self.sentence_accumulator.poll():
+            self._submit_translation(*segment)
+    
+    def _apply_revisions(self):
+        """將大模型修訂後的轉錄結果排入翻譯，譯文以相同序號更新對應的字幕"""
+        for sequence, text, language in self.transcriber.get_revisions():
+            if self.sentence_accumulator is None:
+                self._submit_translation(sequence, text, language)
+                continue
+            
+            revision = self.sentence_accumulator.revise(sequence, text, language)
+            if revision:
+                self._submit_translation(*revision)
     
     def run(self):
         """執行處理"""
         try:
             self.is_running = True
+            self.start_time = time.time()
+            metrics.reset()  # 每個工作階段重新統計
+            
+            # 語音識別模型的載入與預熱在背景進行，不阻塞直播連接
+            self.status_update.emit("正在初始化語音識別...")
+            self.transcriber_thread = threading.Thread(target=self._prepare_transcriber)
+            self.transcriber_thread.daemon = True
+            self.transcriber_thread.start()
+            
             self.status_update.emit("正在連接 YouTube 直播...")
             
             # 連接到 YouTube 直播
@@ -54,11 +159,14 @@ class ProcessingThread(QThread):
                 self.error_occurred.emit("無法連接到 YouTube 直播")
                 return
             
-            self.status_update.emit("正在初始化語音識別...")
-            self.transcriber.initialize()
-            
             self.status_update.emit("正在初始化翻譯引擎...")
             self.translator.initialize()
+            self.translation_worker.start()
+            
+            # 等待語音識別模型就緒
+            self.transcriber_thread.join()
+            if self._transcriber_error:
+                raise self._transcriber_error
             
             self.status_update.emit("開始處理直播內容...")
             
@@ -68,6 +176,14 @@ class ProcessingThread(QThread):
             
             while self.is_running:
                 try:
+                    # 發送已完成的譯文
+                    self._emit_translations()
+                    self._flush_due_sentences()
+                    
+                    # 套用已完成的草稿修訂
+                    if self.two_tier:
+                        self._apply_revisions()
+                    
                     # 獲取音訊
                     audio_chunk = self.youtube_handler.get_audio_chunk()
                     if audio_chunk is None:
@@ -88,7 +204,17 @@ class ProcessingThread(QThread):
                     # 處理累積的音訊
                     try:
                         # 語音轉文字
-                        text = self.transcriber.transcribe(audio_buffer, self.source_lang)
+                        sequence = self.next_sequence
+                        self.next_sequence += 1
+                        if self.two_tier:
+                            text = self.transcriber.transcribe_draft(
+                                audio_buffer, self.source_lang, sequence
+                            )
+                        else:
+                            text = self.transcriber.transcribe(audio_buffer, self.source_lang)
+                        
+                        # 偵測到的語言隨片段傳遞（送出翻譯時最新的轉錄可能已屬於其他片段）
+                        language = self.transcriber.last_language
                         
                         # 清理音訊緩衝區釋放記憶體
                         audio_buffer.clear()
@@ -97,10 +223,8 @@ class ProcessingThread(QThread):
                         if not text or not text.strip():
                             continue
                         
-                        # 翻譯
-                        translated = self.translator.translate(text, self.target_lang)
-                        if translated and translated.strip():
-                            self.subtitle_update.emit(translated)
+                        # 排入翻譯工作執行緒（與下一段音訊的處理並行）
+                        self._submit_transcript(sequence, text, language)
                             
                     except Exception as e:
                         logger.error(f"處理音訊時出錯: {e}")
@@ -128,7 +252,20 @@ class ProcessingThread(QThread):
     
     def cleanup(self):
         """清理資源"""
+        self.is_running = False
         self.youtube_handler.disconnect()
+        
+        # 等待背景的模型載入結束，避免載入完成後才設定的模型在清理後殘留
+        if self.transcriber_thread is not None:
+            self.transcriber_thread.join()
+            self.transcriber_thread = None
+        
+        # 釋放模型並將翻譯記憶寫入磁碟
+        self.transcriber.cleanup()
+        self.translation_worker.stop()
+        self.translator.cleanup()
+        
+        metrics.log_summary()
         self.status_update.emit("已停止")
 
 
@@ -138,7 +275,7 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.processing_thread = None
-        self.subtitle_window = None
+        self.subtitle_windows = {}  # 目標語言 -> 字幕視窗
         self.subtitle_settings = DEFAULT_SUBTITLE_SETTINGS.copy()
         
         self.init_ui()
@@ -197,6 +334,21 @@ class MainWindow(QMainWindow):
         self.target_lang_combo.setCurrentText("中文")
         lang_layout.addWidget(self.target_lang_combo)
         
+        # 其他目標語言（共用同一份語音識別結果，各自顯示在獨立的字幕視窗）
+        self.extra_lang_btn = QPushButton("其他目標語言")
+        self.extra_lang_menu = QMenu(self)
+        self.extra_lang_actions = {}
+        for code, name in SUPPORTED_LANGUAGES.items():
+            if code == "auto":
+                continue
+            action = QAction(name, self)
+            action.setCheckable(True)
+            action.setChecked(code in ADDITIONAL_TARGET_LANGUAGES)
+            self.extra_lang_menu.addAction(action)
+            self.extra_lang_actions[code] = action
+        self.extra_lang_btn.setMenu(self.extra_lang_menu)
+        lang_layout.addWidget(self.extra_lang_btn)
+        
         main_layout.addWidget(lang_group)
         
         # 字幕設定區
@@ -329,8 +481,7 @@ class MainWindow(QMainWindow):
         """更新字體大小"""
         self.font_size_label.setText(str(value))
         self.subtitle_settings["font_size"] = value
-        if self.subtitle_window:
-            self.subtitle_window.update_settings(self.subtitle_settings)
+        self.apply_subtitle_settings()
     
     def choose_font_color(self):
         """選擇字體顏色"""
@@ -338,8 +489,7 @@ class MainWindow(QMainWindow):
         if color.isValid():
             self.subtitle_settings["font_color"] = color.name()
             self.font_color_btn.setStyleSheet(f"background-color: {color.name()}")
-            if self.subtitle_window:
-                self.subtitle_window.update_settings(self.subtitle_settings)
+            self.apply_subtitle_settings()
     
     def choose_bg_color(self):
         """選擇背景顏色"""
@@ -347,22 +497,30 @@ class MainWindow(QMainWindow):
         if color.isValid():
             self.subtitle_settings["background_color"] = color.name()
             self.bg_color_btn.setStyleSheet(f"background-color: {color.name()}")
-            if self.subtitle_window:
-                self.subtitle_window.update_settings(self.subtitle_settings)
+            self.apply_subtitle_settings()
     
     def toggle_shadow(self, state):
         """切換陰影"""
         self.subtitle_settings["shadow_enabled"] = state == Qt.Checked
-        if self.subtitle_window:
-            self.subtitle_window.update_settings(self.subtitle_settings)
+        self.apply_subtitle_settings()
+    
+    def subtitle_settings_for(self, index):
+        """第 index 個目標語言的字幕設定（其他語言的視窗依序往上排列）"""
+        settings = self.subtitle_settings.copy()
+        settings["position_y"] = max(0.0, settings["position_y"] - index * SUBTITLE_STACK_OFFSET)
+        return settings
+    
+    def apply_subtitle_settings(self):
+        """將字幕設定套用到所有字幕視窗"""
+        for index, subtitle_window in enumerate(self.subtitle_windows.values()):
+            subtitle_window.update_settings(self.subtitle_settings_for(index))
     
     def show_settings_dialog(self):
         """顯示進階設定對話框"""
         dialog = SettingsDialog(self.subtitle_settings, self)
         if dialog.exec_():
             self.subtitle_settings = dialog.get_settings()
-            if self.subtitle_window:
-                self.subtitle_window.update_settings(self.subtitle_settings)
+            self.apply_subtitle_settings()
     
     def start_translation(self):
         """開始翻譯"""
@@ -377,14 +535,20 @@ class MainWindow(QMainWindow):
         
         target_lang_text = self.target_lang_combo.currentText()
         target_lang = next(code for code, name in SUPPORTED_LANGUAGES.items() if name == target_lang_text)
-        
-        # 創建字幕視窗
-        if not self.subtitle_window:
-            self.subtitle_window = SubtitleWindow(self.subtitle_settings)
-            self.subtitle_window.show()
+        target_langs = [target_lang] + [
+            code for code, action in self.extra_lang_actions.items()
+            if action.isChecked() and code != target_lang
+        ]
+        
+        # 每個目標語言一個字幕視窗
+        for index, code in enumerate(target_langs):
+            if code not in self.subtitle_windows:
+                subtitle_window = SubtitleWindow(self.subtitle_settings_for(index))
+                subtitle_window.show()
+                self.subtitle_windows[code] = subtitle_window
         
         # 創建並啟動處理執行緒
-        self.processing_thread = ProcessingThread(url, source_lang, target_lang)
+        self.processing_thread = ProcessingThread(url, source_lang, target_langs)
         self.processing_thread.status_update.connect(self.update_status)
         self.processing_thread.subtitle_update.connect(self.update_subtitle)
         self.processing_thread.error_occurred.connect(self.handle_error)
@@ -395,6 +559,7 @@ class MainWindow(QMainWindow):
         self.pause_btn.setEnabled(True)
         self.stop_btn.setEnabled(True)
         self.url_input.setEnabled(False)
+        self.extra_lang_btn.setEnabled(False)
         self.progress_bar.setVisible(True)
         self.progress_bar.setRange(0, 0)  # 無限進度
         
@@ -412,15 +577,16 @@ class MainWindow(QMainWindow):
             self.processing_thread.wait()
             self.processing_thread = None
         
-        if self.subtitle_window:
-            self.subtitle_window.close()
-            self.subtitle_window = None
+        for subtitle_window in self.subtitle_windows.values():
+            subtitle_window.close()
+        self.subtitle_windows.clear()
         
         # 更新 UI 狀態
         self.start_btn.setEnabled(True)
         self.pause_btn.setEnabled(False)
         self.stop_btn.setEnabled(False)
         self.url_input.setEnabled(True)
+        self.extra_lang_btn.setEnabled(True)
         self.progress_bar.setVisible(False)
         
         self.log_message("已停止翻譯")
@@ -430,10 +596,11 @@ class MainWindow(QMainWindow):
         self.status_bar.showMessage(message)
         self.log_message(message)
     
-    def update_subtitle(self, text):
-        """更新字幕"""
-        if self.subtitle_window:
-            self.subtitle_window.update_text(text)
+    def update_subtitle(self, target_lang, sequence, text):
+        """更新目標語言的字幕"""
+        subtitle_window = self.subtitle_windows.get(target_lang)
+        if subtitle_window:
+            subtitle_window.update_text(text, sequence)
     
     def handle_error(self, error_msg):
         """處理錯誤"""
@@ -2,6 +2,7 @@
 字幕顯示視窗 - 透明疊層視窗
 """
 import logging
+from collections import OrderedDict
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout
 from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QRect, pyqtSignal
 from PyQt5.QtGui import QPalette, QColor, QFont, QPainter, QPainterPath
@@ -57,8 +58,10 @@ class SubtitleWindow(QWidget):
         self.settings = settings.copy()
         self.is_dragging = False
         self.drag_position = None
+        self.captions = OrderedDict()  # 目前顯示的字幕 {序號: 文字}
         self.fade_timer = QTimer()
         self.fade_timer.timeout.connect(self.start_fade_out)
+        self.fade_animation = None
         
         self.init_ui()
         self.apply_settings()
@@ -162,9 +165,31 @@ class SubtitleWindow(QWidget):
         
         self.move(x, y)
     
-    def update_text(self, text):
-        """更新字幕文字"""
-        self.subtitle_label.setText(text)
+    def update_text(self, text, sequence=None):
+        """
+        更新字幕文字
+        
+        Args:
+            text: 字幕文字
+            sequence: 片段序號，相同序號的字幕會就地取代（例如草稿被修訂、串流翻譯的部分結果）
+        """
+        if sequence is None:
+            sequence = next(reversed(self.captions)) + 1 if self.captions else 0
+        
+        # 串流更新時內容可能沒有變化，不需要重新排版
+        if self.captions.get(sequence) == text and self.isVisible():
+            return
+        
+        max_lines = max(1, self.settings.get("max_lines", 1))
+        
+        # 已捲出畫面的舊片段不再顯示
+        if (sequence not in self.captions and len(self.captions) >= max_lines
+                and sequence < next(iter(self.captions))):
+            return
+        
+        self.captions[sequence] = text
+        self.captions = OrderedDict(sorted(self.captions.items())[-max_lines:])
+        self.subtitle_label.setText("\n".join(self.captions.values()))
         
         # 調整視窗大小以適應文字
         self.adjustSize()
@@ -180,8 +205,10 @@ class SubtitleWindow(QWidget):
         self.show()
         self.raise_()
         
-        # 重置淡出計時器
+        # 重置淡出計時器（並中止進行中的淡出動畫）
         self.fade_timer.stop()
+        if self.fade_animation is not None:
+            self.fade_animation.stop()
         self.setWindowOpacity(1.0)
         
         # 設定淡出延遲（例如 5 秒後開始淡出）
@@ -196,9 +223,14 @@ class SubtitleWindow(QWidget):
         self.fade_animation.setDuration(1000)  # 1 秒淡出
         self.fade_animation.setStartValue(1.0)
         self.fade_animation.setEndValue(0.0)
-        self.fade_animation.finished.connect(self.hide)
+        self.fade_animation.finished.connect(self.on_fade_finished)
         self.fade_animation.start()
     
+    def on_fade_finished(self):
+        """淡出完成後隱藏視窗並清除已顯示的字幕"""
+        self.hide()
+        self.captions.clear()
+    
     def update_settings(self, settings):
         """更新設定"""
         self.settings = settings.copy()
@@ -0,0 +1,127 @@
+"""
+效能指標收集模組
+"""
+import logging
+import threading
+import time
+from collections import defaultdict, deque, Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsRegistry:
+    """執行緒安全的效能指標收集器（計數器、量測值與觀測樣本）"""
+
+    def __init__(self, max_samples: int = 1000):
+        self.max_samples = max_samples
+        self.counters = defaultdict(int)
+        self.gauges = {}
+        self.samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self.start_time = time.time()
+        self.lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1):
+        """累加計數器"""
+        with self.lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        """設定量測值（保留最新值）"""
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, value: float):
+        """記錄一筆觀測樣本（延遲、批次大小等）"""
+        with self.lock:
+            self.samples[name].append(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """計時區塊並記錄為觀測樣本（秒）"""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start_time)
+
+    def get_counter(self, name: str) -> int:
+        """獲取計數器值"""
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def get_gauge(self, name: str) -> Optional[float]:
+        """獲取量測值"""
+        with self.lock:
+            return self.gauges.get(name)
+
+    def rate_per_minute(self, name: str) -> float:
+        """計算計數器自開始收集以來的每分鐘平均次數"""
+        elapsed_minutes = max(time.time() - self.start_time, 1.0) / 60
+        return self.get_counter(name) / elapsed_minutes
+
+    def summary(self, name: str) -> Dict[str, float]:
+        """獲取觀測樣本的統計摘要"""
+        with self.lock:
+            values = sorted(self.samples.get(name, ()))
+
+        if not values:
+            return {"count": 0}
+
+        count = len(values)
+        return {
+            "count": count,
+            "mean": sum(values) / count,
+            "p50": values[int(count * 0.5)],
+            "p95": values[min(count - 1, int(count * 0.95))],
+            "max": values[-1],
+        }
+
+    def histogram(self, name: str) -> Dict[float, int]:
+        """獲取觀測樣本的分布（值 -> 次數）"""
+        with self.lock:
+            return dict(sorted(Counter(self.samples.get(name, ())).items()))
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """獲取所有指標的快照"""
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            sample_names = list(self.samples.keys())
+
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "summaries": {name: self.summary(name) for name in sample_names},
+        }
+
+    def reset(self):
+        """清除所有指標"""
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.samples.clear()
+            self.start_time = time.time()
+
+    def log_summary(self):
+        """將目前的指標輸出到日誌"""
+        snapshot = self.snapshot()
+
+        for name, value in sorted(snapshot["counters"].items()):
+            logger.info(f"[指標] {name} = {value}")
+
+        for name, value in sorted(snapshot["gauges"].items()):
+            logger.info(f"[指標] {name} = {value:.3f}")
+
+        for name, summary in sorted(snapshot["summaries"].items()):
+            if summary["count"]:
+                logger.info(
+                    f"[指標] {name}: count={summary['count']} "
+                    f"mean={summary['mean']:.3f} p50={summary['p50']:.3f} "
+                    f"p95={summary['p95']:.3f} max={summary['max']:.3f}"
+                )
+
+
+# 全域指標收集器
+metrics = MetricsRegistry()
@@ -0,0 +1,86 @@
+"""
+文字處理工具
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TRAILING_PUNCTUATION = ".,!?;:…。，、！？；：~～\"'」』)）"
+
+# 英文等語言的句尾標點後需有空白才切分（避免切開 3.5、e.g. 等），中日文句尾標點直接切分
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"(?<=[.!?…])\s+|(?<=[。！？])\s*")
+# 句尾標點（可接引號或括號）與子句標點，用於在累積的轉錄文字中尋找切分點
+SENTENCE_END_PATTERN = re.compile(r"[.!?…]+[\"'」』)）]*(?=\s|$)|[。！？]+[\"'」』)）]*")
+CLAUSE_END_PATTERN = re.compile(r"[,;:](?=\s|$)|[，、；：]")
+# 編號列表的一行（"1. 文字"、"1) 文字"、"1、文字"）
+NUMBERED_LINE_PATTERN = re.compile(r"^\s*(\d+)\s*[.)、:：]\s*(.*?)\s*$")
+
+# 不以空白分隔詞語的語言
+NO_SPACE_LANGUAGES = {"zh", "ja", "th"}
+
+
+def normalize_text(text: str) -> str:
+    """
+    正規化文字作為快取鍵
+
+    統一全形/半形（NFKC）、大小寫、空白，並去除句尾標點，
+    讓只有格式差異的轉錄結果能命中同一筆翻譯。
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    return text.rstrip(TRAILING_PUNCTUATION + " ")
+
+
+def split_sentences(text: str) -> List[str]:
+    """將文字切分為句子（保留句尾標點）"""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY_PATTERN.split(text) if sentence.strip()]
+
+
+def join_sentences(sentences: List[str], language: str) -> str:
+    """依目標語言的書寫習慣合併句子"""
+    separator = "" if language in NO_SPACE_LANGUAGES else " "
+    return separator.join(sentence.strip() for sentence in sentences)
+
+
+def find_last_sentence_end(text: str) -> int:
+    """返回最後一個句尾標點之後的位置，沒有完整句子時返回 0"""
+    ends = [match.end() for match in SENTENCE_END_PATTERN.finditer(text)]
+    return ends[-1] if ends else 0
+
+
+def find_last_clause_end(text: str) -> int:
+    """返回最後一個子句標點（逗號、分號等）之後的位置，沒有時返回 0"""
+    ends = [match.end() for match in CLAUSE_END_PATTERN.finditer(text)]
+    return ends[-1] if ends else 0
+
+
+def format_numbered_list(texts: List[str]) -> str:
+    """將多段文字組成編號列表（每段一行，段內換行改為空白）"""
+    return "\n".join(
+        f"{number}. {WHITESPACE_PATTERN.sub(' ', text).strip()}" for number, text in enumerate(texts, 1)
+    )
+
+
+def parse_numbered_list(text: str, count: int) -> Optional[List[str]]:
+    """
+    解析編號列表
+
+    必須剛好包含 1 到 count 各一行且內容不為空；出現編號以外的文字、重複或缺少編號時返回 None。
+    """
+    items = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        match = NUMBERED_LINE_PATTERN.match(line)
+        if not match:
+            return None
+
+        number = int(match.group(1))
+        if number in items or not 1 <= number <= count or not match.group(2):
+            return None
+        items[number] = match.group(2)
+
+    if len(items) != count:
+        return None
+    return [items[number] for number in range(1, count + 1)]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+輔助解碼測試腳本
+測試輔助解碼參數與接受率計算，並以固定的字幕語料比較一般解碼與輔助解碼的吞吐量
+"""
+
+import time
+import logging
+from types import SimpleNamespace
+from src.core.translator import Translator, GemmaTranslator
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 固定的字幕語料（含重複的專有名詞與數字，反映直播字幕的特性）
+SUBTITLE_CORPUS = [
+    "Welcome back to the stream, everyone.",
+    "Today we are playing Elden Ring for the first time.",
+    "The boss has about 3000 HP left, so be careful.",
+    "Elden Ring has a really big open world.",
+    "Thank you for the 5 gifted subs, Alex!",
+    "Let's try the boss one more time.",
+    "I think I need to level up my character first.",
+    "Thank you for the 10 gifted subs, Maria!",
+]
+
+def make_translator(mode):
+    """建立不載入模型的翻譯器"""
+    translator = Translator()
+    translator.tokenizer = SimpleNamespace(pad_token_id=0)
+    translator.assisted_decoding = mode
+    return translator
+
+def test_assisted_kwargs_only_for_single_sequence():
+    """測試輔助解碼只用於單一序列"""
+    translator = make_translator("prompt_lookup")
+    
+    assert "prompt_lookup_num_tokens" in translator._generation_kwargs(32)
+    assert "prompt_lookup_num_tokens" not in translator._generation_kwargs(32, batch_size=4)
+    assert "prompt_lookup_num_tokens" not in make_translator(None)._generation_kwargs(32)
+    
+    # 未載入草稿模型時不使用輔助解碼
+    assert "assistant_model" not in make_translator("draft_model")._generation_kwargs(32)
+    logger.info("✅ 輔助解碼參數")
+
+def test_acceptance_rate():
+    """測試以前向次數計算草稿接受率"""
+    metrics.reset()
+    translator = make_translator("prompt_lookup")
+    
+    generation_kwargs = translator._generation_kwargs(32)
+    with translator._track_decoding(generation_kwargs) as stats:
+        translator.target_forwards += 4  # 4 次前向產生 10 個詞元
+        stats["tokens"] = 10
+    
+    assert metrics.summary("translation.draft_acceptance_rate")["mean"] == 0.6
+    assert metrics.summary("translation.tokens_per_forward")["mean"] == 2.5
+    logger.info("✅ 草稿接受率")
+
+def benchmark_assisted_decoding(modes=(None, "prompt_lookup", "draft_model")):
+    """以固定語料比較各解碼模式的吞吐量與接受率（CPU）"""
+    for mode in modes:
+        translator = GemmaTranslator()
+        translator.assisted_decoding = mode
+        translator.initialize()
+        metrics.reset()
+        
+        try:
+            start_time = time.perf_counter()
+            for text in SUBTITLE_CORPUS:
+                translator._generate(text, "zh")
+            elapsed = time.perf_counter() - start_time
+            
+            tokens = metrics.get_counter("translation.generated_tokens")
+            acceptance = metrics.summary("translation.draft_acceptance_rate")
+            tokens_per_forward = metrics.summary("translation.tokens_per_forward")
+            logger.info(
+                f"{mode or 'plain':>13}: {tokens / elapsed:6.1f} tokens/s，"
+                f"每次前向 {tokens_per_forward.get('mean', 0):.2f} 詞元，"
+                f"接受率 {acceptance.get('mean', 0):.1%}"
+            )
+        finally:
+            translator.cleanup()
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始輔助解碼測試")
+    logger.info("=" * 50)
+    
+    test_assisted_kwargs_only_for_single_sequence()
+    test_acceptance_rate()
+    
+    logger.info("\n" + "=" * 50)
+    logger.info("輔助解碼基準測試（CPU）")
+    logger.info("=" * 50)
+    benchmark_assisted_decoding()
+
+if __name__ == "__main__":
+    main()
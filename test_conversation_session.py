@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Gemma 對話工作階段測試腳本
+以記憶體中的小型隨機模型測試 KV 快取沿用、每輪只預填新的詞元、與不使用快取的結果相同，
+超過詞元預算時重建工作階段，以及滑動視窗或共享 KV 的模型（Gemma 3n）不使用工作階段
+"""
+
+import logging
+import torch
+from tokenizers import Tokenizer, models, pre_tokenizers
+from transformers import (
+    Gemma3nForCausalLM, Gemma3nTextConfig, LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+)
+from transformers.cache_utils import DynamicCache
+from src.core import translator as translator_module
+from src.core.translator import GemmaConversationSession, GemmaTranslator, supports_session_cache
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "you are a translator"
+TURNS = ["translate to chinese : hello world", "translate to chinese : good night", "translate to chinese : see you"]
+MAX_NEW_TOKENS = 6
+
+def build_tokenizer():
+    """建立記憶體中的詞級分詞器，不需要下載模型"""
+    words = "user model you are a translator translate to chinese : hello world good night see"
+    vocab = {"<pad>": 0, "<eos>": 1, "<bos>": 2, "[UNK]": 3, "<start_of_turn>": 4, "<end_of_turn>": 5}
+    for word in words.split():
+        vocab.setdefault(word, len(vocab))
+    
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="<eos>", bos_token="<bos>",
+        additional_special_tokens=["<start_of_turn>", "<end_of_turn>"]
+    )
+
+def build_session(token_budget=1024):
+    """建立使用小型隨機 Llama 模型的工作階段，並記錄每次前向輸入的詞元數"""
+    tokenizer = build_tokenizer()
+    torch.manual_seed(0)
+    model = LlamaForCausalLM(LlamaConfig(
+        vocab_size=len(tokenizer), hidden_size=32, intermediate_size=64,
+        num_hidden_layers=2, num_attention_heads=2
+    )).eval()
+    
+    forward_lengths = []
+    model.register_forward_pre_hook(
+        lambda module, args, kwargs: forward_lengths.append(kwargs["input_ids"].shape[1]), with_kwargs=True
+    )
+    session = GemmaConversationSession(
+        model, tokenizer, SYSTEM_PROMPT, [tokenizer.eos_token_id], token_budget=token_budget
+    )
+    return session, forward_lengths
+
+def generation_kwargs(session):
+    return {"max_new_tokens": MAX_NEW_TOKENS, "do_sample": False, "pad_token_id": session.tokenizer.pad_token_id}
+
+def cold_generate(session, input_ids):
+    """不使用 KV 快取，以完整的詞元序列生成"""
+    input_tensor = torch.tensor([input_ids])
+    with torch.no_grad():
+        output_ids = session.model.generate(
+            input_ids=input_tensor, attention_mask=torch.ones_like(input_tensor), **generation_kwargs(session)
+        )
+    return output_ids[0, len(input_ids):].tolist()
+
+def next_input_ids(session, text):
+    """下一輪呼叫 generate 時的完整輸入詞元"""
+    return session.prefix_ids + session._encode(session._render_turn(text, first=not session.turns))
+
+def test_session_reuses_kv_cache():
+    """測試後續輪次只預填新的詞元，且生成結果與不使用快取相同"""
+    session, forward_lengths = build_session()
+    
+    for index, text in enumerate(TURNS):
+        input_ids = next_input_ids(session, text)
+        cached_length = session.cached_length
+        expected = cold_generate(session, input_ids)
+        
+        forward_lengths.clear()
+        answer, generated_ids = session.generate(text, **generation_kwargs(session))
+        
+        assert generated_ids == expected
+        # 第一次前向為預填：第一輪預填完整提示詞，之後只預填上一輪未寫入快取的詞元與新的使用者輪次
+        assert forward_lengths[0] == len(input_ids) - cached_length
+        if index == 0:
+            assert cached_length == 0
+        else:
+            new_tokens = len(session._encode(session._render_turn(text, first=False)))
+            assert cached_length > 0
+            assert forward_lengths[0] <= new_tokens + len(session.turn_end_ids) + 1
+        assert all(length == 1 for length in forward_lengths[1:])
+        assert session.turns[-1] == (text, answer)
+    
+    logger.info("✅ 工作階段沿用 KV 快取")
+
+def test_session_rebases_at_token_budget():
+    """測試超過詞元預算時捨棄最舊的輪次並重新預填，結果仍與不使用快取相同"""
+    session, forward_lengths = build_session()
+    for text in TURNS[:2]:
+        session.generate(text, **generation_kwargs(session))
+    
+    # 預算設為目前長度，下一輪之後必定超過
+    session.token_budget = len(session.prefix_ids)
+    rebases = metrics.get_counter("translation.session_rebases")
+    session.generate(TURNS[2], **generation_kwargs(session))
+    
+    assert metrics.get_counter("translation.session_rebases") == rebases + 1
+    assert len(session.turns) < 3
+    assert session.cache is None and session.cached_length == 0
+    assert len(session.prefix_ids) <= session.token_budget // 2 or not session.turns
+    
+    # 重建後的下一輪預填保留輪次的完整提示詞
+    text = TURNS[0]
+    input_ids = next_input_ids(session, text)
+    expected = cold_generate(session, input_ids)
+    forward_lengths.clear()
+    _, generated_ids = session.generate(text, **generation_kwargs(session))
+    assert forward_lengths[0] == len(input_ids)
+    assert generated_ids == expected
+    
+    logger.info("✅ 超過詞元預算時重建工作階段")
+
+def build_gemma3n_model(vocab_size):
+    """建立與 Gemma 3n 相同層結構（滑動視窗與共享 KV 層）的小型隨機模型"""
+    torch.manual_seed(0)
+    return Gemma3nForCausalLM(Gemma3nTextConfig(
+        vocab_size=vocab_size, vocab_size_per_layer_input=vocab_size, hidden_size=32,
+        intermediate_size=64, num_hidden_layers=4, num_attention_heads=2, num_key_value_heads=1,
+        head_dim=16, sliding_window=4, num_kv_shared_layers=2, laurel_rank=4, altup_num_inputs=2,
+        hidden_size_per_layer_input=8, activation_sparsity_pattern=[0.0] * 4,
+        layer_types=["sliding_attention", "full_attention"] * 2
+    )).eval()
+
+class StatelessRecordingTranslator(GemmaTranslator):
+    """記錄一般提示詞路徑的生成，不實際執行"""
+    
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+    
+    def _generate_batch(self, texts, target_language, streamer=None):
+        self.batches.append(list(texts))
+        return [f"[{target_language}] {text}" for text in texts]
+
+def test_session_requires_full_attention_cache():
+    """測試只有完整注意力的 DynamicCache 才使用工作階段，Gemma 3n 改用一般提示詞"""
+    session, _ = build_session()
+    session.generate(TURNS[0], **generation_kwargs(session))
+    assert isinstance(session.cache, DynamicCache)
+    assert supports_session_cache(session.model.config)
+    
+    model = build_gemma3n_model(len(session.tokenizer))
+    assert not supports_session_cache(model.config)
+    
+    translator = StatelessRecordingTranslator()
+    translator.model = model
+    translator.tokenizer = session.tokenizer
+    original_mode = translator_module.GEMMA_SESSION_MODE
+    translator_module.GEMMA_SESSION_MODE = True
+    try:
+        assert translator._generate("hello world", "zh") == "[zh] hello world"
+    finally:
+        translator_module.GEMMA_SESSION_MODE = original_mode
+    
+    assert translator.batches == [["hello world"]]
+    assert translator.sessions == {}
+    assert translator.session_supported is False
+    logger.info("✅ 滑動視窗與共享 KV 的模型不使用工作階段")
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始 Gemma 對話工作階段測試")
+    logger.info("=" * 50)
+    
+    test_session_reuses_kv_cache()
+    test_session_rebases_at_token_budget()
+    test_session_requires_full_attention_cache()
+
+if __name__ == "__main__":
+    main()
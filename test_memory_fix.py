@@ -5,9 +5,13 @@
 
 import time
 import psutil
+import tempfile
 import threading
 import logging
-from src.core.translator import GemmaTranslator
+import multiprocessing
+import torch
+from transformers import LlamaConfig, LlamaForCausalLM
+from src.core.translator import GemmaTranslator, load_model_low_memory
 from src.core.transcriber import Transcriber
 
 # 設定日誌
@@ -98,6 +102,65 @@ def test_gemma_memory_usage():
         memory_increase = monitor.stop_monitoring()
         return memory_increase
 
+def anonymous_rss():
+    """行程的匿名記憶體（RSS 扣除可回收的檔案映射頁面，例如記憶體映射的 safetensors）"""
+    memory_info = psutil.Process().memory_info()
+    return memory_info.rss - getattr(memory_info, "shared", 0)
+
+def _measure_load_peak(model_path, dtype_name, results):
+    """在獨立的行程中載入模型，每 2 毫秒取樣一次記憶體"""
+    baseline = anonymous_rss()
+    peak = [baseline]
+    loading = [True]
+    
+    def sample():
+        while loading[0]:
+            peak[0] = max(peak[0], anonymous_rss())
+            time.sleep(0.002)
+    
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    model = load_model_low_memory(model_path, "cpu", getattr(torch, dtype_name))
+    loading[0] = False
+    sampler.join()
+    
+    results[dtype_name] = {
+        "peak_mb": (peak[0] - baseline) / 1024**2,
+        "steady_mb": (anonymous_rss() - baseline) / 1024**2,
+        "parameters": sum(parameter.numel() for parameter in model.parameters()),
+    }
+
+def test_translator_peak_rss_during_load():
+    """測試低記憶體載入的峰值接近載入完成後的穩定用量（不會先建立完整的 float32 副本）"""
+    logger.info("=== 測試翻譯模型載入的記憶體峰值 ===")
+    
+    with tempfile.TemporaryDirectory() as model_dir:
+        # 約 220 MB 的 float32 safetensors 模型
+        LlamaForCausalLM(LlamaConfig(
+            vocab_size=32000, hidden_size=512, intermediate_size=1376,
+            num_hidden_layers=8, num_attention_heads=8
+        )).save_pretrained(model_dir, safe_serialization=True)
+        
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            results = manager.dict()
+            for dtype_name in ("float32", "bfloat16"):
+                process = context.Process(target=_measure_load_peak, args=(model_dir, dtype_name, results))
+                process.start()
+                process.join()
+                assert process.exitcode == 0
+            results = dict(results)
+    
+    for dtype_name, result in results.items():
+        logger.info(
+            f"{dtype_name}: 峰值 +{result['peak_mb']:.0f} MB，穩定 +{result['steady_mb']:.0f} MB"
+        )
+        assert result["peak_mb"] <= result["steady_mb"] * 1.25 + 32
+    
+    # bf16 直接以目標精度載入，用量約為參數量 × 2 位元組
+    assert results["bfloat16"]["steady_mb"] <= results["bfloat16"]["parameters"] * 2 / 1024**2 * 1.25 + 32
+    logger.info("✅ 載入峰值接近穩定用量")
+
 def test_whisper_memory_usage():
     """測試 Whisper 轉錄器記憶體使用"""
     logger.info("=== 測試 Whisper 轉錄器記憶體使用 ===")
@@ -158,6 +221,12 @@ def main():
     # 等待一段時間讓記憶體釋放
     time.sleep(5)
     
+    # 測試低記憶體載入
+    try:
+        test_translator_peak_rss_during_load()
+    except Exception as e:
+        logger.error(f"❌ 載入峰值測試失敗: {e}")
+    
     # 測試 Whisper 轉錄器
     try:
         whisper_memory = test_whisper_memory_usage()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+模型工作行程測試腳本
+測試共享記憶體環形緩衝區、工作行程的請求往返、當機後自動重新啟動與跨行程取消，
+並測量每個片段的 IPC 額外負擔
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+from src.core.model_workers import SharedAudioRing, ModelWorkerProcess, RemoteTranscriber, RemoteTranslator
+from src.core.translator import CancellationToken, TranslationCancelled
+from src.config import AUDIO_SAMPLE_RATE
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class EchoTranscriber:
+    """以音訊長度與總和作為轉錄結果，不載入模型；語言為 "crash" 時直接結束行程"""
+
+    last_language = ("en", 1.0)
+
+    def initialize(self):
+        pass
+
+    def warmup(self, language="auto"):
+        return True
+
+    def transcribe(self, audio_data, language="auto"):
+        if language == "crash":
+            os._exit(1)
+        return f"{len(audio_data)}:{float(np.sum(audio_data)):.1f}"
+
+    def cleanup(self):
+        pass
+
+class WaitingTranslator:
+    """等待取消標記生效後中止，不載入模型"""
+
+    def __init__(self):
+        self.cancel_token = None
+        self.source_language = None
+
+    def initialize(self):
+        pass
+
+    @contextmanager
+    def cancellable(self, token):
+        self.cancel_token = token
+        try:
+            yield token
+        finally:
+            self.cancel_token = None
+
+    def translate_multi(self, texts, target_languages):
+        if texts == ["wait"]:
+            while not self.cancel_token.cancelled:
+                time.sleep(0.01)
+            raise TranslationCancelled(self.cancel_token.reason)
+        return {language: [f"[{language}] {text}" for text in texts] for language in target_languages}
+
+    def translate_stream(self, text, target_language):
+        for end in range(1, len(text) + 1):
+            yield text[:end]
+
+    def cleanup(self):
+        pass
+
+def test_audio_ring_wraparound():
+    """測試環形緩衝區跨越結尾的寫入、附加讀取與覆寫偵測"""
+    ring = SharedAudioRing(10)
+    attached = SharedAudioRing(10, name=ring.name)
+    try:
+        first = ring.write(np.arange(7, dtype=np.float32))
+        second = ring.write(np.arange(100, 106, dtype=np.float32))
+
+        assert second == (7, 6)
+        assert attached.read(*second).tolist() == list(range(100, 106))
+        # 第一段的開頭已被第二段覆寫
+        assert attached.read(*first) is None
+    finally:
+        attached.close()
+        ring.close()
+    logger.info("✅ 環形緩衝區")
+
+def test_remote_transcriber_round_trip():
+    """測試音訊經共享記憶體傳入工作行程並記錄 IPC 額外負擔"""
+    metrics.reset()
+    transcriber = RemoteTranscriber(EchoTranscriber, ring_seconds=1)
+    transcriber.initialize()
+    try:
+        assert transcriber.warmup("en")
+        for _ in range(3):
+            assert transcriber.transcribe(np.ones(AUDIO_SAMPLE_RATE // 2), "en") == "8000:8000.0"
+        assert transcriber.last_language == ("en", 1.0)
+    finally:
+        transcriber.cleanup()
+
+    assert metrics.get_counter("ipc.asr.requests") == 4
+    assert metrics.summary("ipc.asr.overhead")["count"] == 4
+    logger.info("✅ 語音識別工作行程往返")
+
+def test_worker_restarts_after_crash():
+    """測試工作行程當機時請求失敗並自動重新啟動"""
+    metrics.reset()
+    transcriber = RemoteTranscriber(EchoTranscriber, ring_seconds=1)
+    transcriber.initialize()
+    try:
+        first_pid = transcriber.process.pid
+        assert transcriber.transcribe(np.ones(10), "crash") is None
+        assert transcriber.process.pid != first_pid
+        assert transcriber.transcribe(np.ones(10), "en") == "10:10.0"
+    finally:
+        transcriber.cleanup()
+
+    assert metrics.get_counter("workers.restarts.asr") == 1
+    logger.info("✅ 當機後自動重新啟動")
+
+def test_worker_requires_process_args():
+    """測試未實作 _process_args 的工作行程代理在建立時即失敗"""
+    class IncompleteWorker(ModelWorkerProcess):
+        name = "incomplete"
+
+    try:
+        IncompleteWorker()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("未實作 _process_args 的工作行程代理不應可建立")
+    logger.info("✅ 工作行程代理介面檢查")
+
+def test_remote_translator_cancel_and_stream():
+    """測試主行程的取消標記中止工作行程中的翻譯，以及串流部分譯文"""
+    translator = RemoteTranslator(WaitingTranslator)
+    translator.initialize()
+    try:
+        assert translator.translate_multi(["a", "b"], ["zh", "ja"]) == {
+            "zh": ["[zh] a", "[zh] b"], "ja": ["[ja] a", "[ja] b"]
+        }
+        assert list(translator.translate_stream("abc", "zh")) == ["a", "ab", "abc"]
+
+        token = CancellationToken()
+        threading.Timer(0.2, token.cancel).start()
+        try:
+            with translator.cancellable(token):
+                translator.translate_multi(["wait"], ["zh"])
+            assert False, "應該中止"
+        except TranslationCancelled as e:
+            assert str(e) == "superseded"
+
+        # 取消旗標在下一個請求重設
+        assert translator.translate("c", "zh") == "[zh] c"
+    finally:
+        translator.cleanup()
+    logger.info("✅ 跨行程取消與串流")
+
+def benchmark_ipc_overhead(segments=200, seconds=3.0):
+    """測量每個 3 秒音訊片段經工作行程轉錄的 IPC 額外負擔"""
+    metrics.reset()
+    transcriber = RemoteTranscriber(EchoTranscriber)
+    transcriber.initialize()
+    audio = np.random.uniform(-1, 1, int(AUDIO_SAMPLE_RATE * seconds)).astype(np.float32)
+    try:
+        for _ in range(segments):
+            transcriber.transcribe(audio, "en")
+    finally:
+        transcriber.cleanup()
+
+    summary = metrics.summary("ipc.asr.overhead")
+    logger.info(
+        f"每個片段的 IPC 額外負擔: 平均 {summary['mean'] * 1000:.3f} ms，"
+        f"p95 {summary['p95'] * 1000:.3f} ms"
+    )
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始模型工作行程測試")
+    logger.info("=" * 50)
+
+    test_audio_ring_wraparound()
+    test_remote_transcriber_round_trip()
+    test_worker_restarts_after_crash()
+    test_worker_requires_process_args()
+    test_remote_translator_cancel_and_stream()
+
+    logger.info("開始 IPC 效能測試")
+    benchmark_ipc_overhead()
+
+if __name__ == "__main__":
+    main()
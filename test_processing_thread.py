@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+處理執行緒測試腳本
+測試連接直播失敗或翻譯引擎初始化失敗時，清理會等待背景的語音識別模型載入結束
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+@contextmanager
+def patched(target, **values):
+    """暫時替換模組屬性"""
+    originals = {name: getattr(target, name) for name in values}
+    for name, value in values.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(target, name, value)
+
+class SlowTranscriber:
+    """載入模型需要一段時間的語音識別器，記錄預熱與清理"""
+
+    def __init__(self, load_seconds=0.3):
+        self.load_seconds = load_seconds
+        self.loading = threading.Event()
+        self.model = None
+        self.is_initialized = False
+        self.warmed_up = False
+        self.last_language = None
+
+    def initialize(self):
+        self.loading.set()
+        time.sleep(self.load_seconds)
+        self.model = object()
+        self.is_initialized = True
+
+    def warmup(self, language="auto"):
+        self.warmed_up = True
+        return True
+
+    def cleanup(self):
+        self.model = None
+        self.is_initialized = False
+
+class StubHandler:
+    """連接結果固定的直播處理器"""
+
+    def __init__(self, connected):
+        self.connected = connected
+
+    def connect(self, url):
+        return self.connected
+
+    def disconnect(self):
+        pass
+
+class StubTranslator:
+    """不載入模型的翻譯器；failing 時初始化失敗"""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.source_language = None
+
+    def initialize(self):
+        if self.failing:
+            raise RuntimeError("翻譯模型載入失敗")
+
+    def cleanup(self):
+        pass
+
+def make_thread(connected, translator_fails=False):
+    """建立使用假元件的處理執行緒"""
+    from src.gui import main_window
+
+    with patched(main_window, MODEL_WORKER_PROCESSES=False, WHISPER_TWO_TIER_MODE=False,
+                 TWO_TIER_TRANSLATION=False, SENTENCE_ACCUMULATOR_ENABLED=False,
+                 LANGUAGE_BYPASS_ENABLED=False, WHISPER_WARMUP_ENABLED=True,
+                 YouTubeHandler=lambda: StubHandler(connected),
+                 Transcriber=SlowTranscriber,
+                 GemmaTranslator=lambda: StubTranslator(translator_fails)):
+        return main_window.ProcessingThread("https://youtube.com/watch?v=test", "en", "zh")
+
+def test_cleanup_waits_for_transcriber_load():
+    """測試啟動失敗時清理會等待背景載入結束，模型不會在清理後殘留"""
+    for connected, translator_fails in ((False, False), (True, True)):
+        thread = make_thread(connected, translator_fails)
+        errors = []
+        thread.error_occurred.connect(errors.append)
+
+        thread.run()
+
+        transcriber = thread.transcriber
+        assert transcriber.loading.is_set()
+        # 未等待背景載入時，模型會在清理之後才設定
+        time.sleep(transcriber.load_seconds * 2)
+        assert transcriber.model is None and not transcriber.is_initialized
+        assert not transcriber.warmed_up  # 已停止時不預熱
+        assert thread.transcriber_thread is None
+        assert len(errors) == 1
+    logger.info("✅ 啟動失敗時等待模型載入後再清理")
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始處理執行緒測試")
+    logger.info("=" * 50)
+
+    test_cleanup_waits_for_transcriber_load()
+
+if __name__ == "__main__":
+    main()
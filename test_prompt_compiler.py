@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+提示詞編譯測試腳本
+測試預先分詞的模板與整段分詞的結果相同（含合併跨越切分點的 BPE 分詞器）、模板只編譯一次，
+並以 Gemma 分詞器比較逐次渲染分詞與編譯後的提示詞產生速度
+"""
+
+import time
+import logging
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+from transformers import AutoTokenizer, PreTrainedTokenizerFast
+from src.core.translator import Translator, GemmaTranslator
+from src.core.prompt_compiler import PromptCompiler
+from src.config import GEMMA_MODEL_NAME, MODELS_DIR
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 與 Gemma 相同結構的簡化 chat template（系統提示詞併入使用者輪次）
+CHAT_TEMPLATE = (
+    "{{ bos_token }}<start_of_turn>user\n{{ messages[0]['content'] }}\n\n"
+    "{{ messages[1]['content'] | trim }}<end_of_turn>\n<start_of_turn>model\n"
+)
+
+def build_tokenizer():
+    """建立記憶體中的詞級分詞器，不需要下載模型"""
+    words = "you are a professional translator translate this text to chinese japanese hello world now recent context"
+    vocab = {"<pad>": 0, "<eos>": 1, "<bos>": 2, "[UNK]": 3, "<start_of_turn>": 4, "<end_of_turn>": 5}
+    for word in words.split():
+        vocab.setdefault(word, len(vocab))
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="<eos>", bos_token="<bos>",
+        additional_special_tokens=["<start_of_turn>", "<end_of_turn>"]
+    )
+    tokenizer.chat_template = CHAT_TEMPLATE
+    return tokenizer
+
+SAMPLE_TEXTS = ["hello world", "Good night.", "Welcome back to the stream.", "See you soon!", "Let's begin."]
+
+def build_bpe_tokenizer():
+    """
+    以提示詞訓練記憶體中的位元組層級 BPE 分詞器
+
+    不以正規表示式預先切分，合併可以跨越空白與換行（例如 "\n\n" 與下一個詞合併），
+    與 SentencePiece 類的分詞器一樣會在模板的切分點附近產生不同的詞元。
+    """
+    word_level = build_tokenizer()
+    corpus = []
+    for translator_class in (Translator, GemmaTranslator):
+        translator = translator_class()
+        translator.tokenizer = word_level
+        for context in ([], [("hello", "world")], [("Good night.", "晚安。"), ("See you", "再見")]):
+            for target_language in ("zh", "ja"):
+                translator.context_buffers = {target_language: list(context)}
+                corpus.extend(
+                    translator._build_translation_prompt(text, target_language) for text in SAMPLE_TEXTS
+                )
+
+    special_tokens = ["<pad>", "<eos>", "<bos>", "<start_of_turn>", "<end_of_turn>"]
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False, use_regex=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    tokenizer.train_from_iterator(corpus, trainers.BpeTrainer(
+        vocab_size=400, special_tokens=special_tokens,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(), show_progress=False
+    ))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="<eos>", bos_token="<bos>",
+        additional_special_tokens=["<start_of_turn>", "<end_of_turn>"]
+    )
+    tokenizer.chat_template = CHAT_TEMPLATE
+    return tokenizer
+
+def reference_ids(translator, text, target_language):
+    """目前的做法：渲染完整提示詞後整段分詞"""
+    prompt = translator._build_translation_prompt(text, target_language)
+    bos_token = translator.tokenizer.bos_token
+    return translator.tokenizer(prompt, add_special_tokens=not prompt.startswith(bos_token))["input_ids"]
+
+def test_compiled_prompt_matches_full_tokenization():
+    """測試編譯後的提示詞詞元與整段分詞相同（含上下文與不含上下文）"""
+    tokenizer = build_tokenizer()
+
+    for translator_class in (Translator, GemmaTranslator):
+        translator = translator_class()
+        translator.tokenizer = tokenizer
+
+        for context in ([], [("hello", "world")]):
+            translator.context_buffers = {"zh": list(context)}
+            expected = reference_ids(translator, "hello world", "zh")
+            compiled = translator._encode_prompts([("hello world", "zh")])["input_ids"][0].tolist()
+            assert compiled == expected, translator_class.__name__
+
+    logger.info("✅ 編譯後的提示詞與整段分詞相同")
+
+def test_compiled_prompt_matches_bpe_tokenization():
+    """測試 BPE 合併跨越切分點時，編譯後的提示詞仍與整段分詞相同（必要時改為整段分詞）"""
+    tokenizer = build_bpe_tokenizer()
+    texts = SAMPLE_TEXTS + ["Completely new words here."]
+    spliced_mismatches = 0
+
+    for boundary_tokens in (1, 4):
+        metrics.reset()
+        for translator_class in (Translator, GemmaTranslator):
+            translator = translator_class()
+            translator.tokenizer = tokenizer
+            translator.prompt_compiler = PromptCompiler(
+                tokenizer, translator._render_prompt, boundary_tokens=boundary_tokens
+            )
+
+            for context in ([], [("hello", "world")]):
+                translator.context_buffers = {"zh": list(context)}
+                for text in texts:
+                    expected = reference_ids(translator, text, "zh")
+                    compiled = translator._encode_prompts([(text, "zh")])["input_ids"][0].tolist()
+                    assert compiled == expected, (translator_class.__name__, boundary_tokens, text)
+
+                    # 前後段與內容各自分詞後直接拼接的結果
+                    content = translator._prompt_content(text, "zh")
+                    prefix, suffix = translator._render_prompt("\0", "zh").split("\0")
+                    spliced = (
+                        tokenizer(prefix, add_special_tokens=not prefix.startswith("<bos>"))["input_ids"]
+                        + tokenizer(content, add_special_tokens=False)["input_ids"]
+                        + tokenizer(suffix, add_special_tokens=False)["input_ids"]
+                    )
+                    spliced_mismatches += spliced != expected
+
+        fallbacks = metrics.get_counter("translation.prompt_boundary_fallbacks")
+        assert fallbacks > 0 if boundary_tokens == 1 else fallbacks == 0
+
+    # 分詞器確實會在切分點合併，否則此測試無法發現拼接錯誤
+    assert spliced_mismatches > 0
+    logger.info("✅ BPE 合併跨越切分點時與整段分詞相同")
+
+def test_template_compiled_once_per_language_and_version():
+    """測試每個 (目標語言, 提示詞版本) 只編譯一次"""
+    metrics.reset()
+    translator = GemmaTranslator()
+    translator.tokenizer = build_tokenizer()
+
+    for text in ("hello", "hello world", "world"):
+        translator._encode_prompts([(text, "zh"), (text, "ja")])
+    assert metrics.get_counter("translation.prompt_compilations") == 2
+
+    translator.prompt_compiler.encode("hello", "zh", "other-version")
+    assert metrics.get_counter("translation.prompt_compilations") == 3
+    logger.info("✅ 模板只編譯一次")
+
+def test_batch_left_padding():
+    """測試不同長度的提示詞以左側填充組成批次"""
+    compiler = PromptCompiler(build_tokenizer(), lambda content, language: content)
+    batch = compiler.batch([[7, 8, 9], [7]])
+
+    assert batch["input_ids"].tolist() == [[7, 8, 9], [0, 0, 7]]
+    assert batch["attention_mask"].tolist() == [[1, 1, 1], [0, 0, 1]]
+    logger.info("✅ 批次左側填充")
+
+def benchmark_prompt_encoding(iterations=500):
+    """以 Gemma 分詞器比較每次渲染 chat template 並整段分詞與使用編譯模板的耗時"""
+    translator = GemmaTranslator()
+    translator.tokenizer = AutoTokenizer.from_pretrained(GEMMA_MODEL_NAME, cache_dir=MODELS_DIR)
+    translator.context_buffers = {"zh": [("Welcome back to the stream.", "歡迎回到直播。")]}
+    text = "Today we are going to build a small robot."
+
+    assert translator._encode_prompts([(text, "zh")])["input_ids"][0].tolist() == reference_ids(translator, text, "zh")
+
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        reference_ids(translator, text, "zh")
+    full_elapsed = (time.perf_counter() - start_time) / iterations
+
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        translator._encode_prompts([(text, "zh")])
+    compiled_elapsed = (time.perf_counter() - start_time) / iterations
+
+    logger.info(
+        f"渲染並整段分詞: {full_elapsed * 1000:.3f} ms，編譯模板: {compiled_elapsed * 1000:.3f} ms "
+        f"（{full_elapsed / compiled_elapsed:.1f}x）"
+    )
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始提示詞編譯測試")
+    logger.info("=" * 50)
+
+    test_compiled_prompt_matches_full_tokenization()
+    test_compiled_prompt_matches_bpe_tokenization()
+    test_template_compiled_once_per_language_and_version()
+    test_batch_left_padding()
+
+    logger.info("開始提示詞產生效能測試")
+    benchmark_prompt_encoding()
+
+if __name__ == "__main__":
+    main()
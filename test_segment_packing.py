@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+多段打包翻譯測試腳本
+測試編號列表的解析、依詞元預算分組、格式不符時的逐句回退，並比較打包前後的翻譯吞吐量
+"""
+
+import time
+import logging
+from src.core.translator import GemmaTranslator
+from src.utils.metrics import metrics
+from src.utils.text import format_numbered_list, parse_numbered_list
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SUBTITLE_CORPUS = [
+    "Welcome back, everyone.",
+    "Okay.",
+    "Let's get started.",
+    "Can you hear me?",
+    "This part is a little tricky, so watch closely.",
+    "Yeah.",
+    "Thanks for the follow!",
+    "We need to solder these two wires together.",
+    "Hold on.",
+    "Let's see if it actually moves this time.",
+    "Nice.",
+    "That's it for today.",
+]
+
+class WhitespaceTokenizer:
+    """以空白切分計算詞元數的假分詞器"""
+    
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": text.split()}
+
+class ScriptedGemmaTranslator(GemmaTranslator):
+    """以固定規則取代 Gemma 生成：打包提示詞依編號回覆，含 "chatty" 的組合回覆格式不符的內容"""
+    
+    def __init__(self):
+        super().__init__()
+        self.is_initialized = True
+        self.tokenizer = WhitespaceTokenizer()
+        self.packing = True
+        self.packing_token_budget = 6
+        self.packing_max_segments = 3
+        self.calls = []  # [(是否為打包提示詞, 提示詞數量)]
+    
+    def _generate_contents(self, contents, max_new_tokens, streamer=None, stop_at_newline=True):
+        self.calls.append((not stop_at_newline, len(contents)))
+        outputs = []
+        for content, target_language in contents:
+            if stop_at_newline:
+                outputs.append(f"<{target_language}> {content.rsplit(': ', 1)[-1]}")
+                continue
+            lines = [line for line in content.splitlines() if line[:1].isdigit()]
+            if any("chatty" in line for line in lines):
+                outputs.append("Sure! Here are the translations:\n" + "\n".join(lines))
+            else:
+                outputs.append("\n".join(
+                    f"{number}. <{target_language}> {text}"
+                    for number, text in (line.split(". ", 1) for line in lines)
+                ))
+        return outputs
+
+def test_parse_numbered_list():
+    """測試編號列表的格式化與嚴格解析"""
+    texts = ["Hello.", "How are you?", "Bye."]
+    assert format_numbered_list(texts) == "1. Hello.\n2. How are you?\n3. Bye."
+    assert parse_numbered_list(format_numbered_list(texts), 3) == texts
+    
+    # 其他編號符號與空行
+    assert parse_numbered_list("1) 你好。\n\n2、最近好嗎？\n3： 再見。", 3) == ["你好。", "最近好嗎？", "再見。"]
+    # 順序不同時依編號放回
+    assert parse_numbered_list("2. B\n1. A", 2) == ["A", "B"]
+    
+    # 多餘的說明、缺少、重複、超出範圍或空白的項目都視為格式不符
+    assert parse_numbered_list("Sure!\n1. A\n2. B", 2) is None
+    assert parse_numbered_list("1. A", 2) is None
+    assert parse_numbered_list("1. A\n1. B", 2) is None
+    assert parse_numbered_list("1. A\n3. B", 2) is None
+    assert parse_numbered_list("1. A\n2.", 2) is None
+    assert parse_numbered_list("", 1) is None
+    
+    logger.info("✅ 編號列表解析")
+
+def test_plan_packs_respects_budget():
+    """測試分組依目標語言、詞元預算與句數上限"""
+    translator = ScriptedGemmaTranslator()
+    pairs = [
+        ("one two", "zh"),
+        ("three four", "ja"),
+        ("five six", "zh"),
+        ("a very long sentence here", "zh"),
+        ("x", "zh"),
+        ("y", "zh"),
+        ("z", "zh"),
+        ("seven", "ja"),
+    ]
+    
+    packs, singles = translator._plan_packs(pairs)
+    
+    assert packs == [[0, 2], [3, 4], [5, 6], [1, 7]]
+    assert singles == []
+    
+    # 單獨一句超過預算時不打包
+    packs, singles = translator._plan_packs([("a b c d e f g", "zh"), ("h", "zh")])
+    assert packs == [] and singles == [0, 1]
+    
+    logger.info("✅ 依詞元預算分組")
+
+def test_packed_translation_with_fallback():
+    """測試打包翻譯的結果順序，格式不符的組合改為逐句翻譯"""
+    translator = ScriptedGemmaTranslator()
+    texts = ["Hi there.", "Okay.", "Good.", "Keep it chatty.", "Right.", "Sure."]
+    fallbacks = metrics.get_counter("translation.packing_fallbacks")
+    packed = metrics.get_counter("translation.packed_segments")
+    
+    results = translator.translate_batch(texts, "zh")
+    
+    assert results == [f"<zh> {text}" for text in texts]
+    # 兩組打包在同一次生成，格式不符的組合再以一次生成逐句翻譯
+    assert translator.calls == [(True, 2), (False, 3)]
+    assert metrics.get_counter("translation.packing_fallbacks") == fallbacks + 1
+    assert metrics.get_counter("translation.packed_segments") == packed + 3
+    
+    # 關閉打包時逐句生成
+    translator.packing = False
+    translator.calls.clear()
+    translator.clear_cache()
+    assert translator.translate_batch(texts, "ja") == [f"<ja> {text}" for text in texts]
+    assert translator.calls == [(False, 6)]
+    
+    logger.info("✅ 打包翻譯與逐句回退")
+
+def benchmark_packing(target_language="zh"):
+    """比較逐句批次與多段打包的翻譯吞吐量（固定的短字幕語料）"""
+    translator = GemmaTranslator()
+    translator.initialize()
+    if translator.translation_memory is not None:
+        translator.translation_memory.close()
+        translator.translation_memory = None
+    
+    try:
+        throughputs = {}
+        for packing in (False, True):
+            translator.packing = packing
+            translator.clear_cache()
+            translator.clear_context()
+            fallbacks = metrics.get_counter("translation.packing_fallbacks")
+            
+            start_time = time.perf_counter()
+            results = translator.translate_batch(SUBTITLE_CORPUS, target_language)
+            elapsed = time.perf_counter() - start_time
+            
+            throughputs[packing] = len(SUBTITLE_CORPUS) / elapsed
+            logger.info(
+                f"{'打包' if packing else '逐句'}: {throughputs[packing]:.2f} 句/秒，"
+                f"回退 {metrics.get_counter('translation.packing_fallbacks') - fallbacks} 組，"
+                f"空白譯文 {sum(1 for result in results if not result)} 句"
+            )
+        
+        logger.info(f"打包吞吐量提升: {throughputs[True] / throughputs[False]:.2f}x")
+    finally:
+        translator.cleanup()
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始多段打包翻譯測試")
+    logger.info("=" * 50)
+    
+    test_parse_numbered_list()
+    test_plan_packs_respects_budget()
+    test_packed_translation_with_fallback()
+    
+    logger.info("\n" + "=" * 50)
+    logger.info("多段打包吞吐量基準測試")
+    logger.info("=" * 50)
+    benchmark_packing()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+句子累積測試腳本
+測試片段在句尾合併送出、長度與等待期限的切分、修訂結果的對應，以及段落保留片段偵測到的語言
+"""
+
+import logging
+from src.core.segmenter import SentenceAccumulator
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def test_fragments_join_at_sentence_end():
+    """測試半句等待下一個片段，合併後只送出完整的句子"""
+    metrics.reset()
+    accumulator = SentenceAccumulator(max_wait=3.5)
+
+    assert accumulator.add(0, "So today we are going", now=0.0) == []
+    assert accumulator.add(1, "to talk about GPUs. And then", now=3.0) == [
+        (0, "So today we are going to talk about GPUs.", None)
+    ]
+    assert accumulator.add(2, "we will look at memory.", now=6.0) == [
+        (1, "And then we will look at memory.", None)
+    ]
+    assert metrics.get_counter("segmenter.fragments") == 3
+    assert metrics.get_counter("segmenter.segments") == 2
+    assert metrics.get_gauge("segmenter.calls_saved_per_minute") > 0
+    logger.info("✅ 片段在句尾合併")
+
+def test_cjk_fragments_join_without_space():
+    """測試中文片段合併時不加空白"""
+    accumulator = SentenceAccumulator()
+
+    assert accumulator.add(0, "今天我們要", now=0.0) == []
+    assert accumulator.add(1, "討論記憶體。", now=1.0) == [(0, "今天我們要討論記憶體。", None)]
+    logger.info("✅ 中文片段合併")
+
+def test_deadline_and_length_flush():
+    """測試等待超過期限或文字過長時不等句尾即送出"""
+    accumulator = SentenceAccumulator(max_wait=3.5, max_chars=40)
+
+    assert accumulator.add(0, "no punctuation here", now=0.0) == []
+    assert accumulator.poll(now=2.0) == []
+    assert accumulator.poll(now=3.5) == [(0, "no punctuation here", None)]
+
+    ready = accumulator.add(1, "a long clause without an ending, and more words keep coming", now=10.0)
+    assert ready == [(1, "a long clause without an ending,", None)]
+    assert accumulator.flush() == [(2, "and more words keep coming", None)]
+    logger.info("✅ 期限與長度切分")
+
+def test_revision_maps_to_segment():
+    """測試修訂結果更新包含該片段的段落，被切開的片段不修訂"""
+    accumulator = SentenceAccumulator()
+    accumulator.add(0, "hello", now=0.0)
+    accumulator.add(1, "world.", now=1.0)
+
+    assert accumulator.revise(1, "word.") == (0, "hello word.", None)
+
+    accumulator.add(2, "Done. Next", now=2.0)
+    assert accumulator.revise(2, "Done. Text") is None
+
+    assert accumulator.revise(3, "never seen") is None
+    logger.info("✅ 修訂對應段落")
+
+def test_segment_keeps_fragment_language():
+    """測試段落使用組成片段偵測到的語言，而不是送出時最新片段的語言"""
+    accumulator = SentenceAccumulator(max_wait=3.5)
+    english, chinese = ("en", 0.9), ("zh", 0.95)
+
+    assert accumulator.add(0, "So today we are going", now=0.0, language=english) == []
+    assert accumulator.add(1, "to talk. 好", now=1.0, language=chinese) == [
+        (0, "So today we are going to talk.", english)
+    ]
+
+    # 期限到時送出的半句保留自己的語言
+    assert accumulator.add(2, "wait", now=2.0, language=english) == []
+    assert accumulator.poll(now=4.5) == [(1, "好wait", english)]
+
+    # 修訂結果附上新的偵測語言；未附上時沿用原本的語言
+    assert accumulator.revise(2, "我們等一下", chinese) == (1, "好我們等一下", chinese)
+    accumulator.add(3, "今天天氣很好。", now=5.0, language=chinese)
+    assert accumulator.revise(3, "今天天氣真好。") == (2, "今天天氣真好。", chinese)
+    logger.info("✅ 段落保留片段的語言")
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始句子累積測試")
+    logger.info("=" * 50)
+
+    test_fragments_join_at_sentence_end()
+    test_cjk_fragments_join_without_space()
+    test_deadline_and_length_flush()
+    test_revision_maps_to_segment()
+    test_segment_keeps_fragment_language()
+
+if __name__ == "__main__":
+    main()
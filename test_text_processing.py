@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+文字處理測試腳本
+測試快取鍵正規化與句子切分
+"""
+
+import logging
+from src.utils.text import normalize_text, split_sentences, join_sentences
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def test_normalize_text():
+    """測試只有格式差異的文字正規化後相同"""
+    variants = [
+        "Thanks for the follow!",
+        "thanks for the follow",
+        "  Thanks   for the follow. ",
+        "Ｔｈａｎｋｓ　for the follow！",
+    ]
+    keys = {normalize_text(text) for text in variants}
+    assert keys == {"thanks for the follow"}
+    
+    assert normalize_text("謝謝大家。") == normalize_text("謝謝大家")
+    logger.info("✅ 快取鍵正規化")
+
+def test_split_sentences():
+    """測試句子切分"""
+    assert split_sentences("Hello everyone. Welcome back!") == ["Hello everyone.", "Welcome back!"]
+    assert split_sentences("It costs 3.5 dollars") == ["It costs 3.5 dollars"]
+    assert split_sentences("大家好。今天來玩新遊戲！") == ["大家好。", "今天來玩新遊戲！"]
+    logger.info("✅ 句子切分")
+
+def test_join_sentences():
+    """測試依目標語言合併句子"""
+    assert join_sentences(["大家好。", "歡迎回來！"], "zh") == "大家好。歡迎回來！"
+    assert join_sentences(["Hello.", "Welcome!"], "en") == "Hello. Welcome!"
+    logger.info("✅ 句子合併")
+
+def main():
+    """主測試函數"""
+    logger.info("🔍 開始文字處理測試...")
+    
+    tests = [
+        test_normalize_text,
+        test_split_sentences,
+        test_join_sentences,
+    ]
+    
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} 失敗: {e}")
+    
+    logger.info(f"🎉 文字處理測試完成：{len(tests) - failed}/{len(tests)} 通過")
+    return failed == 0
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+語音轉文字模組測試腳本
+以假的 Whisper 模型測試編碼器編譯與編譯快取目錄、自適應模型階梯的切換與雙層轉錄，
+並以 Whisper 的分詞器測試上下文提示詞的 token 預算，不下載模型
+"""
+
+import os
+import time
+import logging
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import torch
+import whisper
+import src.core.transcriber as transcriber_module
+from src.config import (
+    MODELS_DIR, COMPILE_CACHE_DIR, WHISPER_RTF_WINDOW,
+    WHISPER_RTF_DOWNGRADE_THRESHOLD, WHISPER_RTF_UPGRADE_THRESHOLD
+)
+from src.core.transcriber import Transcriber, TwoTierTranscriber, WhisperPromptBuilder
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class StubWhisperModel:
+    """只有編碼器、解碼器與 transcribe 的假 Whisper 模型"""
+    
+    is_multilingual = True
+    num_languages = 99
+    
+    def __init__(self, name):
+        self.name = name
+        self.text = name  # 轉錄結果
+        self.encoder = torch.nn.Identity()
+        self.decoder = torch.nn.Identity()
+    
+    def transcribe(self, audio, **options):
+        self.encoder(torch.zeros(1))
+        return {"text": f" {self.text}", "segments": [], "language": "en"}
+
+class FailingCompiledModule(torch.nn.Module):
+    """與 torch.compile 的 OptimizedModule 相同保留 _orig_mod，但執行時失敗"""
+    
+    def __init__(self, module):
+        super().__init__()
+        self._orig_mod = module
+    
+    def forward(self, *args):
+        raise RuntimeError("inductor 編譯失敗")
+
+@contextmanager
+def patched(target, **values):
+    """暫時替換模組屬性"""
+    originals = {name: getattr(target, name) for name in values}
+    for name, value in values.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(target, name, value)
+
+@contextmanager
+def stub_environment(model_name, compile_function):
+    """以假的模型載入與 torch.compile 建立轉錄器，編譯快取放在暫存目錄"""
+    saved_environ = dict(os.environ)
+    with tempfile.TemporaryDirectory() as cache_dir, \
+            patched(transcriber_module, WHISPER_MODEL=model_name, COMPILE_CACHE_DIR=Path(cache_dir)), \
+            patched(torch, compile=compile_function):
+        transcriber = Transcriber()
+        transcriber._load_model = StubWhisperModel
+        try:
+            yield transcriber, Path(cache_dir)
+        finally:
+            transcriber.cleanup()
+            os.environ.clear()
+            os.environ.update(saved_environ)
+
+def test_compile_only_encoder_for_turbo():
+    """測試 turbo 模型只編譯編碼器，並將 Inductor 快取設在編譯快取目錄下"""
+    compiled = []
+    
+    def fake_compile(module):
+        compiled.append(module)
+        return FailingCompiledModule(module)
+    
+    assert COMPILE_CACHE_DIR == MODELS_DIR / "compile_cache"
+    
+    with stub_environment("turbo", fake_compile) as (transcriber, cache_dir):
+        transcriber.initialize()
+        model = transcriber.model
+        
+        assert len(compiled) == 1 and model.encoder._orig_mod is compiled[0]
+        assert isinstance(model.decoder, torch.nn.Identity)
+        
+        inductor_dir = Path(os.environ["TORCHINDUCTOR_CACHE_DIR"])
+        assert inductor_dir.parent.parent == cache_dir
+        assert inductor_dir.parent.name.startswith("large-v3_float32_torch")
+        assert Path(os.environ["TRITON_CACHE_DIR"]).parent == inductor_dir.parent
+    
+    logger.info("✅ 只編譯編碼器並設定編譯快取")
+
+def test_compile_skipped_for_other_models():
+    """測試非 turbo 模型不編譯"""
+    compiled = []
+    
+    with stub_environment("base", compiled.append) as (transcriber, _):
+        transcriber.initialize()
+        assert compiled == []
+        assert isinstance(transcriber.model.encoder, torch.nn.Identity)
+    
+    logger.info("✅ 非 turbo 模型不編譯")
+
+def test_compile_failure_falls_back():
+    """測試 torch.compile 失敗或已編譯的編碼器無法執行時改用原始編碼器"""
+    def raising_compile(module):
+        raise RuntimeError("不支援的後端")
+    
+    with stub_environment("turbo", raising_compile) as (transcriber, _):
+        transcriber.initialize()
+        assert isinstance(transcriber.model.encoder, torch.nn.Identity)
+        assert transcriber.warmup()
+    
+    with stub_environment("turbo", FailingCompiledModule) as (transcriber, _):
+        transcriber.initialize()
+        assert isinstance(transcriber.model.encoder, FailingCompiledModule)
+        
+        assert transcriber.warmup()
+        assert isinstance(transcriber.model.encoder, torch.nn.Identity)
+        assert transcriber.is_warmed_up
+    
+    logger.info("✅ 編譯失敗時回退到原始編碼器")
+
+def make_ladder_transcriber(loaded=("turbo", "small", "base")):
+    """建立已載入指定階梯模型的轉錄器"""
+    with patched(transcriber_module, WHISPER_ADAPTIVE_MODEL=True, WHISPER_MODEL="turbo"):
+        transcriber = Transcriber()
+    transcriber.models = {name: StubWhisperModel(name) for name in loaded}
+    transcriber.model = transcriber.models["turbo"]
+    return transcriber
+
+def feed_rtf(transcriber, rtf, count=WHISPER_RTF_WINDOW):
+    """記錄 count 個相同 RTF 的 10 秒片段"""
+    for _ in range(count):
+        transcriber._record_rtf(10.0, rtf * 10.0)
+
+def test_adaptive_ladder_disabled_by_default():
+    """測試預設不啟用自適應階梯（不預先載入其他模型）"""
+    with stub_environment("turbo", lambda module: module) as (transcriber, _):
+        assert transcriber.model_ladder == ["turbo"]
+        transcriber.initialize()
+        assert transcriber.preload_thread is None
+        assert list(transcriber.models) == ["turbo"]
+    
+    logger.info("✅ 自適應階梯預設關閉")
+
+def test_ladder_steps_down_and_up():
+    """測試平均 RTF 超過門檻時降級、低於門檻時升級，並需累積完整視窗"""
+    transcriber = make_ladder_transcriber()
+    assert transcriber.model_ladder == ["turbo", "small", "base"]
+    slow = WHISPER_RTF_DOWNGRADE_THRESHOLD + 0.2
+    fast = WHISPER_RTF_UPGRADE_THRESHOLD / 2
+    
+    # 視窗未滿時不切換
+    feed_rtf(transcriber, slow, WHISPER_RTF_WINDOW - 1)
+    assert transcriber.model_level == 0
+    feed_rtf(transcriber, slow, 1)
+    assert transcriber.model_level == 1 and transcriber.model.name == "small"
+    assert len(transcriber.rtf_history) == 0
+    
+    feed_rtf(transcriber, slow)
+    assert transcriber.model.name == "base"
+    # 已是最小的模型
+    feed_rtf(transcriber, slow)
+    assert transcriber.model_level == 2
+    
+    feed_rtf(transcriber, fast)
+    assert transcriber.model.name == "small"
+    feed_rtf(transcriber, fast)
+    assert transcriber.model.name == "turbo" and transcriber.model_level == 0
+    
+    logger.info("✅ 依 RTF 降級與升級")
+
+def test_ladder_hysteresis():
+    """測試兩個門檻之間不切換，平均值跨過門檻才切換，尚未載入的模型不切換"""
+    transcriber = make_ladder_transcriber()
+    between = (WHISPER_RTF_DOWNGRADE_THRESHOLD + WHISPER_RTF_UPGRADE_THRESHOLD) / 2
+    
+    feed_rtf(transcriber, between, WHISPER_RTF_WINDOW * 3)
+    assert transcriber.model_level == 0
+    
+    # 單一片段的尖峰不足以讓平均值超過門檻
+    feed_rtf(transcriber, between, WHISPER_RTF_WINDOW - 1)
+    feed_rtf(transcriber, WHISPER_RTF_DOWNGRADE_THRESHOLD + 0.1, 1)
+    assert transcriber.model_level == 0
+    
+    # 降級到 small 後，RTF 回到兩個門檻之間時停留在 small
+    feed_rtf(transcriber, WHISPER_RTF_DOWNGRADE_THRESHOLD + 0.2)
+    assert transcriber.model_level == 1
+    feed_rtf(transcriber, between, WHISPER_RTF_WINDOW * 2)
+    assert transcriber.model_level == 1
+    
+    transcriber = make_ladder_transcriber(loaded=("turbo",))
+    feed_rtf(transcriber, WHISPER_RTF_DOWNGRADE_THRESHOLD + 0.2)
+    assert transcriber.model_level == 0 and transcriber.model.name == "turbo"
+    
+    logger.info("✅ 門檻之間保持目前的模型")
+
+def make_two_tier_transcriber(adaptive):
+    """建立使用假模型的雙層轉錄器，記錄每次載入的模型名稱"""
+    loads = []
+    
+    def load_model(name):
+        loads.append(name)
+        return StubWhisperModel(name)
+    
+    with patched(transcriber_module, WHISPER_ADAPTIVE_MODEL=adaptive, WHISPER_MODEL="turbo",
+                 WHISPER_DRAFT_MODEL="base"):
+        transcriber = TwoTierTranscriber()
+        transcriber._load_model = load_model
+        transcriber.initialize()
+    return transcriber, loads
+
+def wait_for_revisions(transcriber, count, timeout=5.0):
+    """等待修訂執行緒產生 count 個修訂結果"""
+    revisions = []
+    deadline = time.time() + timeout
+    while len(revisions) < count and time.time() < deadline:
+        revisions.extend(transcriber.get_revisions())
+        time.sleep(0.01)
+    return revisions
+
+def test_two_tier_draft_then_revise():
+    """測試草稿立即返回，大模型修訂結果以相同序號送出，修訂的 RTF 不影響模型階梯"""
+    transcriber, loads = make_two_tier_transcriber(adaptive=False)
+    audio = np.zeros(16000, dtype=np.float32)
+    revisions_before = metrics.get_counter("asr.revisions")
+    
+    try:
+        assert loads == ["turbo", "base"]
+        assert transcriber.transcribe_draft(audio, "en", 0) == "base"
+        assert wait_for_revisions(transcriber, 1) == [(0, "turbo", ("en", 1.0))]
+        
+        # 修訂結果與草稿相同時不送出
+        transcriber.draft_model.text = "turbo"
+        assert transcriber.transcribe_draft(audio, "en", 1) == "turbo"
+        deadline = time.time() + 5.0
+        while metrics.get_counter("asr.revisions") < revisions_before + 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert metrics.get_counter("asr.revisions") == revisions_before + 2
+        assert transcriber.get_revisions() == []
+        
+        assert len(transcriber.rtf_history) == 0
+        assert transcriber.model is transcriber.models["turbo"]
+    finally:
+        transcriber.cleanup()
+    
+    logger.info("✅ 雙層轉錄草稿與修訂")
+
+def test_two_tier_reuses_ladder_model():
+    """測試草稿模型在模型階梯中時只載入一次"""
+    transcriber, loads = make_two_tier_transcriber(adaptive=True)
+    
+    try:
+        transcriber.preload_thread.join()
+        assert sorted(loads) == ["base", "small", "turbo"]
+        assert transcriber.draft_model is transcriber.models["base"]
+    finally:
+        transcriber.cleanup()
+    
+    logger.info("✅ 草稿模型沿用模型階梯的實例")
+
+def whisper_tokenizer():
+    """多語言 Whisper 模型的分詞器（隨套件附帶，不需下載）"""
+    return whisper.tokenizer.get_tokenizer(True, num_languages=99)
+
+def test_prompt_builder_token_budget():
+    """測試上下文只保留預算內最近的 token，且不從多位元組字元中間開始"""
+    builder = WhisperPromptBuilder(whisper_tokenizer(), token_budget=12)
+    
+    builder.append_text("one two three")
+    assert builder.prompt_text == "one two three"
+    
+    builder.append_text("the quick brown fox jumps over the lazy dog " * 3)
+    assert len(builder.tokens) == 12
+    assert builder.prompt_text.endswith("over the lazy dog")
+    assert "one two three" not in builder.prompt_text
+    
+    builder = WhisperPromptBuilder(whisper_tokenizer(), token_budget=9)
+    builder.append_text("今天我們要來組裝一台小機器人，請大家仔細看")
+    assert len(builder.tokens) <= 9
+    assert "\ufffd" not in builder.prompt_text
+    assert builder.prompt_text.endswith("請大家仔細看")
+    
+    builder.clear()
+    assert builder.prompt_text == ""
+    
+    logger.info("✅ 提示詞 token 預算")
+
+def test_prompt_builder_glossary_before_context():
+    """測試專有名詞表固定在開頭、上下文在後，上下文被截斷時保留專有名詞表"""
+    builder = WhisperPromptBuilder(whisper_tokenizer(), token_budget=20, glossary=["Gemma", "Whisper"])
+    assert builder.prompt_text == "Gemma, Whisper."
+    
+    builder.append_text("hello world")
+    assert builder.prompt_text == "Gemma, Whisper. hello world"
+    
+    builder.append_text("the quick brown fox jumps over the lazy dog " * 3)
+    assert builder.prompt_text.startswith("Gemma, Whisper. ")
+    assert builder.prompt_text.endswith("over the lazy dog")
+    assert "hello world" not in builder.prompt_text
+    assert len(builder.glossary_tokens) + len(builder.tokens) <= 20
+    
+    builder.clear()
+    assert builder.prompt_text == "Gemma, Whisper."
+    
+    # 專有名詞表最多使用一半的預算，只保留完整的詞
+    builder = WhisperPromptBuilder(whisper_tokenizer(), token_budget=8, glossary=["Alpha", "Beta", "Gamma"])
+    assert builder.prompt_text == "Alpha, Beta."
+    assert len(builder.glossary_tokens) <= 4
+    
+    logger.info("✅ 專有名詞表在上下文之前")
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始語音轉文字模組測試")
+    logger.info("=" * 50)
+    
+    test_compile_only_encoder_for_turbo()
+    test_compile_skipped_for_other_models()
+    test_compile_failure_falls_back()
+    test_adaptive_ladder_disabled_by_default()
+    test_ladder_steps_down_and_up()
+    test_ladder_hysteresis()
+    test_two_tier_draft_then_revise()
+    test_two_tier_reuses_ladder_model()
+    test_prompt_builder_token_budget()
+    test_prompt_builder_glossary_before_context()
+
+if __name__ == "__main__":
+    main()
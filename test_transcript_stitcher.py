@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+轉錄拼接測試腳本
+測試重疊視窗的轉錄結果只會輸出新增的文字
+"""
+
+import logging
+from src.core.stitcher import TranscriptStitcher
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def test_word_timestamp_alignment():
+    """測試依詞級時間戳記丟棄已輸出的詞"""
+    stitcher = TranscriptStitcher()
+    
+    # 第一個視窗 0-3 秒
+    first = stitcher.stitch_words(
+        [(0.0, 0.5, " Hello"), (0.5, 1.0, " there"), (1.2, 2.0, " my"), (2.1, 2.9, " friend")],
+        window_start=0.0
+    )
+    assert first == "Hello there my friend"
+    
+    # 第二個視窗 1-4 秒，前 2 秒與上一個視窗重疊
+    second = stitcher.stitch_words(
+        [(0.2, 1.0, " my"), (1.1, 1.9, " friend"), (2.0, 2.8, " welcome")],
+        window_start=1.0
+    )
+    assert second == "welcome"
+    logger.info(f"✅ 時間戳記對齊: {first!r} + {second!r}")
+
+def test_text_overlap_fallback():
+    """測試沒有時間戳記時的後綴/前綴比對"""
+    stitcher = TranscriptStitcher()
+    
+    assert stitcher.stitch_text("The quick brown fox jumps") == "The quick brown fox jumps"
+    assert stitcher.stitch_text("Brown fox jumps, over the lazy dog.") == "over the lazy dog."
+    
+    # 完全重複的片段不輸出
+    assert stitcher.stitch_text("over the lazy dog") is None
+    
+    # 單一詞重疊不視為重複，避免誤刪
+    assert stitcher.stitch_text("dog owners love walks") == "dog owners love walks"
+    logger.info("✅ 文字重疊比對")
+
+def test_cjk_overlap():
+    """測試中文逐字比對"""
+    stitcher = TranscriptStitcher()
+    
+    assert stitcher.stitch_text("今天天氣很好") == "今天天氣很好"
+    assert stitcher.stitch_text("天氣很好，我們去公園") == "我們去公園"
+    logger.info("✅ 中文重疊比對")
+
+def test_saved_volume_reported():
+    """測試節省的翻譯字數有被記錄"""
+    metrics.reset()
+    stitcher = TranscriptStitcher()
+    stitcher.stitch_text("one two three four")
+    stitcher.stitch_text("three four five")
+    
+    assert metrics.get_counter("stitch.chars_in") == len("one two three four") + len("three four five")
+    assert metrics.get_counter("stitch.chars_dropped") == len("three four ")
+    logger.info(f"✅ 節省比例: {metrics.get_gauge('stitch.saved_ratio'):.2%}")
+
+def main():
+    """主測試函數"""
+    logger.info("🔍 開始轉錄拼接測試...")
+    
+    tests = [
+        test_word_timestamp_alignment,
+        test_text_overlap_fallback,
+        test_cjk_overlap,
+        test_saved_volume_reported,
+    ]
+    
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} 失敗: {e}")
+    
+    logger.info(f"🎉 拼接測試完成：{len(tests) - failed}/{len(tests)} 通過")
+    return failed == 0
+
+if __name__ == "__main__":
+    main()
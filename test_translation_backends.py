@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+翻譯後端測試腳本
+測試依語言對選擇翻譯後端與回退、快取依後端與權重精度區分、只在需要時載入 Gemma 模型、共用的輸出長度上限，並比較 Gemma 與 CTranslate2 後端的延遲、吞吐量與記憶體用量
+"""
+
+import gc
+import time
+import logging
+import tempfile
+from pathlib import Path
+import psutil
+from src.core.translator import Translator, GemmaTranslator
+from src.core.translation_backends import (
+    TranslationBackend, GemmaBackend, CTranslate2Backend, LlamaCppBackend, estimate_max_new_tokens
+)
+from src.core.translation_cache import TranslationMemory
+from src.config import GEMMA_MODEL_NAME
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SUBTITLE_CORPUS = [
+    "Welcome back to the stream, everyone.",
+    "Today we are going to build a small robot.",
+    "First, let's take a look at the motor controller.",
+    "If you have any questions, just drop them in the chat.",
+    "This part is a little tricky, so watch closely.",
+    "We need to solder these two wires together.",
+    "Okay, the battery is fully charged now.",
+    "Let's see if it actually moves this time.",
+]
+
+class StubBackend(TranslationBackend):
+    """只支援已知原文語言的假後端"""
+    
+    name = "stub"
+    
+    def supports(self, source_language, target_language):
+        return source_language is not None
+    
+    def translate_batch(self, texts, source_language, target_language):
+        return [f"<{source_language}-{target_language}> {text}" for text in texts]
+
+class StubGemmaTranslator(Translator):
+    """以假輸出取代 Gemma 生成，不載入模型"""
+    
+    def __init__(self):
+        super().__init__()
+        self.is_initialized = True
+        self.backends["stub"] = StubBackend()
+    
+    def _generate_batch(self, texts, target_language, streamer=None):
+        return [f"<gemma> {text}" for text in texts]
+
+def test_backend_selected_per_language_pair():
+    """測試依語言對選擇後端，並共用快取與上下文"""
+    translator = StubGemmaTranslator()
+    translator.source_language = "en"
+    translator.language_pair_backends = {"*-*": "gemma", "en-zh": "stub"}
+    
+    assert translator.translate("Hello.", "zh") == "<en-zh> Hello."
+    assert translator.translate("Hello.", "ja") == "<gemma> Hello."
+    assert translator.translate_batch(["Hi.", "Bye."], "zh") == ["<en-zh> Hi.", "<en-zh> Bye."]
+    
+    # 共用快取與上下文
+    assert translator._lookup_cache("hello", "zh") == "<en-zh> Hello."
+    assert translator.context_buffers["zh"][-1] == ("Bye.", "<en-zh> Bye.")
+    logger.info("✅ 依語言對選擇後端")
+
+def test_unsupported_pair_falls_back_to_gemma():
+    """測試後端不支援（原文語言自動偵測）或未載入時改用 Gemma"""
+    translator = StubGemmaTranslator()
+    translator.language_pair_backends = {"*-*": "stub"}
+    assert translator.translate("Hello.", "zh") == "<gemma> Hello."
+    
+    translator.source_language = "en"
+    translator.language_pair_backends = {"*-*": "ctranslate2"}
+    assert translator.translate("Good night.", "zh") == "<gemma> Good night."
+    logger.info("✅ 不支援的語言對改用 Gemma")
+
+class DeferredLoadTranslator(StubGemmaTranslator):
+    """記錄 Gemma 模型載入次數，不載入模型也不開啟翻譯記憶庫"""
+    
+    def __init__(self, language_pair_backends):
+        super().__init__()
+        self.is_initialized = False
+        self.language_pair_backends = language_pair_backends
+        self.translation_memory = object()  # 已開啟時 initialize 不再建立
+        self.hf_loads = 0
+    
+    def _setup_backends(self):
+        self.backends = {GemmaBackend.name: GemmaBackend(self), "stub": StubBackend()}
+    
+    def _load_hf_model(self):
+        self.hf_loads += 1
+    
+    def _lookup_cache(self, text, target_language):
+        return None
+    
+    def _store_cache(self, text, target_language, translation, model_id=None):
+        pass
+
+def test_gemma_loaded_only_when_routed():
+    """測試所有語言對都使用其他後端時不載入 Gemma，需要改用 Gemma 時才載入一次"""
+    translator = DeferredLoadTranslator({"*-*": "stub"})
+    translator.source_language = "en"
+    translator.initialize()
+    assert translator.hf_loads == 0
+    assert translator.translate("Hello.", "zh") == "<en-zh> Hello."
+    assert translator.hf_loads == 0
+    
+    # 原文語言未知時此後端不支援，改用 Gemma
+    translator.source_language = None
+    assert translator.translate("Good night.", "zh") == "<gemma> Good night."
+    assert translator.translate("See you.", "ja") == "<gemma> See you."
+    assert translator.hf_loads == 1
+    
+    for routes in ({"*-*": "gemma"}, {"*-*": "stub", "en-ja": "gemma"}, {"*-*": "ctranslate2"}):
+        translator = DeferredLoadTranslator(routes)
+        translator.initialize()
+        assert translator.hf_loads == 1
+    logger.info("✅ 只在需要時載入 Gemma")
+
+class FakeLlama:
+    """記錄 create_chat_completion 的參數，每個空白分隔的詞視為一個詞元"""
+    
+    def __init__(self):
+        self.max_tokens = []
+    
+    def tokenize(self, data, add_bos=True):
+        return data.split()
+    
+    def create_chat_completion(self, messages, max_tokens, temperature, stop):
+        self.max_tokens.append(max_tokens)
+        return {"choices": [{"message": {"content": "譯文"}}]}
+
+class WhitespaceTokenizer:
+    """以空白切分計算詞元數的假分詞器"""
+    
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": text.split()}
+
+def test_llama_cpp_uses_length_ratios():
+    """測試 llama.cpp 後端與 Gemma 使用相同的語言對輸出長度上限"""
+    backend = LlamaCppBackend()
+    backend.llm = FakeLlama()
+    translator = StubGemmaTranslator()
+    translator.tokenizer = WhitespaceTokenizer()
+    text = " ".join(["word"] * 20)
+    
+    for source_language, target_language in (("en", "zh"), ("ja", "zh"), (None, "ko")):
+        translator.source_language = source_language
+        backend.translate_batch([text], source_language, target_language)
+        expected = translator._max_new_tokens([text], target_language)
+        assert backend.llm.max_tokens[-1] == expected == estimate_max_new_tokens(20, source_language, target_language)
+    
+    assert backend.llm.max_tokens == [40, 32, 48]
+    logger.info("✅ llama.cpp 使用語言對長度上限")
+
+def test_backend_requires_translate_batch():
+    """測試未實作 translate_batch 的後端在建立時即失敗"""
+    class IncompleteBackend(TranslationBackend):
+        name = "incomplete"
+    
+    try:
+        IncompleteBackend()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("未實作 translate_batch 的後端不應可建立")
+    logger.info("✅ 後端介面檢查")
+
+def test_cache_keyed_by_backend():
+    """測試快取與翻譯記憶依實際使用的後端區分，切換後端時不沿用其他模型的譯文"""
+    translator = StubGemmaTranslator()
+    translator.source_language = "en"
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for memory in (None, TranslationMemory(
+            translator._gemma_model_id(), translator._prompt_version(), db_path=Path(temp_dir) / "memory.sqlite3",
+            flush_interval=0.1, front_cache=translator.translation_cache
+        )):
+            translator.translation_memory = memory
+            translator.clear_cache()
+            
+            translator.language_pair_backends = {"*-*": "stub"}
+            assert translator.translate("Hello.", "zh") == "<en-zh> Hello."
+            
+            translator.language_pair_backends = {"*-*": "gemma"}
+            assert translator._lookup_cache("Hello.", "zh") is None
+            assert translator.translate("Hello.", "zh") == "<gemma> Hello."
+            
+            translator.language_pair_backends = {"*-*": "stub"}
+            assert translator.translate("Hello.", "zh") == "<en-zh> Hello."
+            
+            if memory is not None:
+                memory.flush()
+                memory.front_cache.clear()
+                assert memory.get("Hello.", "zh") == "<gemma> Hello."
+                assert memory.get("Hello.", "zh", "stub") == "<en-zh> Hello."
+                memory.close()
+    
+    logger.info("✅ 快取依後端區分")
+
+def test_gemma_cache_keyed_by_precision():
+    """測試 Gemma 不同權重精度（全精度與 int8）的譯文不共用快取與翻譯記憶"""
+    translator = StubGemmaTranslator()
+    translator.cpu_quantization = None
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for memory in (None, TranslationMemory(
+            translator._gemma_model_id(), translator._prompt_version(),
+            db_path=Path(temp_dir) / "memory.sqlite3", flush_interval=0.1,
+            front_cache=translator.translation_cache
+        )):
+            translator.translation_memory = memory
+            translator.clear_cache()
+            translator.cpu_quantization = None
+            assert translator._gemma_model_id() == f"{GEMMA_MODEL_NAME}:fp"
+            translator.translate("Hello.", "zh")
+            
+            translator.cpu_quantization = "dynamic_int8"
+            assert translator._gemma_model_id() == f"{GEMMA_MODEL_NAME}:dynamic_int8"
+            assert translator._lookup_cache("Hello.", "zh") is None
+            
+            translator.cpu_quantization = None
+            assert translator._lookup_cache("Hello.", "zh") == "<gemma> Hello."
+            
+            if memory is not None:
+                memory.flush()
+                memory.front_cache.clear()
+                translator.cpu_quantization = "dynamic_int8"
+                assert translator._lookup_cache("Hello.", "zh") is None
+                translator.cpu_quantization = None
+                assert translator._lookup_cache("Hello.", "zh") == "<gemma> Hello."
+                memory.close()
+    logger.info("✅ 快取依 Gemma 權重精度區分")
+
+def test_draft_uses_memory_then_draft_backend():
+    """測試草稿翻譯先查翻譯記憶（最終譯文），否則使用草稿後端且不寫入快取與上下文"""
+    translator = StubGemmaTranslator()
+    translator.source_language = "en"
+    translator.draft_backend = "stub"
+    translator.translate("Hello.", "ja")
+    
+    assert translator.translate_draft("Hello.", "ja") == ("<gemma> Hello.", True)
+    assert translator.translate_draft("Thanks.", "ja") == ("<en-ja> Thanks.", False)
+    assert translator._lookup_cache("Thanks.", "ja") is None
+    assert translator.context_buffers["ja"] == [("Hello.", "<gemma> Hello.")]
+    
+    # 草稿後端不支援此語言對時沒有草稿
+    translator.source_language = None
+    assert translator.translate_draft("Thanks.", "ja") == (None, False)
+    logger.info("✅ 草稿翻譯")
+
+def test_nllb_language_support():
+    """測試 NLLB 後端需要已知的原文語言"""
+    backend = CTranslate2Backend(model_name="facebook/nllb-200-distilled-600M")
+    assert backend.supports("en", "zh")
+    assert not backend.supports(None, "zh")
+    assert CTranslate2Backend(model_name="Helsinki-NLP/opus-mt-en-zh").supports(None, "zh")
+    logger.info("✅ NLLB 語言支援")
+
+def benchmark_backends(source_language="en", target_language="zh"):
+    """比較各後端的單句延遲、批次吞吐量與載入後增加的記憶體（CPU）"""
+    process = psutil.Process()
+    
+    for name in ("gemma", "ctranslate2"):
+        gc.collect()
+        rss_before = process.memory_info().rss
+        
+        if name == "gemma":
+            translator = GemmaTranslator()
+            translator.initialize()
+            backend = translator.backends["gemma"]
+        else:
+            translator = None
+            backend = CTranslate2Backend()
+            backend.initialize()
+        rss_delta = (process.memory_info().rss - rss_before) / 1024 / 1024
+        
+        try:
+            latencies = []
+            for text in SUBTITLE_CORPUS:
+                start_time = time.perf_counter()
+                backend.translate(text, source_language, target_language)
+                latencies.append(time.perf_counter() - start_time)
+            
+            start_time = time.perf_counter()
+            backend.translate_batch(SUBTITLE_CORPUS, source_language, target_language)
+            batch_elapsed = time.perf_counter() - start_time
+            
+            latencies.sort()
+            logger.info(
+                f"{name:>11}: 單句延遲 p50 {latencies[len(latencies) // 2]:.2f} 秒 / "
+                f"max {latencies[-1]:.2f} 秒，批次吞吐量 {len(SUBTITLE_CORPUS) / batch_elapsed:.1f} 句/秒，"
+                f"RSS +{rss_delta:.0f} MB"
+            )
+        finally:
+            if translator is not None:
+                translator.cleanup()
+            else:
+                backend.cleanup()
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始翻譯後端測試")
+    logger.info("=" * 50)
+    
+    test_backend_selected_per_language_pair()
+    test_unsupported_pair_falls_back_to_gemma()
+    test_cache_keyed_by_backend()
+    test_gemma_cache_keyed_by_precision()
+    test_gemma_loaded_only_when_routed()
+    test_llama_cpp_uses_length_ratios()
+    test_backend_requires_translate_batch()
+    test_draft_uses_memory_then_draft_backend()
+    test_nllb_language_support()
+    
+    logger.info("\n" + "=" * 50)
+    logger.info("翻譯後端基準測試（CPU）")
+    logger.info("=" * 50)
+    benchmark_backends()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+批次翻譯測試腳本
+測試批次翻譯的快取查詢與去重、部分句子命中時的單次批次，並在 CPU 上對批次大小 1 到 16 進行生成效能基準測試
+"""
+
+import time
+import logging
+from src.core.translator import Translator, GemmaTranslator
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SAMPLE_SENTENCES = [
+    "Welcome back to the stream, everyone.",
+    "Today we are going to build a small robot.",
+    "First, let's take a look at the motor controller.",
+    "If you have any questions, just drop them in the chat.",
+    "This part is a little tricky, so watch closely.",
+    "We need to solder these two wires together.",
+    "Okay, the battery is fully charged now.",
+    "Let's see if it actually moves this time.",
+]
+
+class RecordingTranslator(Translator):
+    """記錄送往模型的批次，不載入模型"""
+    
+    def __init__(self):
+        super().__init__()
+        self.is_initialized = True
+        self.batches = []
+    
+    def _generate_pairs(self, pairs, streamer=None):
+        self.batches.append([text for text, _ in pairs])
+        return [f"[{target_language}] {text}" for text, target_language in pairs]
+
+def test_batch_only_translates_misses():
+    """測試快取命中的項目不進入批次，且重複文字只翻譯一次"""
+    translator = RecordingTranslator()
+    translator._store_cache("Hello there.", "zh", "你好。")
+    
+    texts = ["Hello there.", "How are you?", "", "how are you", "Good night."]
+    translations = translator.translate_batch(texts, "zh")
+    
+    assert translator.batches == [["How are you?", "Good night."]]
+    assert translations == [
+        "你好。", "[zh] How are you?", None, "[zh] How are you?", "[zh] Good night."
+    ]
+    
+    # 翻譯結果已加入快取
+    assert translator.translate_batch(["Good night!"], "zh") == ["[zh] Good night."]
+    assert len(translator.batches) == 1
+    logger.info("✅ 批次翻譯只處理未命中的項目")
+
+def test_batch_split_and_single_item():
+    """測試超過批次上限時分批，單一項目走一般翻譯路徑"""
+    translator = RecordingTranslator()
+    texts = [f"Sentence number {i}." for i in range(9)]
+    
+    translations = translator.translate_batch(texts, "ja")
+    
+    assert [len(batch) for batch in translator.batches] == [8, 1]
+    assert translations == [f"[ja] {text}" for text in texts]
+    logger.info("✅ 批次分割")
+
+def test_multi_target_shares_batch():
+    """測試多個目標語言的未命中項目合併為同一批次，快取與上下文依語言分開"""
+    translator = RecordingTranslator()
+    translator._store_cache("Hello there.", "ja", "こんにちは。")
+    
+    results = translator.translate_multi(["Hello there.", "Good night."], ["zh", "ja"])
+    
+    assert translator.batches == [["Hello there.", "Good night.", "Good night."]]
+    assert results == {
+        "zh": ["[zh] Hello there.", "[zh] Good night."],
+        "ja": ["こんにちは。", "[ja] Good night."],
+    }
+    assert translator._lookup_cache("good night", "ja") == "[ja] Good night."
+    assert translator.context_buffers["zh"][-1] == ("Good night.", "[zh] Good night.")
+    assert translator.context_buffers["ja"] == [("Good night.", "[ja] Good night.")]
+    logger.info("✅ 多目標語言合併批次")
+
+def test_partial_sentence_hit_uses_one_call():
+    """測試部分句子命中快取時，未命中的句子合併為一次模型呼叫"""
+    translator = RecordingTranslator()
+    translator._store_cache("Hello everyone.", "zh", "大家好。")
+    llm_calls = metrics.get_counter("translation.llm_calls")
+    
+    translation = translator.translate("Hello everyone. Welcome back! Let's begin. See you soon.", "zh")
+    
+    assert translator.batches == [["Welcome back!", "Let's begin.", "See you soon."]]
+    assert metrics.get_counter("translation.llm_calls") == llm_calls + 1
+    assert translation == "大家好。[zh] Welcome back![zh] Let's begin.[zh] See you soon."
+    
+    # 只剩一句未命中時走一般翻譯路徑
+    translator.translate("Hello everyone. Good night.", "zh")
+    assert translator.batches[-1] == ["Good night."]
+    assert metrics.get_counter("translation.llm_calls") == llm_calls + 2
+    logger.info("✅ 部分句子命中時單次批次翻譯")
+
+def benchmark_batch_generation(batch_sizes=(1, 2, 4, 8, 16)):
+    """在 CPU 上測量不同批次大小的生成吞吐量（tokens/s）與每個項目的延遲"""
+    translator = GemmaTranslator()
+    translator.initialize()
+    
+    try:
+        for batch_size in batch_sizes:
+            texts = [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] for i in range(batch_size)]
+            tokens_before = metrics.get_counter("translation.generated_tokens")
+            
+            start_time = time.perf_counter()
+            translator._generate_batch(texts, "zh")
+            elapsed = time.perf_counter() - start_time
+            
+            tokens = metrics.get_counter("translation.generated_tokens") - tokens_before
+            logger.info(
+                f"批次 {batch_size:>2}: {tokens / elapsed:7.1f} tokens/s，"
+                f"每項延遲 {elapsed:.2f} 秒（平均分攤 {elapsed / batch_size:.2f} 秒）"
+            )
+    finally:
+        translator.cleanup()
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始批次翻譯測試")
+    logger.info("=" * 50)
+    
+    test_batch_only_translates_misses()
+    test_batch_split_and_single_item()
+    test_multi_target_shares_batch()
+    test_partial_sentence_hit_uses_one_call()
+    
+    logger.info("\n" + "=" * 50)
+    logger.info("批次生成基準測試（CPU）")
+    logger.info("=" * 50)
+    benchmark_batch_generation()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+翻譯快取測試腳本
+測試 LRU/LFU 淘汰、TTL 與統計、磁碟翻譯記憶庫，並對 1k 到 1M 項目的快取進行微基準測試
+"""
+
+import time
+import random
+import logging
+import tempfile
+from pathlib import Path
+from src.core.translation_cache import TranslationCache, TranslationMemory
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def test_lru_eviction():
+    """測試 LRU 淘汰最久未使用的項目"""
+    cache = TranslationCache(max_size=3, policy="lru")
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper())
+    
+    cache.get("a")  # a 變成最近使用
+    cache.put("d", "D")
+    
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.stats()["evictions"] == 1
+    logger.info("✅ LRU 淘汰")
+
+def test_lfu_keeps_hot_entries():
+    """測試 LFU 不會淘汰熱門項目（同次數時淘汰最久未使用者）"""
+    cache = TranslationCache(max_size=3, policy="lfu")
+    cache.put("hot", "熱門")
+    for _ in range(5):
+        cache.get("hot")
+    cache.put("b", "B")
+    cache.put("c", "C")
+    cache.get("b")
+    
+    cache.put("d", "D")  # c 的次數最少
+    assert cache.get("c") is None
+    assert cache.get("hot") == "熱門"
+    
+    cache.put("e", "E")  # d 與 e 次數相同，淘汰較舊的 d
+    assert cache.get("d") is None
+    assert cache.get("b") == "B"
+    logger.info("✅ LFU 淘汰")
+
+def test_lfu_aging():
+    """測試老化讓過去的熱門項目失去優勢"""
+    cache = TranslationCache(max_size=2, policy="lfu", aging_interval=2)
+    cache.put("old", "舊")
+    for _ in range(3):
+        cache.get("old")
+    cache.put("new", "新")  # 觸發老化：old 次數 4 -> 2，new 1 -> 1
+    
+    assert cache.cache["old"].frequency == 2
+    assert cache.cache["new"].frequency == 1
+    logger.info("✅ LFU 老化")
+
+def test_ttl_expiration():
+    """測試 TTL 過期"""
+    cache = TranslationCache(max_size=10, policy="lru", ttl=0.05)
+    cache.put("a", "A")
+    assert cache.get("a") == "A"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    logger.info("✅ TTL 過期")
+
+def test_stats():
+    """測試命中、未命中與位元組統計"""
+    cache = TranslationCache(max_size=10)
+    cache.put("你好", "hello")
+    cache.get("你好")
+    cache.get("missing")
+    
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["bytes"] == len("你好".encode("utf-8")) + len("hello")
+    assert stats["hit_rate"] == 0.5
+    logger.info(f"✅ 統計: {stats}")
+
+def test_translation_memory_warm_session():
+    """測試翻譯記憶庫在新的工作階段仍可命中"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "memory.sqlite3"
+        
+        memory = TranslationMemory("gemma", "v1", db_path=db_path, flush_interval=0.1)
+        memory.put("Thanks for   the follow!", "zh", "謝謝追隨！")
+        assert memory.get("Thanks for the follow!", "zh") == "謝謝追隨！"
+        memory.close()
+        
+        # 新的工作階段：前端快取是空的，從磁碟讀取
+        memory = TranslationMemory("gemma", "v1", db_path=db_path, flush_interval=0.1)
+        assert memory.get("Thanks for the follow!", "zh") == "謝謝追隨！"
+        assert memory.get("Thanks for the follow!", "zh") == "謝謝追隨！"
+        stats = memory.stats()
+        assert stats["disk_hits"] == 1 and stats["front_hits"] == 1
+        
+        # 模型或提示詞版本不同時不共用
+        other = TranslationMemory("gemma", "v2", db_path=db_path, flush_interval=0.1)
+        assert other.get("Thanks for the follow!", "zh") is None
+        other.close()
+        memory.close()
+    logger.info("✅ 翻譯記憶庫跨工作階段命中")
+
+def test_translation_memory_size_cap():
+    """測試翻譯記憶庫超過上限時淘汰最久未使用的項目"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        memory = TranslationMemory("gemma", "v1", db_path=Path(temp_dir) / "memory.sqlite3",
+                                   max_entries=2, flush_interval=0.1)
+        for text in ("one", "two", "three"):
+            memory.put(text, "zh", text.upper())
+            memory.flush()
+            time.sleep(0.01)
+        
+        assert memory.stats()["entries"] == 2
+        memory.front_cache.clear()
+        assert memory.get("one", "zh") is None
+        assert memory.get("three", "zh") == "THREE"
+        memory.close()
+    logger.info("✅ 翻譯記憶庫容量上限")
+
+def benchmark_translation_memory(entries=50_000, lookups=20_000):
+    """測量暖啟動工作階段的命中率與查詢延遲"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = Path(temp_dir) / "memory.sqlite3"
+        
+        memory = TranslationMemory("gemma", "v1", db_path=db_path, flush_interval=0.1)
+        for i in range(entries):
+            memory.put(f"catchphrase {i}", "zh", f"口頭禪 {i}")
+        memory.close()
+        
+        # 新的工作階段，重複的口頭禪佔大多數
+        memory = TranslationMemory("gemma", "v1", db_path=db_path, flush_interval=0.1)
+        hot_keys = [f"catchphrase {i}" for i in range(200)]
+        timings = {"hit": [], "miss": []}
+        for i in range(lookups):
+            text = random.choice(hot_keys) if random.random() < 0.8 else f"new line {i}"
+            start_time = time.perf_counter()
+            result = memory.get(text, "zh")
+            timings["hit" if result else "miss"].append(time.perf_counter() - start_time)
+        
+        stats = memory.stats()
+        memory.close()
+        
+        logger.info(
+            f"暖啟動命中率 {stats['hit_rate']:.1%} "
+            f"(記憶體 {stats['front_hits']} / 磁碟 {stats['disk_hits']} / 未命中 {stats['misses']})"
+        )
+        for outcome, values in timings.items():
+            if values:
+                values.sort()
+                logger.info(
+                    f"  {outcome}: 平均 {sum(values) / len(values) * 1e6:.1f} µs, "
+                    f"p95 {values[int(len(values) * 0.95)] * 1e6:.1f} µs"
+                )
+
+def benchmark_cache(sizes=(1_000, 10_000, 100_000, 1_000_000), operations=200_000):
+    """微基準測試：在已滿的快取上測量 put（含淘汰）與 get 的平均耗時"""
+    for policy in ("lru", "lfu"):
+        for size in sizes:
+            cache = TranslationCache(max_size=size, policy=policy)
+            for i in range(size):
+                cache.put(f"segment {i}", f"翻譯 {i}")
+            
+            keys = [f"segment {random.randrange(size * 2)}" for _ in range(operations)]
+            
+            start_time = time.perf_counter()
+            for key in keys:
+                cache.get(key)
+            get_time = (time.perf_counter() - start_time) / operations
+            
+            start_time = time.perf_counter()
+            for i, key in enumerate(keys):
+                cache.put(f"{key}/{i}", "翻譯")
+            put_time = (time.perf_counter() - start_time) / operations
+            
+            logger.info(
+                f"{policy.upper()} {size:>9,} 項: get {get_time * 1e6:.2f} µs, "
+                f"put(淘汰) {put_time * 1e6:.2f} µs"
+            )
+
+def main():
+    """主測試函數"""
+    logger.info("🔍 開始翻譯快取測試...")
+    
+    tests = [
+        test_lru_eviction,
+        test_lfu_keeps_hot_entries,
+        test_lfu_aging,
+        test_ttl_expiration,
+        test_stats,
+        test_translation_memory_warm_session,
+        test_translation_memory_size_cap,
+    ]
+    
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            logger.error(f"❌ {test.__name__} 失敗: {e}")
+    
+    logger.info("=== 微基準測試 ===")
+    benchmark_cache()
+    benchmark_translation_memory()
+    
+    logger.info(f"🎉 快取測試完成：{len(tests) - failed}/{len(tests)} 通過")
+    return failed == 0
+
+if __name__ == "__main__":
+    main()
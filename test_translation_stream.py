@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+串流翻譯測試腳本
+測試部分譯文的產出順序、語言標記的清理、快取命中與首字延遲指標
+"""
+
+import logging
+from src.core.translator import Translator
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class StreamingStubTranslator(Translator):
+    """以固定的詞片段模擬生成過程，不載入模型"""
+    
+    def __init__(self, pieces, label="Chinese: "):
+        super().__init__()
+        self.is_initialized = True
+        self.tokenizer = object()  # TextIteratorStreamer 只在 put() 時使用分詞器
+        self.pieces = pieces
+        self.label = label  # 完整輸出開頭的語言標記
+        self.calls = 0
+    
+    def _generate(self, text, target_language, streamer=None):
+        self.calls += 1
+        for piece in self.pieces:
+            streamer.on_finalized_text(piece)
+        streamer.end()
+        return self.label + "".join(self.pieces)
+
+def test_stream_yields_growing_partials():
+    """測試部分譯文逐步增長，最後一項為清理後的完整譯文"""
+    metrics.reset()
+    translator = StreamingStubTranslator(["歡迎", "回到", "直播"])
+    
+    outputs = list(translator.translate_stream("Welcome back to the stream.", "zh"))
+    
+    assert outputs == ["歡迎", "歡迎回到", "歡迎回到直播", "歡迎回到直播"]
+    assert metrics.summary("translation.time_to_first_word")["count"] == 1
+    logger.info("✅ 串流產出部分譯文")
+
+def test_stream_partials_strip_language_label():
+    """測試部分譯文不顯示語言標記與開頭的引號"""
+    translator = StreamingStubTranslator(["Chi", "nese", ":", " 歡迎", "回到"], label="")
+    assert list(translator.translate_stream("Welcome back.", "zh")) == ["歡迎", "歡迎回到", "歡迎回到"]
+    
+    translator = StreamingStubTranslator(["Translation to Chinese:", ' "', "你好", '"'], label="")
+    outputs = list(translator.translate_stream("Hello there.", "zh"))
+    assert outputs == ["你好", "你好", "你好"]
+    logger.info("✅ 部分譯文移除語言標記")
+
+def test_stream_uses_cache():
+    """測試快取命中時只產出一次且不呼叫模型"""
+    translator = StreamingStubTranslator(["你好"])
+    list(translator.translate_stream("Hello.", "zh"))
+    
+    assert list(translator.translate_stream("hello", "zh")) == ["你好"]
+    assert translator.calls == 1
+    logger.info("✅ 串流翻譯使用快取")
+
+def test_stream_error_ends_iteration():
+    """測試生成失敗時迭代結束而不是卡住"""
+    class FailingTranslator(StreamingStubTranslator):
+        def _generate(self, text, target_language, streamer=None):
+            raise RuntimeError("生成失敗")
+    
+    translator = FailingTranslator([])
+    assert list(translator.translate_stream("Hello.", "zh")) == []
+    logger.info("✅ 串流翻譯錯誤處理")
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始串流翻譯測試")
+    logger.info("=" * 50)
+    
+    test_stream_yields_growing_partials()
+    test_stream_partials_strip_language_label()
+    test_stream_uses_cache()
+    test_stream_error_ends_iteration()
+
+if __name__ == "__main__":
+    main()
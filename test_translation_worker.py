@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+翻譯工作執行緒測試腳本
+測試片段的批次合併、批次上限、序號對應、串流部分譯文、逐句快取、取消、相同語言略過與雙層翻譯
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+import torch
+from src.core.translation_worker import TranslationWorker, TwoTierTranslationWorker
+from src.core.language_bypass import LanguageBypass
+from src.core.translator import (
+    Translator, CancellationToken, CancelStoppingCriteria, TranslationCancelled
+)
+from src.utils.metrics import metrics
+
+# 設定日誌
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class RecordingTranslator:
+    """記錄每次批次呼叫的片段，不載入模型"""
+
+    def __init__(self, pieces=None):
+        self.batches = []
+        self.pieces = pieces or []
+        self.cancel_token = None
+
+    @contextmanager
+    def cancellable(self, token):
+        self.cancel_token = token
+        try:
+            yield token
+        finally:
+            self.cancel_token = None
+
+    def translate_multi(self, texts, target_languages):
+        self.batches.append(list(texts))
+        return {language: [f"[{language}] {text}" for text in texts] for language in target_languages}
+
+    def translate_stream(self, text, target_language):
+        partial = ""
+        for piece in self.pieces:
+            partial += piece
+            yield partial
+        yield partial
+
+class BlockingTranslator(RecordingTranslator):
+    """第一次翻譯持續「生成」直到被取消，模擬 Gemma 仍在處理舊片段"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+
+    def translate_multi(self, texts, target_languages):
+        if not self.batches:
+            self.batches.append(list(texts))
+            self.started.set()
+            while not self.cancel_token.cancelled:
+                time.sleep(0.01)
+            raise TranslationCancelled(self.cancel_token.reason)
+        return super().translate_multi(texts, target_languages)
+
+class DraftingTranslator(RecordingTranslator):
+    """草稿為加上前綴的原文；翻譯記憶中的文字直接返回最終譯文"""
+
+    def __init__(self, memory=None):
+        super().__init__()
+        self.memory = memory or {}
+
+    def translate_draft(self, text, target_language):
+        if text in self.memory:
+            return self.memory[text], True
+        return f"draft {text}", False
+
+class CachingTranslator(Translator):
+    """使用真正的快取查詢路徑，記錄送往模型的批次，不載入模型"""
+
+    def __init__(self):
+        super().__init__()
+        self.is_initialized = True
+        self.batches = []
+
+    def _generate_pairs(self, pairs, streamer=None):
+        self.batches.append([text for text, _ in pairs])
+        return [f"[{target_language}] {text}" for text, target_language in pairs]
+
+def wait_for_results(worker, count, timeout=5.0):
+    """等待直到收到指定數量的結果"""
+    results = []
+    deadline = time.time() + timeout
+    while len(results) < count and time.time() < deadline:
+        results.extend(worker.get_results())
+        time.sleep(0.01)
+    return results
+
+def test_worker_coalesces_ready_segments():
+    """測試時間視窗內就緒的片段合併為一個批次，結果以序號對應"""
+    metrics.reset()
+    translator = RecordingTranslator()
+    worker = TranslationWorker(translator, ["zh"], batch_window=0.2, max_batch=8, streaming=False)
+    worker.start()
+    try:
+        for sequence, text in enumerate(["one", "two", "three"]):
+            worker.submit(sequence, text)
+        results = wait_for_results(worker, 3)
+    finally:
+        worker.stop()
+
+    assert translator.batches == [["one", "two", "three"]]
+    assert results == [("zh", 0, "[zh] one"), ("zh", 1, "[zh] two"), ("zh", 2, "[zh] three")]
+    assert metrics.histogram("translation_worker.batch_size") == {3: 1}
+    assert metrics.summary("translation_worker.queue_depth")["count"] == 1
+    logger.info("✅ 就緒片段合併為單一批次")
+
+def test_worker_respects_batch_cap():
+    """測試單一批次不超過上限，其餘片段留待下一批"""
+    translator = RecordingTranslator()
+    worker = TranslationWorker(translator, ["ja"], batch_window=0.2, max_batch=2, streaming=False)
+    for sequence in range(5):
+        worker.submit(sequence, f"text {sequence}")
+    worker.start()
+    try:
+        results = wait_for_results(worker, 5)
+    finally:
+        worker.stop()
+
+    assert [len(batch) for batch in translator.batches] == [2, 2, 1]
+    assert [sequence for _, sequence, _ in results] == [0, 1, 2, 3, 4]
+    logger.info("✅ 批次大小上限")
+
+def test_worker_streams_single_segment():
+    """測試只有一個片段時以串流輸出部分譯文，最後為完整譯文"""
+    translator = RecordingTranslator(["歡迎", "回來"])
+    worker = TranslationWorker(translator, ["zh"], batch_window=0.0, streaming=True, stream_interval=0.0)
+    worker.start()
+    try:
+        worker.submit(7, "Welcome back.")
+        results = wait_for_results(worker, 3)
+    finally:
+        worker.stop()
+
+    assert translator.batches == []
+    assert results == [("zh", 7, "歡迎"), ("zh", 7, "歡迎回來"), ("zh", 7, "歡迎回來")]
+    logger.info("✅ 單一片段串流翻譯")
+
+def test_worker_fans_out_to_all_targets():
+    """測試多個目標語言時單一片段也以批次翻譯，每個語言各自輸出結果"""
+    translator = RecordingTranslator(["unused"])
+    worker = TranslationWorker(translator, ["zh", "ja", "ko"], batch_window=0.0, streaming=True)
+    worker.start()
+    try:
+        worker.submit(3, "Hello.")
+        results = wait_for_results(worker, 3)
+    finally:
+        worker.stop()
+
+    assert translator.batches == [["Hello."]]
+    assert results == [("zh", 3, "[zh] Hello."), ("ja", 3, "[ja] Hello."), ("ko", 3, "[ko] Hello.")]
+    logger.info("✅ 多目標語言輸出")
+
+def test_newer_segment_supersedes_and_merges():
+    """測試落後兩個序號時中止生成中的片段，並將其文字併入下一個片段"""
+    metrics.reset()
+    translator = BlockingTranslator()
+    worker = TranslationWorker(
+        translator, ["zh"], batch_window=0.0, streaming=False, supersede_distance=2, stale_policy="merge"
+    )
+    worker.start()
+    try:
+        worker.submit(0, "zero")
+        assert translator.started.wait(timeout=5)
+        worker.submit(1, "one")
+        worker.submit(2, "two")
+        results = wait_for_results(worker, 2)
+    finally:
+        worker.stop()
+
+    assert translator.batches[0] == ["zero"]
+    assert results == [("zh", 1, "[zh] zero one"), ("zh", 2, "[zh] two")]
+    assert metrics.get_counter("translation_worker.cancelled_batches.superseded") == 1
+    assert metrics.get_counter("translation_worker.merged_segments") == 1
+    logger.info("✅ 過時片段中止並合併")
+
+def test_deadline_cancels_and_drops():
+    """測試超過期限時中止生成，捨棄策略下不輸出任何結果"""
+    metrics.reset()
+    translator = BlockingTranslator()
+    worker = TranslationWorker(
+        translator, ["zh"], batch_window=0.0, streaming=False, deadline=0.05, stale_policy="drop"
+    )
+    worker.start()
+    try:
+        worker.submit(0, "zero")
+        assert translator.started.wait(timeout=5)
+        time.sleep(0.3)
+        results = worker.get_results()
+    finally:
+        worker.stop()
+
+    assert results == []
+    assert metrics.get_counter("translation_worker.cancelled_batches.deadline") == 1
+    assert metrics.get_counter("translation_worker.dropped_segments") == 1
+    logger.info("✅ 期限中止")
+
+class SimplifiedToTraditional:
+    """只轉換測試用字元的字體轉換器"""
+
+    def convert(self, text):
+        return text.replace("这", "這").replace("个", "個")
+
+def test_same_language_bypass():
+    """測試偵測語言等於目標語言時不翻譯該語言，信心不足時照常翻譯"""
+    metrics.reset()
+    translator = RecordingTranslator()
+    bypass = LanguageBypass(min_confidence=0.8, conversions={"zh": "s2twp"})
+    bypass.converters["s2twp"] = SimplifiedToTraditional()
+    worker = TranslationWorker(translator, ["zh", "en"], batch_window=0.0, streaming=False, bypass=bypass)
+    worker.start()
+    try:
+        worker.submit(0, "这个很好。", "zh", 0.95)
+        results = wait_for_results(worker, 2)
+        worker.submit(1, "這樣嗎？", "zh", 0.4)
+        results += wait_for_results(worker, 2)
+    finally:
+        worker.stop()
+
+    assert translator.batches == [["这个很好。"], ["這樣嗎？"]]
+    assert results == [
+        ("zh", 0, "這個很好。"), ("en", 0, "[en] 这个很好。"),
+        ("zh", 1, "[zh] 這樣嗎？"), ("en", 1, "[en] 這樣嗎？"),
+    ]
+    assert metrics.get_counter("translation.bypass.same_language") == 1
+    assert metrics.get_counter("translation.bypass.script_converted") == 1
+    assert metrics.get_counter("translation.bypass.low_confidence") == 1
+    logger.info("✅ 相同語言略過翻譯")
+
+def test_bypass_skips_queue_when_all_targets_match():
+    """測試所有目標語言都略過時不排入翻譯"""
+    translator = RecordingTranslator()
+    worker = TranslationWorker(translator, ["ja"], batch_window=0.0, bypass=LanguageBypass(conversions={}))
+    worker.submit(4, "こんにちは。", "ja", 1.0)
+
+    assert worker.input_queue.empty()
+    assert worker.get_results() == [("ja", 4, "こんにちは。")]
+    logger.info("✅ 全部略過時不排入翻譯")
+
+def test_two_tier_draft_then_refine():
+    """測試草稿立即輸出，Gemma 譯文以相同序號取代，翻譯記憶命中時不再修訂"""
+    metrics.reset()
+    translator = DraftingTranslator({"Thanks.": "謝謝。"})
+    worker = TwoTierTranslationWorker(translator, ["zh"], batch_window=0.0, deadline=None)
+    worker.start()
+    try:
+        worker.submit(0, "Hello.")
+        results = wait_for_results(worker, 2)
+        worker.submit(1, "Thanks.")
+        results += wait_for_results(worker, 1)
+    finally:
+        worker.stop()
+
+    assert translator.batches == [["Hello."]]
+    assert results == [("zh", 0, "draft Hello."), ("zh", 0, "[zh] Hello."), ("zh", 1, "謝謝。")]
+    assert metrics.get_counter("translation_worker.refinements_changed") == 1
+    assert metrics.get_counter("translation_worker.final_drafts") == 1
+    assert metrics.get_gauge("translation_worker.refine_rate") == 1.0
+    assert metrics.summary("translation_worker.first_caption_latency")["count"] == 2
+    logger.info("✅ 雙層翻譯草稿與修訂")
+
+def test_two_tier_skips_superseded_drafts():
+    """測試草稿已落後最新片段太多時不再以 Gemma 修訂"""
+    metrics.reset()
+    translator = DraftingTranslator()
+    worker = TwoTierTranslationWorker(
+        translator, ["zh"], refine_max_age=1, batch_window=0.0, deadline=None, supersede_distance=None
+    )
+    for sequence, text in enumerate(["zero", "one", "two", "three"]):
+        worker.submit(sequence, text)
+    while not worker.draft_queue.empty():
+        worker._draft(*worker.draft_queue.get())
+    drafts = worker.get_results()
+
+    worker.start()
+    try:
+        results = wait_for_results(worker, 2)
+    finally:
+        worker.stop()
+
+    assert [text for _, _, text in drafts] == ["draft zero", "draft one", "draft two", "draft three"]
+    assert translator.batches == [["two", "three"]]
+    assert results == [("zh", 2, "[zh] two"), ("zh", 3, "[zh] three")]
+    assert metrics.get_counter("translation_worker.refinements_skipped") == 2
+    assert metrics.get_gauge("translation_worker.refine_rate") == 0.5
+    assert worker.drafts == {}
+    logger.info("✅ 過時草稿不修訂")
+
+def test_worker_uses_sentence_cache():
+    """測試工作執行緒的串流與多語言路徑都逐句查詢快取，只翻譯未命中的句子"""
+    text = "Hello everyone. Welcome back! See you soon."
+
+    # 單一片段、單一目標語言：串流路徑
+    translator = CachingTranslator()
+    translator._store_cache("Hello everyone.", "zh", "大家好。")
+    worker = TranslationWorker(translator, ["zh"], batch_window=0.0, streaming=True, stream_interval=0.0)
+    worker.start()
+    try:
+        worker.submit(0, text)
+        results = wait_for_results(worker, 1)
+    finally:
+        worker.stop()
+
+    assert translator.batches == [["Welcome back!", "See you soon."]]
+    assert results == [("zh", 0, "大家好。[zh] Welcome back![zh] See you soon.")]
+    assert translator._lookup_cache(text, "zh") == results[0][2]
+
+    # 多個目標語言：批次路徑，各語言各自逐句查詢
+    translator = CachingTranslator()
+    translator._store_cache("Hello everyone.", "zh", "大家好。")
+    translator._store_cache("See you soon.", "ja", "またね。")
+    worker = TranslationWorker(translator, ["zh", "ja"], batch_window=0.0, streaming=True)
+    worker.start()
+    try:
+        worker.submit(0, text)
+        results = wait_for_results(worker, 2)
+    finally:
+        worker.stop()
+
+    assert translator.batches == [["Welcome back!", "See you soon.", "Hello everyone.", "Welcome back!"]]
+    assert sorted(results) == [
+        ("ja", 0, "[ja] Hello everyone.[ja] Welcome back!またね。"),
+        ("zh", 0, "大家好。[zh] Welcome back![zh] See you soon."),
+    ]
+    logger.info("✅ 工作執行緒逐句查詢快取")
+
+def test_cancel_token_stops_generation():
+    """測試取消標記讓停止條件對所有序列生效，並記錄浪費的詞元"""
+    metrics.reset()
+    token = CancellationToken()
+    criteria = CancelStoppingCriteria(token)
+    input_ids = torch.zeros((2, 4), dtype=torch.long)
+    assert criteria(input_ids, None).tolist() == [False, False]
+
+    token.cancel("superseded")
+    assert criteria(input_ids, None).tolist() == [True, True]
+    assert CancellationToken(deadline=time.time() - 1).cancelled
+
+    translator = Translator()
+    with translator.cancellable(token):
+        try:
+            translator._check_cancelled({"tokens": 12, "seconds": 0.4})
+            assert False, "應該中止"
+        except TranslationCancelled:
+            pass
+    assert translator.cancel_token is None
+    assert metrics.get_counter("translation.cancellations.superseded") == 1
+    assert metrics.get_counter("translation.wasted_tokens") == 12
+    logger.info("✅ 取消標記")
+
+def main():
+    """主測試函數"""
+    logger.info("=" * 50)
+    logger.info("開始翻譯工作執行緒測試")
+    logger.info("=" * 50)
+
+    test_worker_coalesces_ready_segments()
+    test_worker_respects_batch_cap()
+    test_worker_streams_single_segment()
+    test_worker_fans_out_to_all_targets()
+    test_newer_segment_supersedes_and_merges()
+    test_deadline_cancels_and_drops()
+    test_same_language_bypass()
+    test_bypass_skips_queue_when_all_targets_match()
+    test_two_tier_draft_then_refine()
+    test_two_tier_skips_superseded_drafts()
+    test_worker_uses_sentence_cache()
+    test_cancel_token_stops_generation()
+
+if __name__ == "__main__":
+    main()